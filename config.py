@@ -11,10 +11,76 @@ CONDITION_SCORE_WEIGHT = (1 - OVERALL_TIME_SCORE_WEIGHT)
 DEFAULT_PERCENTAGE_THRESHOLD = 0.8
 DEFAULT_TIME_THRESHOLD = 3
 
+# Maximum number of row-pair scores kept by a PairScoreCache
+SCORE_CACHE_SIZE = 100000
+
+# Match rows missing the subset time column through their other time fields
+# (generateReferenceGraph secondaryTimeMatching); off reproduces the original matching
+SECONDARY_TIME_MATCHING = False
+
+# Within-reviewer duplicates found before matching: None (off), 'flag'
+# (report only) or 'collapse' (keep each group's first row by time); pairs need at
+# least DEDUP_SCORE_THRESHOLD computeFeatureScores similarity
+DEDUP_MODE = None
+DEDUP_SCORE_THRESHOLD = 0.9
+
+# Link consensus crossings to the bus-stop intervals they overlap after
+# matching (Bus Present During Crossing column and links/ CSVs); off by default
+BUS_CROSSING_LINKING = False
+
+# Consensus fields ConsensusStore indexes with per-value bitmaps up front
+# (other fields are indexed on first query)
+CONSENSUS_INDEX_FIELDS = ('User Type', 'Crosswalk Crossing', 'Bus Interaction')
+
+# Behavior aggregates: duration percentiles reported per site and subset, and
+# the number of aggregate results kept in memory by input fingerprint
+AGGREGATE_PERCENTILES = (0.25, 0.75, 0.9)
+AGGREGATE_CACHE_SIZE = 32
+
+# Reference graph files written per site and subset: 'npz' (compact arrays,
+# reloadable with loadGraph) and/or 'csv' (human-readable view)
+GRAPH_EXPORT_FORMATS = ('npz', 'csv')
+
+# Cold-start import time allowed per pipeline module (seconds)
+IMPORT_TIME_BUDGET_SECONDS = 1.5
+
+# Clustering sweep: rows drawn for each silhouette estimate (None = all rows)
+# and joblib workers for the k x seed grid (-1 = all cores)
+SILHOUETTE_SAMPLE_SIZE = 2000
+CLUSTER_SWEEP_JOBS = -1
+# Consensus records read (and fed to MiniBatchKMeans) per chunk in streaming clustering
+CLUSTER_CHUNK_SIZE = 1000
+
+# Scaling benchmark history and regression threshold (slowdown factor over the
+# median of the last BENCHMARK_HISTORY_WINDOW comparable runs)
+BENCHMARK_REGRESSION_TOLERANCE = 1.25
+BENCHMARK_HISTORY_WINDOW = 5
+
+# Batch accuracy evaluation: minimum name similarity for pairing a human QC
+# file with a computed site CSV, and joblib workers for parsing/comparing
+ACCURACY_PAIRING_CUTOFF = 0.8
+ACCURACY_JOBS = -1
+
+# Local service (main.py --serve): address, sites kept warm, and consensus
+# results kept per site (one per thresholds / secondary-time combination)
+SERVICE_HOST = '127.0.0.1'
+SERVICE_PORT = 8765
+SERVICE_CACHE_SIZE = 8
+SERVICE_RESULTS_PER_SITE = 16
+
+# Watch mode (main.py --watch): seconds between scans of the input tree, seconds
+# a site's files must stay unchanged before it is reprocessed, and reviewer
+# CSVs a site needs before it is processed at all
+WATCH_POLL_SECONDS = 5
+WATCH_DEBOUNCE_SECONDS = 30
+WATCH_MIN_REVIEWERS = 3
+
 # File paths
 INPUT_DATA_PATH = './resource/inputData'
 OUTPUT_PATH = './output'
 ACCURACY_SUMMARY_DIR = os.path.join(OUTPUT_PATH, 'accuracy_summary')
+BENCHMARK_HISTORY_PATH = os.path.join(OUTPUT_PATH, 'benchmark', 'history.jsonl')
+CLUSTER_MODEL_PATH = os.path.join(OUTPUT_PATH, 'cluster', 'streaming_kmeans.joblib')
 HUMAN_QC_PATH = './resource/human_quality_control'
 CHARACTERISTICS_PATH = './resource/busStopLocationData/characteristics.csv'
 NORTHAMPTON_OUTPUT = os.path.join(OUTPUT_PATH, 'Northampton_Court_House_V43.csv')
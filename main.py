@@ -3,18 +3,69 @@
 from config import (
     INPUT_DATA_PATH,
     OUTPUT_PATH,
-    CHARACTERISTICS_PATH
+    CHARACTERISTICS_PATH,
+    SECONDARY_TIME_MATCHING,
+    DEDUP_MODE,
+    BUS_CROSSING_LINKING,
+    SERVICE_HOST,
+    SERVICE_PORT
 )
-from traffic_research.core.clustering import runMode,plotAverageSilhouetteScore
 from traffic_research.core.data_engineering import generateDateFrame
-from traffic_research.processing.data_processing import computeDataFolderToCSV, performAccuracyTest
+from traffic_research.processing.data_processing import computeDataFolderToCSV, performAccuracyTest, BEHAVIOR_SUMMARY_FILE
+import argparse
 import os
 import pandas as pd
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Traffic research consensus pipeline")
+    parser.add_argument('--profile', action='store_true',
+                        help="record per-site, per-stage wall time, CPU time and peak memory under output/profile")
+    parser.add_argument('--stats', action='store_true',
+                        help="write matcher/QC statistics per site and run_stats.json")
+    parser.add_argument('--secondary-times', action='store_true',
+                        help="match rows without the subset time column through their other time fields")
+    parser.add_argument('--dedup', choices=['flag', 'collapse'], default=DEDUP_MODE,
+                        help="detect within-reviewer duplicates before matching (report only, or keep one row per group)")
+    parser.add_argument('--bus-links', action='store_true',
+                        help="link each consensus crossing to the bus-stop intervals it overlaps")
+    parser.add_argument('--aggregates', action='store_true',
+                        help="write per-site/per-subset behavior aggregates to output/behavior_summary.csv")
+    parser.add_argument('--accuracy', action='store_true',
+                        help="compare the outputs with every human QC file and write per-site/per-field summaries")
+    parser.add_argument('--serve', action='store_true',
+                        help="instead of a batch run, serve per-site QC/accuracy requests over local HTTP from warm state")
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help="port for --serve")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep polling the input folder and reprocess sites whose reviewer files changed")
+    args = parser.parse_args()
+    if args.serve:
+        from traffic_research.processing.service import serve
+
+        serve(SERVICE_HOST, args.port)
+        raise SystemExit(0)
+    if args.watch:
+        from traffic_research.processing.watch import DataFolderWatcher
+
+        DataFolderWatcher(INPUT_DATA_PATH, OUTPUT_PATH, CHARACTERISTICS_PATH, percentageThreshold=0.65, timeThreshold=10,
+                          secondaryTimeMatching=args.secondary_times or SECONDARY_TIME_MATCHING, dedup=args.dedup,
+                          busCrossingLinking=args.bus_links or BUS_CROSSING_LINKING).run()
+        raise SystemExit(0)
     # characteristics = pd.read_csv(CHARACTERISTICS_PATH)
     # characteristics = characteristics.set_index('fid')
     # print(characteristics.iloc[0].keys().tolist())
-    computeDataFolderToCSV(INPUT_DATA_PATH, OUTPUT_PATH,CHARACTERISTICS_PATH,percentageThreshold=0.65, timeThreshold=10)
+    computeDataFolderToCSV(INPUT_DATA_PATH, OUTPUT_PATH,CHARACTERISTICS_PATH,percentageThreshold=0.65, timeThreshold=10,
+                           collectStats=args.stats, profile=args.profile,
+                           secondaryTimeMatching=args.secondary_times or SECONDARY_TIME_MATCHING, dedup=args.dedup,
+                           busCrossingLinking=args.bus_links or BUS_CROSSING_LINKING)
+    if args.aggregates:
+        from traffic_research.processing.aggregates import aggregateOutputFolder
+
+        aggregateOutputFolder(OUTPUT_PATH).to_csv(os.path.join(OUTPUT_PATH, BEHAVIOR_SUMMARY_FILE))
+    if args.accuracy:
+        from traffic_research.processing.accuracy import evaluateAccuracy
+
+        bySite, _ = evaluateAccuracy(OUTPUT_PATH)
+        print(bySite[['Site', 'Accuracy']].to_string(index=False))
+    # from traffic_research.core.clustering import runMode, plotAverageSilhouetteScore
     # allComputedRows = generateDateFrame(os.path.join(OUTPUT_PATH, 'allComputedRows.csv'))
     # runMode(allComputedRows, n_clusters=3)
     # plotAverageSilhouetteScore(allComputedRows, numberOfIterations=50, maxNumberOfClusters=14)
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""Synthetic reviewer frames shaped like generateDateFrame output, and the batch pipeline over them."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from traffic_research.core.data_engineering import DTYPE_MAPPING, FLOAT_COLS, INT_COLS
+from traffic_research.core.matching import generateReferenceGraph
+from traffic_research.core.models import AccuracyScore
+from traffic_research.processing.data_processing import SUBSETS, combineQualityControlDataFrames, partitionSubsets
+from traffic_research.processing.quality_control import generateQualityControlDataFramebyGraph
+
+TEXT_COLUMNS = ['Video Title', 'Initials', 'Location Name', 'Crosswalk Location Relative to Bus Stop', 'User Count',
+                'Visibility Scale', 'User Notes', 'Bus Noteworthy Events', 'Noteworthy Events', 'Driver Behavior',
+                'General Reviewer Notes']
+NUMERIC_COLUMNS = ['Bus Stop IDs/Addresses', 'Count of Bus Stop Routes', 'Crossing Treatment']
+CODE_COLUMNS = ['Estimated Age Group', 'Crossing Location Relative to Bus Stop']
+
+
+def _observations(rng, count, start=36000):
+    """Ground-truth observations: times in seconds since midnight and category codes."""
+    kind = rng.integers(0, 3, count)  # NoneBusUserCrossing, BusUserCrossing, BusNotCrossing
+    crossing = np.sort(start + rng.integers(0, 1800, count)).astype(float)
+    bus = crossing - rng.integers(0, 30, count)
+    return {
+        'kind': kind,
+        'Crossing Start Time': np.where(kind == 2, -1.0, crossing),
+        'Crossing End Time': np.where(kind == 2, -1.0, crossing + rng.integers(3, 20, count)),
+        'Intend to Cross Timestamp': np.where((kind != 2) & (rng.random(count) < 0.7), crossing - rng.integers(0, 5, count), -1.0),
+        'Refuge Island Start Time': np.where((kind != 2) & (rng.random(count) < 0.3), crossing + 2, -1.0),
+        'Refuge Island End Time': np.where((kind != 2) & (rng.random(count) < 0.3), crossing + 5, -1.0),
+        'Bus Stop Arrival Time': np.where(kind == 0, -1.0, bus),
+        'Bus Stop Departure Time': np.where(kind == 0, -1.0, bus + rng.integers(5, 60, count)),
+        'codes': rng.integers(0, 3, (count, len(INT_COLS))),
+    }
+
+
+def makeReviewerFrame(rng, observations, name, seenShare=0.85, jitter=3, noise=0.1):
+    """One reviewer's parsed frame: a share of the observations with jittered times and noisy categories."""
+    seen = np.flatnonzero(rng.random(len(observations['kind'])) < seenShare)
+    count = len(seen)
+    kind = observations['kind'][seen]
+    columns = {}
+    for column in FLOAT_COLS:
+        times = observations[column][seen]
+        shifted = times + rng.integers(-jitter, jitter + 1, count)
+        columns[column] = np.where(times < 0, -1.0, shifted)
+    # A few rows lose their subset time entirely.
+    lost = rng.random(count) < 0.05
+    columns['Crossing Start Time'] = np.where(lost & (kind != 2), -1.0, columns['Crossing Start Time'])
+    columns['Bus Stop Arrival Time'] = np.where(lost & (kind == 2), -1.0, columns['Bus Stop Arrival Time'])
+    codes = observations['codes'][seen].copy()
+    flip = rng.random(codes.shape) < noise
+    codes[flip] = rng.integers(-1, 3, flip.sum())
+    for i, column in enumerate(INT_COLS):
+        columns[column] = codes[:, i]
+    columns['Bus Interaction'] = np.where(kind == 0, 0, 1)
+    columns['Roadway Crossing'] = np.where(kind == 2, 0, 1)
+    for column in TEXT_COLUMNS:
+        columns[column] = ['nan'] * count
+    columns['Video Title'] = ['video'] * count
+    columns['Location Name'] = ['synthetic site'] * count
+    columns['Initials'] = [name] * count
+    for column in NUMERIC_COLUMNS:
+        columns[column] = np.full(count, np.nan)
+    for column in CODE_COLUMNS:
+        columns[column] = rng.integers(0, 2, count)
+    return pd.DataFrame(columns).astype(DTYPE_MAPPING)
+
+
+def makeSyntheticSite(seed, count=60):
+    """[(path, frame), ...] of three reviewers observing the same synthetic site."""
+    rng = np.random.default_rng(seed)
+    observations = _observations(rng, count)
+    return [
+        (f'/synthetic/{name}.csv', makeReviewerFrame(rng, observations, name, seenShare=share))
+        for name, share in (('A', 0.8), ('B', 0.9), ('C', 0.95))
+    ]
+
+
+def siteSubsets(reviewerFrames):
+    """loadSiteSubsets output for [(path, frame), ...] in folder order."""
+    subsets = {subsetName: [] for subsetName, _ in SUBSETS}
+    for path, df in reviewerFrames:
+        for subsetName, subsetDF in partitionSubsets(df).items():
+            subsets[subsetName].append({'path': path, 'df': subsetDF})
+    return {subsetName: sorted(dflist, key=lambda x: x['df'].shape[0]) for subsetName, dflist in subsets.items()}
+
+
+def batchConsensus(subsets, timeThreshold, percentageThreshold):
+    """({subsetName: graph}, site QC frame, AccuracyScore) as _processFolder builds them."""
+    accuracy = AccuracyScore()
+    graphs = {}
+    qualityControlDataFrames = {}
+    for subsetName, timeColumn in SUBSETS:
+        graphs[subsetName] = generateReferenceGraph(subsets[subsetName], timeThreshold, percentageThreshold, timeColumn)
+        with accuracy.subset(subsetName):
+            qualityControlDataFrames[subsetName] = generateQualityControlDataFramebyGraph(
+                graphs[subsetName], subsets[subsetName], accuracy, timeThreshold
+            )
+    return graphs, combineQualityControlDataFrames(qualityControlDataFrames), accuracy
+
+
+@pytest.fixture
+def syntheticSite():
+    return makeSyntheticSite
+
+
+@pytest.fixture
+def subsetsOf():
+    return siteSubsets
+
+
+@pytest.fixture
+def batchSite():
+    return lambda reviewerFrames, timeThreshold, percentageThreshold: batchConsensus(
+        siteSubsets(reviewerFrames), timeThreshold, percentageThreshold
+    )
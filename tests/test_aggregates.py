@@ -0,0 +1,37 @@
+"""Behavior aggregates: compliance rates over crossing rows only."""
+
+import numpy as np
+import pandas as pd
+from traffic_research.processing.aggregates import COMPLIANCE_FIELDS, DURATION_FIELDS, aggregateBehavior, behaviorFrame
+
+
+def _rows():
+    """One site: two crossings (one compliant) and two BusNotCrossing rows answering 'no'."""
+    rows = pd.DataFrame({
+        'fid': [7, 7, 7, 7],
+        'Bus Interaction': ['no', 'yes', 'yes', 'yes'],
+        'Roadway Crossing': ['yes', 'yes', 'no', 'no'],
+        'Crosswalk Crossing': ['yes', 'no', 'no', 'no'],
+        'Pedestrian Phase Crossing': ['yes', 'yes', 'no', ''],
+        'Did User Finish Crossing During Pedestrian Phase': ['yes', 'no', 'no', 'no'],
+    })
+    for field, (laterColumn, earlierColumn) in DURATION_FIELDS.items():
+        rows[field] = 'N/A'
+        rows[laterColumn] = 'N/A'
+        rows[earlierColumn] = 'N/A'
+    return rows
+
+
+def test_compliance_is_nan_without_a_roadway_crossing():
+    behavior = behaviorFrame(_rows())
+    for field in COMPLIANCE_FIELDS.values():
+        assert np.isnan(behavior[field].iloc[2:]).all()
+    assert behavior['Crosswalk Crossing'].iloc[:2].tolist() == [1.0, 0.0]
+
+
+def test_bus_not_crossing_rows_do_not_lower_site_rates():
+    summary = aggregateBehavior(_rows())
+    assert np.isnan(summary.loc[(7, 'BusNotCrossing'), 'CrosswalkComplianceRate'])
+    assert summary.loc[(7, 'All'), 'CrosswalkComplianceRate'] == 0.5
+    assert summary.loc[(7, 'All'), 'PedestrianPhaseComplianceRate'] == 1.0
+    assert summary.loc[(7, 'All'), 'Rows'] == 4
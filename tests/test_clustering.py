@@ -0,0 +1,36 @@
+"""Chunked reads of a consensus CSV keep each record's position in the file."""
+
+import numpy as np
+from traffic_research.core.clustering import StreamingClusterModel, iterConsensusChunks
+from traffic_research.core.data_engineering import generateDateFrame
+
+
+def _consensusCsv(tmp_path, batchSite, syntheticSite, emptyRecords):
+    """A site's consensus rows exported like computeDataFolderToCSV, with some records blanked."""
+    _, dfQualityControl, _ = batchSite(syntheticSite(5, count=80), 2, 0.5)
+    dfQualityControl = dfQualityControl.astype(object)
+    dfQualityControl.iloc[emptyRecords] = np.nan
+    path = tmp_path / 'site.csv'
+    dfQualityControl.transpose().to_csv(path, index=True, header=False)
+    return str(path), len(dfQualityControl)
+
+
+def test_chunks_are_indexed_by_record_position(tmp_path, batchSite, syntheticSite):
+    emptyRecords = [0, 11, 12, 30]
+    path, recordCount = _consensusCsv(tmp_path, batchSite, syntheticSite, emptyRecords)
+    full = generateDateFrame(path).dropna(how='all')
+    expected = [position for position in range(recordCount) if position not in emptyRecords]
+    assert full.index.tolist() == expected
+    for chunkSize in (1, 7, 1000):
+        chunks = list(iterConsensusChunks(path, chunkSize))
+        assert [position for chunk in chunks for position in chunk.index] == expected
+
+
+def test_assign_clusters_labels_records_in_place(tmp_path, batchSite, syntheticSite):
+    emptyRecords = [3, 4, 20]
+    path, _ = _consensusCsv(tmp_path, batchSite, syntheticSite, emptyRecords)
+    model = StreamingClusterModel(3).fit(path, chunkSize=9)
+    clusters = model.assignClusters(path, chunkSize=9)
+    full = generateDateFrame(path).dropna(how='all')
+    assert clusters.index.equals(full.index)
+    assert clusters.tolist() == model.predict(full).tolist()
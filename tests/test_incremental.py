@@ -0,0 +1,66 @@
+"""IncrementalSiteGraph edits against a full rebuild on synthetic sites."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from traffic_research.processing.data_processing import SUBSETS
+from traffic_research.processing.incremental import IncrementalSiteGraph
+
+TIME_THRESHOLD = 10
+PERCENTAGE_THRESHOLD = 0.65
+
+
+def _assertMatchesRebuild(graph, batchSite):
+    graphs, qualityControl, accuracy = batchSite(
+        [(path, graph.frames[path]) for path in graph.paths], TIME_THRESHOLD, PERCENTAGE_THRESHOLD
+    )
+    for subsetName, _ in SUBSETS:
+        assert graph.graphs[subsetName] == graphs[subsetName]
+    pd.testing.assert_frame_equal(graph.qualityControlDataFrame(), qualityControl)
+    assert graph.getAccuracy() == accuracy.getAccuracy()
+    pd.testing.assert_frame_equal(graph.accuracyScore().toFrame(), accuracy.toFrame())
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_applyReviewerChanges_matches_rebuild(syntheticSite, batchSite, seed):
+    site = syntheticSite(seed)
+    graph = IncrementalSiteGraph(site, TIME_THRESHOLD, PERCENTAGE_THRESHOLD)
+    _assertMatchesRebuild(graph, batchSite)
+    rng = np.random.default_rng(100 + seed)
+    donor = syntheticSite(1000 + seed)[0][1]
+
+    for step in range(6):
+        path = graph.paths[rng.integers(len(graph.paths))]
+        df = graph.frames[path]
+        labels = df.index.to_numpy()
+
+        # Modify: shift times and change a category on a few rows.
+        modified = df.loc[rng.choice(labels, size=min(3, len(labels)), replace=False)].copy()
+        for column in ('Crossing Start Time', 'Bus Stop Arrival Time', 'Crossing End Time'):
+            valid = modified[column] >= 0
+            modified.loc[valid, column] += rng.integers(-8, 9, valid.sum())
+        modified['User Type'] = (modified['User Type'].fillna(0) + 1) % 3
+        graph.applyReviewerChanges(path, modified=modified)
+        _assertMatchesRebuild(graph, batchSite)
+
+        # Add rows taken from another synthetic site (their labels clash and are renumbered).
+        added = donor.iloc[rng.choice(len(donor), size=3, replace=False)]
+        graph.applyReviewerChanges(path, added=added)
+        _assertMatchesRebuild(graph, batchSite)
+
+        # Remove a few rows.
+        labels = graph.frames[path].index.to_numpy()
+        removed = rng.choice(labels, size=min(2, len(labels)), replace=False).tolist()
+        graph.applyReviewerChanges(path, removed=removed)
+        _assertMatchesRebuild(graph, batchSite)
+
+
+def test_unchanged_subsets_are_not_rescored(syntheticSite, batchSite):
+    graph = IncrementalSiteGraph(syntheticSite(7), TIME_THRESHOLD, PERCENTAGE_THRESHOLD)
+    path = graph.paths[0]
+    df = graph.frames[path]
+    row = df[df['Bus Interaction'] == 0].iloc[[0]].copy()
+    row['User Type'] = (row['User Type'].fillna(0) + 1) % 3
+    summary = graph.applyReviewerChanges(path, modified=row)
+    assert summary['BusUserCrossing'] == 0 and summary['BusNotCrossing'] == 0
+    _assertMatchesRebuild(graph, batchSite)
@@ -0,0 +1,78 @@
+"""Interval join of linkBusCrossings checked against a brute-force scan."""
+
+import numpy as np
+import pandas as pd
+from traffic_research.core.utils import secondsToTimeString
+from traffic_research.processing.linking import BUS_PRESENT_COLUMN, annotateBusPresence, linkBusCrossings, overlappingIntervals
+
+
+def _randomIntervals(rng, count, maxLength):
+    starts = rng.integers(0, 100, count).astype(float)
+    return starts, starts + rng.integers(0, maxLength, count)
+
+
+def test_overlappingIntervals_matches_brute_force():
+    rng = np.random.default_rng(1)
+    for _ in range(300):
+        busStarts, busEnds = _randomIntervals(rng, rng.integers(0, 40), 20)
+        eventStarts, eventEnds = _randomIntervals(rng, rng.integers(0, 40), 5)
+        bus, event = overlappingIntervals(busStarts, busEnds, eventStarts, eventEnds)
+        expected = sorted(
+            (i, j) for i in range(len(busStarts)) for j in range(len(eventStarts))
+            if busStarts[i] <= eventEnds[j] and eventStarts[j] <= busEnds[i]
+        )
+        assert sorted(zip(bus.tolist(), event.tolist())) == expected
+
+
+def _consensusRows(rng, count):
+    """Consensus-like rows: crossings, bus-stop visits, and rows carrying both (BusUserCrossing)."""
+    def times(present, starts, lengths):
+        return [secondsToTimeString(s) if p else 'N/A' for p, s in zip(present, starts)], \
+               [secondsToTimeString(s + d) if p else 'N/A' for p, s, d in zip(present, starts, lengths)]
+
+    kind = rng.integers(0, 3, count)
+    crossingStart, crossingEnd = times(kind != 1, 36000 + rng.integers(0, 300, count), rng.integers(0, 20, count))
+    busArrival, busDeparture = times(kind != 0, 36000 + rng.integers(0, 300, count), rng.integers(0, 60, count))
+    return pd.DataFrame({
+        'Crossing Start Time': crossingStart,
+        'Crossing End Time': crossingEnd,
+        'Bus Stop Arrival Time': busArrival,
+        'Bus Stop Departure Time': busDeparture,
+    }, index=rng.integers(0, 5, count))
+
+
+def test_linkBusCrossings_matches_brute_force_without_self_pairs():
+    rng = np.random.default_rng(2)
+    for _ in range(50):
+        rows = _consensusRows(rng, int(rng.integers(1, 60)))
+        links = linkBusCrossings(rows)
+
+        seconds = {column: [None if t == 'N/A' else sum(int(p) * f for p, f in zip(t.split(':'), (3600, 60, 1)))
+                            for t in rows[column]] for column in rows.columns}
+        expected = sorted(
+            (c, b) for c in range(len(rows)) for b in range(len(rows))
+            if c != b and seconds['Crossing Start Time'][c] is not None and seconds['Bus Stop Arrival Time'][b] is not None
+            and seconds['Bus Stop Arrival Time'][b] <= seconds['Crossing End Time'][c]
+            and seconds['Crossing Start Time'][c] <= seconds['Bus Stop Departure Time'][b]
+        )
+        assert sorted(zip(links['CrossingRow'].tolist(), links['BusRow'].tolist())) == expected
+
+        annotated = annotateBusPresence(rows, links)
+        linked = {c for c, _ in expected}
+        for c in range(len(rows)):
+            if seconds['Crossing Start Time'][c] is None:
+                assert annotated[BUS_PRESENT_COLUMN].iloc[c] == ''
+            else:
+                assert annotated[BUS_PRESENT_COLUMN].iloc[c] == ('yes' if c in linked else 'no')
+
+
+def test_bus_user_crossing_is_not_linked_to_itself():
+    rows = pd.DataFrame({
+        'Crossing Start Time': ['10:00:00'],
+        'Crossing End Time': ['10:00:10'],
+        'Bus Stop Arrival Time': ['09:59:50'],
+        'Bus Stop Departure Time': ['10:00:20'],
+    })
+    links = linkBusCrossings(rows)
+    assert links.empty
+    assert annotateBusPresence(rows, links)[BUS_PRESENT_COLUMN].tolist() == ['no']
@@ -0,0 +1,58 @@
+"""ConsensusStore range queries, including rows without an ObservationTime."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from traffic_research.core.utils import secondsToTimeString, timeStringsToSeconds
+from traffic_research.processing.store import ConsensusStore
+
+
+def _rows(rng, count):
+    times = rng.integers(30000, 60000, count)
+    missing = rng.random(count) < 0.15
+    return pd.DataFrame({
+        'fid': rng.integers(1, 4, count),
+        'ObservationTime': ['N/A' if m else secondsToTimeString(t) for m, t in zip(missing, times)],
+        'Roadway Crossing': rng.choice(['yes', 'no'], count),
+    })
+
+
+def _bruteForce(rows, site, start, end, where):
+    times = timeStringsToSeconds(rows['ObservationTime'])
+    keep = np.ones(len(rows), dtype=bool)
+    if site is not None:
+        keep &= (rows['fid'] == site).to_numpy()
+    if start is not None or end is not None:
+        keep &= ~np.isnan(times)
+    if start is not None:
+        keep &= times >= timeStringsToSeconds([start])[0]
+    if end is not None:
+        keep &= times <= timeStringsToSeconds([end])[0]
+    for field, value in (where or {}).items():
+        keep &= (rows[field] == value).to_numpy()
+    return int(keep.sum())
+
+
+@pytest.mark.parametrize('start, end', [
+    (None, None), ('00:00:00', None), (None, '23:59:59'), ('10:00:00', '12:00:00'), ('12:00:00', None),
+])
+@pytest.mark.parametrize('site', [None, 1, 2])
+def test_query_matches_brute_force(site, start, end):
+    rows = _rows(np.random.default_rng(3), 400)
+    store = ConsensusStore(rows, indexFields=['Roadway Crossing'])
+    for where in (None, {'Roadway Crossing': 'yes'}):
+        assert store.count(site, start, end, where) == _bruteForce(rows, site, start, end, where)
+
+
+def test_rows_without_time_only_match_unbounded_queries():
+    rows = pd.DataFrame({
+        'fid': [1, 1, 1, 2],
+        'ObservationTime': ['10:00:00', 'N/A', '11:00:00', 'N/A'],
+        'Roadway Crossing': ['yes'] * 4,
+    })
+    store = ConsensusStore(rows, indexFields=[])
+    assert store.count() == 4
+    assert store.count(start='00:00:00') == 2
+    assert store.count(end='23:59:59') == 2
+    assert store.count(site=2, start=0) == 0
+    assert store.query(start='00:00:00')['ObservationTime'].tolist() == ['10:00:00', '11:00:00']
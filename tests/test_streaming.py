@@ -0,0 +1,29 @@
+"""streamSiteQualityControl against the batch matcher and consensus on synthetic sites."""
+
+import pandas as pd
+import pytest
+from traffic_research.core.models import AccuracyScore
+from traffic_research.processing.streaming import streamSiteQualityControl
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('timeThreshold, percentageThreshold', [(10, 0.65), (3, 0.8), (30, 0.5)])
+def test_streaming_matches_batch(syntheticSite, subsetsOf, batchSite, seed, timeThreshold, percentageThreshold):
+    site = syntheticSite(seed)
+    graphs, qualityControl, accuracy = batchSite(site, timeThreshold, percentageThreshold)
+
+    streamedAccuracy = AccuracyScore()
+    streamedGraphs, streamedQualityControl = streamSiteQualityControl(
+        subsetsOf(site), streamedAccuracy, percentageThreshold, timeThreshold, secondaryTimeMatching=False, dedup=None
+    )
+
+    for subsetName, graph in graphs.items():
+        assert streamedGraphs[subsetName] == graph
+        assert list(streamedGraphs[subsetName]) == list(graph)
+    pd.testing.assert_frame_equal(streamedQualityControl, qualityControl)
+    pd.testing.assert_frame_equal(streamedAccuracy.toFrame(), accuracy.toFrame())
+
+
+def test_streaming_rejects_secondary_time_matching(syntheticSite, subsetsOf):
+    with pytest.raises(ValueError):
+        streamSiteQualityControl(subsetsOf(syntheticSite(0)), AccuracyScore(), 0.65, 10, secondaryTimeMatching=True)
@@ -1,3 +1,12 @@
 """Traffic research analysis package."""
 
+import os
+import sys
+
 __version__ = "1.0.0"
+
+# config.py lives in the project root; make it importable once for every
+# submodule instead of each module patching sys.path on import.
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
@@ -0,0 +1,70 @@
+"""Cold-start import-time budget for the matching/QC pipeline.
+
+Each module is imported in a fresh interpreter so earlier imports do not hide
+its cost. The check fails when a module takes longer than
+IMPORT_TIME_BUDGET_SECONDS or loads a heavy optional package (scikit-learn,
+matplotlib) that only clustering and plotting need.
+
+Run with: python -m traffic_research.benchmark.import_budget
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from config import IMPORT_TIME_BUDGET_SECONDS
+
+# Modules a pure matching/QC run (and every pool worker) imports.
+PIPELINE_MODULES = [
+    'traffic_research',
+    'traffic_research.core',
+    'traffic_research.processing',
+    'traffic_research.processing.data_processing',
+]
+
+# Packages that must only be loaded on first use of clustering/plotting.
+HEAVY_MODULES = ['sklearn', 'matplotlib']
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measureImportTime(module):
+    """Import module in a fresh interpreter; return (seconds, heavy modules loaded)."""
+    result = subprocess.run(
+        [sys.executable, '-c', _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=_PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    measured = json.loads(result.stdout.strip().splitlines()[-1])
+    return measured["seconds"], measured["heavy"]
+
+
+def checkImportBudget(modules=PIPELINE_MODULES, budget=IMPORT_TIME_BUDGET_SECONDS):
+    """Measure every module; return a list of failure messages (empty when within budget)."""
+    failures = []
+    for module in modules:
+        seconds, heavy = measureImportTime(module)
+        print(f"{module}: {seconds:.3f}s")
+        if seconds > budget:
+            failures.append(f"{module} took {seconds:.3f}s to import (budget {budget:.3f}s)")
+        if heavy:
+            failures.append(f"{module} loaded {', '.join(heavy)} at import time")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = checkImportBudget()
+    for failure in failures:
+        print(failure)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,224 @@
+"""Scaling benchmark of the consensus pipeline on synthetic sites.
+
+For every size a synthetic site is generated (see synthetic.py) and each
+pipeline stage is timed on it separately:
+
+- ingest: loadSiteSubsets (load_csv, row parsing, subset split),
+- graph: generateReferenceGraph for every subset,
+- qc: generateQualityControlDataFramebyGraph and combining the subsets,
+- export: characteristics join, site CSV and graph files,
+- accuracyTest: comparing the exported site against its ground truth.
+
+Each run appends one record per size to a JSON-lines history file and is
+compared with the median of the previous BENCHMARK_HISTORY_WINDOW records of
+the same size and noise settings; stages slower than
+BENCHMARK_REGRESSION_TOLERANCE times that median are reported as regressions.
+
+Run with: python -m traffic_research.benchmark.suite --sizes 100 1000 5000
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from config import (
+    GRAPH_EXPORT_FORMATS,
+    BENCHMARK_HISTORY_PATH,
+    BENCHMARK_HISTORY_WINDOW,
+    BENCHMARK_REGRESSION_TOLERANCE,
+)
+from traffic_research.benchmark.synthetic import generateSyntheticDataset
+from traffic_research.core.data_engineering import generateDateFrame
+from traffic_research.core.matching import exportGraphToCsv, generateReferenceGraph, saveGraph
+from traffic_research.core.models import AccuracyScore
+from traffic_research.processing.data_processing import (
+    SUBSETS,
+    SITE_ID_COLUMN,
+    loadSiteSubsets,
+    loadCharacteristics,
+    combineQualityControlDataFrames,
+    mergeCharacteristicWithQualityDataFrame,
+)
+from traffic_research.processing.quality_control import accuracyTest, generateQualityControlDataFramebyGraph
+
+STAGES = ['ingest', 'graph', 'qc', 'export', 'accuracyTest']
+
+DEFAULT_SIZES = [100, 1000, 5000]
+
+# Slowdowns smaller than this are timer noise, whatever their ratio.
+MIN_REGRESSION_SECONDS = 0.1
+
+
+def _timed(timings, stage, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+
+def runPipelineStages(dataset, workFolderPath, percentageThreshold, timeThreshold):
+    """Time every stage once on the first site of dataset; return (timings, counts)."""
+    siteId, humanQualityFile = next(iter(dataset['humanQualityFiles'].items()))
+    characteristics = loadCharacteristics(dataset['characteristicsPath'])
+    timings = {}
+
+    subsets = _timed(timings, 'ingest', loadSiteSubsets, os.path.join(dataset['inputDataPath'], str(siteId)))
+
+    def buildGraphs():
+        return {
+            subsetName: generateReferenceGraph(
+                subsets[subsetName],
+                timeThreshold=timeThreshold,
+                percentageThreshold=percentageThreshold,
+                timeColumn=timeColumn,
+            )
+            for subsetName, timeColumn in SUBSETS
+        }
+    graphs = _timed(timings, 'graph', buildGraphs)
+
+    def buildQualityControl():
+        accuracy = AccuracyScore()
+        qualityControlDataFrames = {}
+        for subsetName, _ in SUBSETS:
+            with accuracy.subset(subsetName):
+                qualityControlDataFrames[subsetName] = generateQualityControlDataFramebyGraph(
+                    graphs[subsetName], subsets[subsetName], accuracy, timeThreshold
+                )
+        return combineQualityControlDataFrames(qualityControlDataFrames)
+    dfQualityControl = _timed(timings, 'qc', buildQualityControl)
+    dfQualityControl[SITE_ID_COLUMN] = siteId
+
+    sitePath = os.path.join(workFolderPath, f"{siteId}.csv")
+
+    def export():
+        for subsetName, timeColumn in SUBSETS:
+            graphPath = os.path.join(workFolderPath, 'graph', f"{siteId}{subsetName}_graph")
+            if 'npz' in GRAPH_EXPORT_FORMATS:
+                saveGraph(graphs[subsetName], graphPath + '.npz', dflist=subsets[subsetName], timeThreshold=timeThreshold,
+                          percentageThreshold=percentageThreshold, timeColumn=timeColumn)
+            if 'csv' in GRAPH_EXPORT_FORMATS:
+                exportGraphToCsv(graphs[subsetName], graphPath + '.csv')
+        mergeCharacteristicWithQualityDataFrame(dfQualityControl, characteristics).transpose().to_csv(
+            sitePath, index=True, header=False
+        )
+    _timed(timings, 'export', export)
+
+    dfCompute = generateDateFrame(sitePath).dropna(how='all')
+    dfHuman = generateDateFrame(humanQualityFile).dropna(how='all')
+    humanAccuracy = _timed(timings, 'accuracyTest', accuracyTest, dfHuman, dfCompute)
+
+    counts = {
+        'reviewerRows': sum(len(df['df']) for subsetName, _ in SUBSETS for df in subsets[subsetName]),
+        'consensusRows': len(dfQualityControl),
+        'accuracy': humanAccuracy,
+    }
+    return timings, counts
+
+
+def benchmarkSize(observations, coders=3, repeat=1, percentageThreshold=0.65, timeThreshold=10, seed=0, **noise):
+    """Benchmark one synthetic site size; stage timings are the best of repeat runs."""
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = generateSyntheticDataset(
+            os.path.join(tmp, 'data'), sites=1, observationsPerSite=observations, coders=coders, seed=seed, **noise
+        )
+        best = {}
+        counts = {}
+        for run in range(repeat):
+            workFolderPath = os.path.join(tmp, f"run{run}")
+            timings, counts = runPipelineStages(dataset, workFolderPath, percentageThreshold, timeThreshold)
+            for stage, seconds in timings.items():
+                best[stage] = min(seconds, best.get(stage, seconds))
+    return {
+        'observations': observations,
+        'coders': coders,
+        'percentageThreshold': percentageThreshold,
+        'timeThreshold': timeThreshold,
+        'seed': seed,
+        'noise': noise,
+        'repeat': repeat,
+        'stages': best,
+        'total': sum(best.values()),
+        **counts,
+    }
+
+
+def _gitCommit():
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _configKey(record):
+    return (
+        record['observations'], record['coders'], record['percentageThreshold'],
+        record['timeThreshold'], record['seed'], json.dumps(record['noise'], sort_keys=True),
+    )
+
+
+def loadHistory(historyPath=BENCHMARK_HISTORY_PATH):
+    if not os.path.exists(historyPath):
+        return []
+    with open(historyPath) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def findRegressions(record, history, tolerance=BENCHMARK_REGRESSION_TOLERANCE, window=BENCHMARK_HISTORY_WINDOW):
+    """Stages of record slower than tolerance x the median of comparable history records."""
+    previous = [past for past in history if _configKey(past) == _configKey(record)][-window:]
+    if not previous:
+        return []
+    regressions = []
+    for stage, seconds in record['stages'].items():
+        baseline = statistics.median(past['stages'][stage] for past in previous if stage in past['stages'])
+        if baseline > 0 and seconds > baseline * tolerance and seconds - baseline > MIN_REGRESSION_SECONDS:
+            regressions.append({'observations': record['observations'], 'stage': stage,
+                                'seconds': seconds, 'baseline': baseline, 'ratio': seconds / baseline})
+    return regressions
+
+
+def runSuite(sizes=DEFAULT_SIZES, coders=3, repeat=1, historyPath=BENCHMARK_HISTORY_PATH, record=True, **kwargs):
+    """Benchmark every size, append to the history and return (records, regressions)."""
+    history = loadHistory(historyPath)
+    runInfo = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': _gitCommit(),
+        'python': platform.python_version(),
+    }
+    records = []
+    regressions = []
+    for observations in sizes:
+        result = {**runInfo, **benchmarkSize(observations, coders=coders, repeat=repeat, **kwargs)}
+        regressions += findRegressions(result, history)
+        records.append(result)
+        stages = '  '.join(f"{stage}={result['stages'][stage]:.3f}s" for stage in STAGES)
+        print(f"{observations:>7} obs  {result['reviewerRows']:>7} rows  {stages}  total={result['total']:.3f}s")
+    if record:
+        os.makedirs(os.path.dirname(historyPath) or '.', exist_ok=True)
+        with open(historyPath, 'a') as f:
+            for result in records:
+                f.write(json.dumps(result) + '\n')
+    return records, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling benchmark on synthetic reviewer data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="observations per site")
+    parser.add_argument('--coders', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=1, help="runs per size; the fastest is kept")
+    parser.add_argument('--history', default=BENCHMARK_HISTORY_PATH)
+    parser.add_argument('--no-record', action='store_true', help="compare with the history without appending")
+    args = parser.parse_args()
+    _, regressions = runSuite(args.sizes, coders=args.coders, repeat=args.repeat,
+                              historyPath=args.history, record=not args.no_record)
+    for regression in regressions:
+        print(f"REGRESSION {regression['observations']} obs {regression['stage']}: "
+              f"{regression['seconds']:.3f}s vs {regression['baseline']:.3f}s ({regression['ratio']:.2f}x)")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,308 @@
+"""Synthetic reviewer data in the field-per-line layout DataEngining.load_csv reads.
+
+A synthetic site is a list of ground-truth observations, each one of the three
+SUBSETS kinds (crossing without a bus, bus user crossing, bus user not
+crossing). Every coder records the observations with controllable noise:
+
+- missedObservationRate: probability a coder does not record an observation,
+- timeJitter: standard deviation (seconds) added to every recorded time,
+- disagreementRate: probability a categorical field gets a different value,
+- missingFieldRate: probability a field is left blank.
+
+generateSyntheticDataset writes one folder per site (named by its fid) with one
+CSV per coder, the ground truth as a human QC file per site and a matching
+characteristics table, so the folders run through computeDataFolderToCSV and
+performAccuracyTest unchanged.
+"""
+
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+# Reviewer CSV fields, in the order the collected sheets use.
+REVIEWER_FIELDS = [
+    'Video Title',
+    'Initials',
+    'Location Name',
+    'Bus Stop IDs/Addresses',
+    'Count of Bus Stop Routes',
+    'Crosswalk Location Relative to Bus Stop',
+    'Crossing Treatment',
+    'Refuge Island',
+    'User Count',
+    'User Type',
+    'Group Size',
+    'Estimated Gender',
+    'Estimated Age Group',
+    'Clothing Color',
+    'Visibility Scale',
+    'Estimated Visible Distrction',
+    'User Notes',
+    'Bus Interaction',
+    'Roadway Crossing',
+    'Type of Bus Interaction',
+    'Bus Stop Arrival Time',
+    'Bus Stop Departure Time',
+    'Bus Noteworthy Events',
+    'Crosswalk Crossing',
+    'Pedestrian Phase Crossing',
+    'Intend to Cross Timestamp',
+    'Crossing Start Time',
+    'Refuge Island Start Time',
+    'Refuge Island End Time',
+    'Did User Finish Crossing During Pedestrian Phase',
+    'Crossing End Time',
+    'Crossing Interaction Notes',
+    'Bus Presence',
+    'Crossing Location Relative to Bus',
+    'Crossing Location Relative to Bus Stop',
+    'Noteworthy Events',
+    'Vehicle Traffic',
+    'General Reviewer Notes',
+]
+
+TIME_FIELDS = [
+    'Bus Stop Arrival Time',
+    'Bus Stop Departure Time',
+    'Intend to Cross Timestamp',
+    'Crossing Start Time',
+    'Refuge Island Start Time',
+    'Refuge Island End Time',
+    'Crossing End Time',
+]
+
+# Per-observation categorical fields and the values coders pick from.
+CATEGORICAL_CHOICES = {
+    'User Type': ['Pedestrian', 'Bicyclist'],
+    'Group Size': ['1', '2', '3', '4'],
+    'Estimated Gender': ['Male', 'Female'],
+    'Estimated Age Group': ['0-20', '21-35', '36-50', '>50'],
+    'Clothing Color': ['Black', 'White', 'Grey', 'Blue', 'Red', 'Green', 'Yellow', 'Brown'],
+    'Visibility Scale': ['1', '2', '3'],
+    'Estimated Visible Distrction': ['Yes', 'No'],
+    'Crosswalk Crossing': ['Yes', 'No'],
+    'Pedestrian Phase Crossing': ['Yes', 'No', 'N/A'],
+    'Did User Finish Crossing During Pedestrian Phase': ['Yes', 'No'],
+    'Crossing Interaction Notes': ['Walk', 'Run', 'Courtesy run'],
+    'Crossing Location Relative to Bus': ['In front', 'Behind'],
+    'Crossing Location Relative to Bus Stop': ['Upstream', 'Downstream'],
+    'Vehicle Traffic': ['Light', 'Medium', 'High'],
+    'Type of Bus Interaction': ['Boarded', 'Alighted', 'Waited at bus stop'],
+}
+
+# Fields a coder never leaves blank (they identify the sheet, not the observation).
+_HEADER_FIELDS = ['Video Title', 'Initials', 'Location Name', 'User Count']
+
+# Observation kinds and their share of a site: NoneBusUserCrossing,
+# BusUserCrossing, BusNotCrossing.
+KIND_WEIGHTS = [0.6, 0.15, 0.25]
+
+# Recorded day window (seconds since midnight): 6:00 AM to 10:00 PM.
+_DAY_START = 6 * 3600
+_DAY_END = 22 * 3600
+_MEAN_GAP_SECONDS = 20.0
+
+
+def formatTime(seconds):
+    """Seconds since midnight as the sheets write it, e.g. '3:01:11 PM'."""
+    seconds = int(seconds)
+    hour, minute, second = seconds // 3600, seconds // 60 % 60, seconds % 60
+    suffix = 'AM' if hour < 12 else 'PM'
+    hour = hour % 12 or 12
+    return f"{hour}:{minute:02d}:{second:02d} {suffix}"
+
+
+def _pick(rng, field):
+    choices = CATEGORICAL_CHOICES[field]
+    return choices[rng.integers(len(choices))]
+
+
+def generateObservations(observations, rng):
+    """Ground-truth observations for one site, ordered by their first time.
+
+    Each observation is a dict with 'kind' (0, 1 or 2 as in SUBSETS), its
+    times in seconds ('' when not applicable) and its categorical values.
+    Observations are spread over the recording day; the mean gap shrinks once
+    the day is full, so large sites also get denser time windows.
+    """
+    meanGap = min(_MEAN_GAP_SECONDS, (_DAY_END - _DAY_START) / max(observations, 1))
+    starts = _DAY_START + np.cumsum(rng.exponential(meanGap, observations))
+    kinds = rng.choice(3, size=observations, p=KIND_WEIGHTS)
+    truth = []
+    for start, kind in zip(starts.tolist(), kinds.tolist()):
+        start = min(int(start), _DAY_END)
+        obs = {field: _pick(rng, field) for field in CATEGORICAL_CHOICES}
+        obs['kind'] = kind
+        obs.update({field: '' for field in TIME_FIELDS})
+        if kind == 0:
+            obs['Bus Interaction'] = 'No'
+            obs['Type of Bus Interaction'] = ''
+            obs['Crossing Location Relative to Bus'] = ''
+            obs['Bus Presence'] = 'No'
+        else:
+            obs['Bus Interaction'] = 'Yes'
+            obs['Bus Presence'] = 'Yes'
+            obs['Bus Stop Arrival Time'] = start
+            obs['Bus Stop Departure Time'] = start + int(rng.integers(5, 40))
+        if kind == 2:
+            obs['Roadway Crossing'] = 'No'
+            for field in ('Crosswalk Crossing', 'Pedestrian Phase Crossing',
+                          'Did User Finish Crossing During Pedestrian Phase',
+                          'Crossing Interaction Notes', 'Crossing Location Relative to Bus',
+                          'Crossing Location Relative to Bus Stop'):
+                obs[field] = ''
+        else:
+            obs['Roadway Crossing'] = 'Yes'
+            crossingStart = start + (int(rng.integers(0, 30)) if kind == 1 else 0)
+            obs['Intend to Cross Timestamp'] = max(crossingStart - int(rng.integers(0, 4)), _DAY_START)
+            obs['Crossing Start Time'] = crossingStart
+            obs['Crossing End Time'] = crossingStart + int(rng.integers(8, 25))
+        truth.append(obs)
+    return sorted(truth, key=lambda o: min(o[f] for f in TIME_FIELDS if o[f] != ''))
+
+
+def _recordObservation(obs, rng, timeJitter, disagreementRate, missingFieldRate):
+    """One coder's version of a ground-truth observation."""
+    record = {}
+    for field in CATEGORICAL_CHOICES:
+        value = obs[field]
+        if value != '' and rng.random() < disagreementRate:
+            others = [c for c in CATEGORICAL_CHOICES[field] if c != value]
+            value = others[rng.integers(len(others))]
+        record[field] = value
+    record['Bus Interaction'] = obs['Bus Interaction']
+    record['Roadway Crossing'] = obs['Roadway Crossing']
+    record['Bus Presence'] = obs['Bus Presence']
+    for field in TIME_FIELDS:
+        if obs[field] == '':
+            record[field] = ''
+        else:
+            jitter = int(round(rng.normal(0.0, timeJitter))) if timeJitter > 0 else 0
+            record[field] = formatTime(min(max(obs[field] + jitter, _DAY_START), _DAY_END))
+    for field in list(record):
+        if rng.random() < missingFieldRate:
+            record[field] = ''
+    return record
+
+
+def _siteHeader(siteName, siteId):
+    return {
+        'Video Title': f"SYNTHETIC_{siteId}",
+        'Location Name': siteName,
+        'Bus Stop IDs/Addresses': '',
+        'Count of Bus Stop Routes': '',
+        'Crosswalk Location Relative to Bus Stop': 'Upstream',
+        'Crossing Treatment': 'None',
+        'Refuge Island': 'No',
+        'User Notes': '',
+        'Bus Noteworthy Events': '',
+        'Noteworthy Events': '',
+        'General Reviewer Notes': '',
+    }
+
+
+def writeReviewerCsv(path, records):
+    """Write records (dicts keyed by REVIEWER_FIELDS) one field per line."""
+    with open(path, 'w', newline='', encoding='cp1252') as f:
+        writer = csv.writer(f)
+        for field in REVIEWER_FIELDS:
+            writer.writerow([field] + [record.get(field, '') for record in records])
+
+
+def generateSyntheticSite(siteFolderPath, siteId, observations, coders=3, timeJitter=2.0,
+                          disagreementRate=0.1, missingFieldRate=0.02, missedObservationRate=0.05,
+                          seed=None, humanQualityPath=None):
+    """Write one coder CSV per reviewer for a synthetic site; return the CSV paths.
+
+    With humanQualityPath the ground truth is also written there in the same
+    layout, as a human QC file for performAccuracyTest.
+    """
+    rng = np.random.default_rng(seed)
+    siteName = f"Synthetic Site {siteId}"
+    header = _siteHeader(siteName, siteId)
+    truth = generateObservations(observations, rng)
+    os.makedirs(siteFolderPath, exist_ok=True)
+    paths = []
+    for coder in range(coders):
+        initials = f"C{coder + 1}"
+        records = []
+        for obs in truth:
+            if rng.random() < missedObservationRate:
+                continue
+            record = dict(header)
+            record.update(_recordObservation(obs, rng, timeJitter, disagreementRate, missingFieldRate))
+            record['Initials'] = initials
+            record['User Count'] = str(len(records) + 1)
+            records.append(record)
+        path = os.path.join(siteFolderPath, f"{siteName}({initials}).csv")
+        writeReviewerCsv(path, records)
+        paths.append(path)
+    if humanQualityPath is not None:
+        humanRecords = []
+        for obs in truth:
+            record = dict(header)
+            record.update({field: obs[field] for field in CATEGORICAL_CHOICES})
+            record.update({field: obs[field] for field in ('Bus Interaction', 'Roadway Crossing', 'Bus Presence')})
+            record.update({field: formatTime(obs[field]) if obs[field] != '' else '' for field in TIME_FIELDS})
+            record['Initials'] = 'QC'
+            record['User Count'] = str(len(humanRecords) + 1)
+            humanRecords.append(record)
+        os.makedirs(os.path.dirname(humanQualityPath) or '.', exist_ok=True)
+        writeReviewerCsv(humanQualityPath, humanRecords)
+    return paths
+
+
+def writeSyntheticCharacteristics(path, siteIds):
+    """Characteristics table with the columns mergeCharacteristicWithQualityDataFrame joins."""
+    characteristics = pd.DataFrame({
+        'fid': siteIds,
+        'STOP_ID': [str(siteId) for siteId in siteIds],
+        'GTFSSTOP_NAME': [f"Synthetic Site {siteId}" for siteId in siteIds],
+        'Num Bus Routes': 1,
+        'Crossing Treatment': 'None',
+        'Crosswalk location relative to bus stop': 'upstream',
+        'Refuge Island/Median': 'no',
+        'AADT': 10000,
+        'Speed Limit': 30,
+        # The join drops the table's last column, as with the collected table.
+        'Annual Crash Rate': 0.0,
+    })
+    characteristics.to_csv(path, index=False)
+    return path
+
+
+def generateSyntheticDataset(outputFolderPath, sites=1, observationsPerSite=100, coders=3, timeJitter=2.0,
+                             disagreementRate=0.1, missingFieldRate=0.02, missedObservationRate=0.05,
+                             seed=0, firstSiteId=900000):
+    """Write a complete synthetic input tree under outputFolderPath.
+
+    Layout: inputData/{fid}/ (coder CSVs), human_quality_control/{fid}.csv
+    (ground truth) and characteristics.csv. Returns a dict with those paths
+    and 'humanQualityFiles', {fid: path} as sweepThresholds expects.
+    """
+    inputDataPath = os.path.join(outputFolderPath, 'inputData')
+    humanQualityFolder = os.path.join(outputFolderPath, 'human_quality_control')
+    siteIds = [firstSiteId + site for site in range(sites)]
+    humanQualityFiles = {}
+    for site, siteId in enumerate(siteIds):
+        humanQualityFiles[siteId] = os.path.join(humanQualityFolder, f"{siteId}.csv")
+        generateSyntheticSite(
+            os.path.join(inputDataPath, str(siteId)),
+            siteId,
+            observationsPerSite,
+            coders=coders,
+            timeJitter=timeJitter,
+            disagreementRate=disagreementRate,
+            missingFieldRate=missingFieldRate,
+            missedObservationRate=missedObservationRate,
+            seed=None if seed is None else seed + site,
+            humanQualityPath=humanQualityFiles[siteId],
+        )
+    characteristicsPath = writeSyntheticCharacteristics(os.path.join(outputFolderPath, 'characteristics.csv'), siteIds)
+    return {
+        'inputDataPath': inputDataPath,
+        'characteristicsPath': characteristicsPath,
+        'humanQualityFiles': humanQualityFiles,
+    }
@@ -7,7 +7,8 @@ from .scoring import (
     calculateClothingColorScore,
     computeTimeScore,
     computeConditionScore,
-    computeFeatureScores
+    computeFeatureScores,
+    PairScoreCache
 )
 from .matching import (
     compareParameters,
@@ -22,9 +23,19 @@ from .data_engineering import (
     INT_COLS,
     FLOAT_COLS
 )
-from .clustering import (
-    runMode
-)
+
+# clustering pulls in scikit-learn and matplotlib; load it on first use only.
+_LAZY_CLUSTERING = ('runMode', 'plotAverageSilhouetteScore', 'encodeFeatures', 'sweepSilhouetteScores',
+                    'StreamingClusterModel', 'iterConsensusChunks')
+
+
+def __getattr__(name):
+    if name in _LAZY_CLUSTERING:
+        from . import clustering
+        return getattr(clustering, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 __all__ = [
     'AccuracyScore',
     'calculateTimeScore',
@@ -33,6 +44,7 @@ __all__ = [
     'computeTimeScore',
     'computeConditionScore',
     'computeFeatureScores',
+    'PairScoreCache',
     'compareParameters',
     'compareTimeDistance',
     'secondsToTimeString',
@@ -43,5 +55,10 @@ __all__ = [
     'float_cols',
     'INT_COLS',
     'FLOAT_COLS',
-    'runMode'
+    'runMode',
+    'plotAverageSilhouetteScore',
+    'encodeFeatures',
+    'sweepSilhouetteScores',
+    'StreamingClusterModel',
+    'iterConsensusChunks'
 ]
@@ -1,14 +1,23 @@
+"""KMeans clustering of consensus rows.
+
+scikit-learn and matplotlib are imported inside the functions that use them so
+that importing the package (and the matching/QC pipeline) does not load them.
+"""
+
 import os
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-import matplotlib.pyplot as plt
-from sklearn import metrics
 
 
-from config import EXCLUDED_FROM_ACCURACY, OUTPUT_PATH
+from config import (
+    EXCLUDED_FROM_ACCURACY,
+    OUTPUT_PATH,
+    SILHOUETTE_SAMPLE_SIZE,
+    CLUSTER_SWEEP_JOBS,
+    CLUSTER_CHUNK_SIZE,
+    CLUSTER_MODEL_PATH,
+)
+from traffic_research.core.data_engineering import generateDateFrame, INT_COLS, FLOAT_COLS
 from traffic_research.processing.quality_control import parseEnumObjectRow
 
 
@@ -31,6 +40,11 @@ ExcludedColumns = [
 ]
 
 
+# Columns dataEnginingRow always parses to numbers; these are the numeric
+# columns runMode clusters on once ExcludedColumns are removed.
+PARSED_NUMERIC_COLUMNS = set(INT_COLS) | set(FLOAT_COLS) | {'Estimated Age Group', 'Crossing Location Relative to Bus Stop'}
+
+
 def featureSelection(df):
     """Return dataframe with only columns not in EXCLUDED_FROM_ACCURACY and not time fields."""
     excluded_from_accuracy = list(ExcludedColumns)
@@ -47,6 +61,9 @@ def parseGroup(group):
 
 def visualize_clusters(X_scaled, labels, n_clusters, output_path):
     """Reduce scaled features to 2D with PCA and scatter-plot by cluster."""
+    import matplotlib.pyplot as plt
+    from sklearn.decomposition import PCA
+
     pca = PCA(n_components=2, random_state=None)
     X_2d = pca.fit_transform(X_scaled)
 
@@ -66,10 +83,14 @@ def visualize_clusters(X_scaled, labels, n_clusters, output_path):
 
 
 
-def runMode(df, n_clusters):
-    # -----------------------------
-    # 1. Load & preprocess dataframe
-    # -----------------------------
+def encodeFeatures(df):
+    """Select, one-hot encode and standardize the clustering features of df.
+
+    Returns the scaled feature matrix runMode clusters; a sweep encodes once
+    and reuses it for every (k, seed) run.
+    """
+    from sklearn.preprocessing import StandardScaler
+
     # Use only columns not in EXCLUDED_FROM_ACCURACY for clustering
     df_for_clustering = featureSelection(df)
     # Select numeric columns
@@ -80,12 +101,30 @@ def runMode(df, n_clusters):
     encoded = encoded.fillna(-1)
     encoded.columns = encoded.columns.astype(str)
 
-
-    # -----------------------------
-    # 3. Scale + cluster
-    # -----------------------------
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(encoded)
+    return scaler.fit_transform(encoded)
+
+
+def silhouetteForK(X_scaled, n_clusters, seed=None, sampleSize=None):
+    """Fit KMeans with n_clusters and return its silhouette score.
+
+    With sampleSize the silhouette is estimated on that many randomly drawn
+    rows (drawn with seed) instead of the full O(n^2) computation.
+    """
+    from sklearn import metrics
+    from sklearn.cluster import KMeans
+
+    labels = KMeans(n_clusters=n_clusters, random_state=seed).fit_predict(X_scaled)
+    if sampleSize is not None and sampleSize >= len(X_scaled):
+        sampleSize = None
+    return metrics.silhouette_score(X_scaled, labels, metric='euclidean', sample_size=sampleSize, random_state=seed)
+
+
+def runMode(df, n_clusters):
+    from sklearn import metrics
+    from sklearn.cluster import KMeans
+
+    X_scaled = encodeFeatures(df)
 
     kmeans = KMeans(n_clusters=n_clusters, random_state=None)
     labels = kmeans.fit_predict(X_scaled)
@@ -99,17 +138,218 @@ def runMode(df, n_clusters):
     return silhouette_score
 
 
-def plotAverageSilhouetteScore(df,numberOfIterations = 10, maxNumberOfClusters=14):
-    sumScores = [0]*(maxNumberOfClusters-1)
-    for i in range(numberOfIterations):
-        for n_clusters in range(2, maxNumberOfClusters):
-            silhouette_score = runMode(df, n_clusters=n_clusters)
-            sumScores[n_clusters-2] += silhouette_score
-    averageScores = [sumScores[i]/numberOfIterations for i in range(maxNumberOfClusters-2)]
-    print(averageScores)
-    plt.plot(range(2, 14), averageScores)
+def sweepSilhouetteScores(df, numberOfIterations=10, maxNumberOfClusters=14,
+                          sampleSize=SILHOUETTE_SAMPLE_SIZE, n_jobs=CLUSTER_SWEEP_JOBS):
+    """Silhouette score of every (n_clusters, seed) pair of the sweep.
+
+    Features are encoded and scaled once; the k x seed grid (k in
+    2..maxNumberOfClusters-1, seeds 0..numberOfIterations-1) runs in parallel
+    with joblib. Returns a DataFrame with columns n_clusters, seed, silhouette.
+    """
+    from joblib import Parallel, delayed
+
+    X_scaled = encodeFeatures(df)
+    grid = [
+        (n_clusters, seed)
+        for seed in range(numberOfIterations)
+        for n_clusters in range(2, maxNumberOfClusters)
+    ]
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(silhouetteForK)(X_scaled, n_clusters, seed, sampleSize) for n_clusters, seed in grid
+    )
+    return pd.DataFrame(
+        [(n_clusters, seed, score) for (n_clusters, seed), score in zip(grid, scores)],
+        columns=['n_clusters', 'seed', 'silhouette'],
+    )
+
+
+def plotAverageSilhouetteScore(df,numberOfIterations = 10, maxNumberOfClusters=14,
+                               sampleSize=SILHOUETTE_SAMPLE_SIZE, n_jobs=CLUSTER_SWEEP_JOBS):
+    """Plot the mean silhouette score per number of clusters over numberOfIterations seeds.
+
+    Runs sweepSilhouetteScores and saves only the final curve; returns the
+    average score per n_clusters (2..maxNumberOfClusters-1).
+    """
+    import matplotlib.pyplot as plt
+
+    scores = sweepSilhouetteScores(df, numberOfIterations, maxNumberOfClusters, sampleSize, n_jobs)
+    averageScores = scores.groupby('n_clusters')['silhouette'].mean()
+    print(averageScores.tolist())
+    plt.plot(averageScores.index, averageScores.to_numpy())
     plt.xlabel('Number of clusters')
     plt.ylabel('Average Silhouette score')
     plt.title('Average Silhouette score vs number of clusters')
     plt.savefig(os.path.join(OUTPUT_PATH, 'silhouette_score_vs_number_of_clusters.png'))
-    plt.close()
\ No newline at end of file
+    plt.close()
+    return averageScores.tolist()
+
+
+def countConsensusRecords(path):
+    """Number of records (columns after the field-name column) in a transposed output CSV."""
+    import csv
+
+    with open(path, newline='', encoding='cp1252') as f:
+        firstLine = next(csv.reader(f), [])
+    return max(len(firstLine) - 1, 0)
+
+
+def splitConsensusChunks(path, folder, chunkSize=CLUSTER_CHUNK_SIZE):
+    """Split a transposed consensus CSV into transposed chunk files of chunkSize records each.
+
+    The file is read once, line by line: every field line is sliced into the
+    chunks' record columns and appended, after its field name, to each chunk
+    file in folder. Returns the chunk file paths in record order.
+    """
+    import csv
+
+    recordCount = countConsensusRecords(path)
+    starts = range(1, recordCount + 1, chunkSize)
+    chunkPaths = [os.path.join(folder, f'chunk{index}.csv') for index in range(len(starts))]
+    chunkFiles = [open(chunkPath, 'w', newline='', encoding='cp1252') for chunkPath in chunkPaths]
+    try:
+        writers = [csv.writer(chunkFile) for chunkFile in chunkFiles]
+        with open(path, newline='', encoding='cp1252') as f:
+            for line in csv.reader(f):
+                if not line:
+                    continue
+                for start, writer in zip(starts, writers):
+                    end = min(start + chunkSize, recordCount + 1)
+                    # Short lines are padded so every chunk file keeps its width.
+                    values = line[start:end]
+                    writer.writerow([line[0]] + values + [''] * (end - start - len(values)))
+    finally:
+        for chunkFile in chunkFiles:
+            chunkFile.close()
+    return chunkPaths
+
+
+def _parsedChunks(chunkPaths, chunkSize):
+    # Chunk rows are indexed by their record position in the split file.
+    for position, chunkPath in enumerate(chunkPaths):
+        chunk = generateDateFrame(chunkPath).dropna(how='all')
+        if len(chunk):
+            chunk.index = chunk.index + position * chunkSize
+            yield chunk
+
+
+def iterConsensusChunks(path, chunkSize=CLUSTER_CHUNK_SIZE):
+    """Yield a transposed consensus CSV (allComputedRows.csv or a site CSV) chunkSize records at a time.
+
+    The file is split once into temporary chunk files (splitConsensusChunks)
+    and each chunk is parsed like generateDateFrame, so only chunkSize records
+    are held in memory at once. Rows keep their record position in the file
+    as index; all-empty records are dropped.
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder:
+        yield from _parsedChunks(splitConsensusChunks(path, folder, chunkSize), chunkSize)
+
+
+class StreamingClusterModel:
+    """Mini-batch k-means over consensus tables read in chunks.
+
+    Uses the same feature selection as runMode (featureSelection, parsed
+    numeric columns, missing values as -1). The feature columns are fixed by
+    the first chunk fitted, so later chunks and new sites are encoded the same way.
+    fit makes one pass to fit the scaler and `epochs` passes of
+    MiniBatchKMeans.partial_fit; update feeds a new site's rows into the
+    existing model, and assignClusters labels rows without refitting.
+    """
+
+    def __init__(self, n_clusters, seed=0, batchSize=CLUSTER_CHUNK_SIZE):
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.preprocessing import StandardScaler
+
+        self.n_clusters = n_clusters
+        self.seed = seed
+        self.batchSize = batchSize
+        self.featureColumns = None
+        self.scaler = StandardScaler()
+        self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=seed, batch_size=batchSize, n_init=3)
+        self.rowsSeen = 0
+        # Rows held back until the first partial_fit has at least n_clusters rows.
+        self._pending = None
+
+    def featureMatrix(self, df):
+        """Feature matrix of df in the model's (fixed) feature columns."""
+        if self.featureColumns is None:
+            # Chunks infer dtypes from their own values (an all-empty text
+            # column reads as float), so select by the parsed schema instead.
+            self.featureColumns = [col for col in featureSelection(df).columns if col in PARSED_NUMERIC_COLUMNS]
+        features = df.reindex(columns=self.featureColumns)
+        features = features.apply(pd.to_numeric, errors='coerce').astype('float64')
+        return features.fillna(-1).to_numpy()
+
+    def _batches(self, X):
+        # partial_fit needs at least n_clusters rows in the first batch.
+        step = max(self.batchSize, self.n_clusters)
+        for start in range(0, len(X), step):
+            yield X[start:start + step]
+
+    def _partialFit(self, X):
+        if self._pending is not None:
+            X = np.vstack([self._pending, X])
+            self._pending = None
+        if not hasattr(self.kmeans, 'cluster_centers_') and len(X) < self.n_clusters:
+            self._pending = X
+            return
+        for batch in self._batches(X):
+            self.kmeans.partial_fit(batch)
+        self.rowsSeen += len(X)
+
+    def fit(self, paths, chunkSize=CLUSTER_CHUNK_SIZE, epochs=1):
+        """Fit the scaler, then k-means, on one or more consensus CSVs read in chunks."""
+        import tempfile
+
+        if isinstance(paths, str):
+            paths = [paths]
+        with tempfile.TemporaryDirectory() as folder:
+            # Every file is split once; the scaler pass and each epoch re-read its chunk files.
+            chunkPaths = [
+                chunkPath
+                for path in paths
+                for chunkPath in splitConsensusChunks(path, tempfile.mkdtemp(dir=folder), chunkSize)
+            ]
+            # Row positions are not used here, so the files' chunks are read as one list.
+            for chunk in _parsedChunks(chunkPaths, chunkSize):
+                self.scaler.partial_fit(self.featureMatrix(chunk))
+            for _ in range(epochs):
+                for chunk in _parsedChunks(chunkPaths, chunkSize):
+                    self._partialFit(self.scaler.transform(self.featureMatrix(chunk)))
+        return self
+
+    def update(self, path, chunkSize=CLUSTER_CHUNK_SIZE):
+        """Online update with a new site's consensus CSV; the scaler is kept fixed."""
+        for chunk in iterConsensusChunks(path, chunkSize):
+            self._partialFit(self.scaler.transform(self.featureMatrix(chunk)))
+        return self
+
+    def predict(self, df):
+        """Cluster label of every row of a parsed consensus DataFrame."""
+        return self.kmeans.predict(self.scaler.transform(self.featureMatrix(df)))
+
+    def assignClusters(self, path, chunkSize=CLUSTER_CHUNK_SIZE):
+        """Label the records of a consensus CSV.
+
+        Returns a Series in file order, indexed by each record's position in
+        the file (0 is the first record); all-empty records are skipped.
+        """
+        labels = [
+            pd.Series(self.predict(chunk), index=chunk.index, name='Cluster')
+            for chunk in iterConsensusChunks(path, chunkSize)
+        ]
+        return pd.concat(labels) if labels else pd.Series(np.array([], dtype=int), name='Cluster')
+
+    def save(self, path=CLUSTER_MODEL_PATH):
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump(self, path)
+        return path
+
+    @staticmethod
+    def load(path=CLUSTER_MODEL_PATH):
+        import joblib
+
+        return joblib.load(path)
@@ -1,6 +1,7 @@
 import pandas as pd
 import re
 from enum import Enum
+from .profiling import profileStage
 
 class DataEngining:
     """Data engineering class for processing traffic research data."""
@@ -418,13 +419,15 @@ DTYPE_MAPPING = {
 dtypeMapping = DTYPE_MAPPING
 
 
-def generateDateFrameList(path_urls):
+def generateDateFrameList(path_urls, profiler=None):
     """Generate a list of DataFrames from a list of file paths."""
     df_list = []
     for path in path_urls:
-        load_df = DataEngining.load_csv(path)
-        load_df = load_df.apply(DataEngining.dataEnginingRow, axis=1)
-        load_df = load_df.astype(DTYPE_MAPPING)
+        with profileStage(profiler, 'load_csv'):
+            load_df = DataEngining.load_csv(path)
+        with profileStage(profiler, 'row_parse'):
+            load_df = load_df.apply(DataEngining.dataEnginingRow, axis=1)
+            load_df = load_df.astype(DTYPE_MAPPING)
         df_list.append({"path" : path, "df":load_df})
     return df_list
 
@@ -1,20 +1,100 @@
 """Functions for matching and comparing rows across dataframes."""
 
+import json
+import numpy as np
 import pandas as pd
-import sys
 import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
-from .scoring import computeFeatureScores
-from config import EXCLUDED_FROM_ACCURACY
+from .scoring import TIME_FIELDS, computeConditionScore, computeTimeScoreValues
+from config import EXCLUDED_FROM_ACCURACY, TIME_SCORE_WEIGHT, CONDITION_SCORE_WEIGHT
+
+# (from, to) reviewer positions matched by generateReferenceGraph, in order.
+# Targets claimed by an earlier pass are unavailable to later passes.
+MATCH_PASSES = [(0, 1), (0, 2), (1, 2)]
+
+# Fallback time fields, nearest in meaning first, tried when a row has no
+# value in the subset's time column (generateReferenceGraph secondaryTimeMatching).
+SECONDARY_TIME_FIELDS = {
+    'Crossing Start Time': [
+        'Intend to Cross Timestamp', 'Refuge Island Start Time', 'Refuge Island End Time',
+        'Crossing End Time', 'Bus Stop Arrival Time', 'Bus Stop Departure Time',
+    ],
+    'Bus Stop Arrival Time': [
+        'Bus Stop Departure Time', 'Intend to Cross Timestamp', 'Crossing Start Time',
+        'Refuge Island Start Time', 'Refuge Island End Time', 'Crossing End Time',
+    ],
+}
+
+def selectBestMatch(window, targetTime, fromRow, fromTimeValues, candidateTime, candidateTimeValues, candidateRow,
+                    timeThreshold, percentageThreshold, cachedScore=None, storeScore=None):
+    """Best-scoring candidate of one source row's time window.
+
+    window holds the unclaimed target positions (sorted in place, nearest
+    time first); candidateTime, candidateTimeValues and candidateRow return a
+    position's time, TIME_FIELDS values and row. cachedScore(i) returns a
+    stored pair score or None, and storeScore(i, score) records a computed one.
+
+    Candidates whose time score alone cannot reach percentageThreshold or beat
+    the current best are pruned before condition scoring; ties go to the
+    lowest position, as in a plain forward scan. Returns (maxScore, maxIndex,
+    scored, pruned, cacheHits), maxIndex being -1 without a match.
+    """
+    maxScore, maxIndex = 0.0, -1
+    scored = pruned = cacheHits = 0
+    # Visit the nearest candidates first so a strong match raises maxScore
+    # early and lets the bound below prune the rest of the window.
+    window.sort(key=lambda j: (abs(candidateTime(j) - targetTime), j))
+    for i in window:
+        score = cachedScore(i) if cachedScore is not None else None
+        if score is not None:
+            cacheHits += 1
+        else:
+            # The condition part adds at most CONDITION_SCORE_WEIGHT, so skip
+            # candidates that cannot reach the threshold or beat the best so far.
+            timeScore = computeTimeScoreValues(fromTimeValues, candidateTimeValues(i), timeThreshold)
+            bound = timeScore * TIME_SCORE_WEIGHT + CONDITION_SCORE_WEIGHT
+            if (bound < percentageThreshold or bound < maxScore
+                    or (bound == maxScore and i > maxIndex)):
+                pruned += 1
+                continue
+            conditionScore = computeConditionScore(fromRow, candidateRow(i))
+            score = timeScore * TIME_SCORE_WEIGHT + conditionScore * CONDITION_SCORE_WEIGHT
+            if storeScore is not None:
+                storeScore(i, score)
+        scored += 1
+        if score >= percentageThreshold and (
+                score > maxScore or (score == maxScore and i < maxIndex)):
+            maxScore, maxIndex = score, i
+    return maxScore, maxIndex, scored, pruned, cacheHits
+
 
 # assume range_value is user inputed value
-def generateReferenceGraph(dflist, timeThreshold, percentageThreshold, timeColumn):
+def generateReferenceGraph(dflist, timeThreshold, percentageThreshold, timeColumn, scoreCache=None, stats=None,
+                           secondaryTimeMatching=False):
     """
     Generate a reference graph matching rows across three dataframes.
 
     Each df in dflist['df'] is assumed to be sorted by the same time column
     (passed in as timeColumn). Matching is restricted to rows in the target
     dataframe whose time lies in [targetTime - timeThreshold, targetTime + timeThreshold].
+
+    When a PairScoreCache is given, pair scores are read from and written to it,
+    so reruns over the same rows (e.g. another percentageThreshold) skip scoring.
+
+    Each source row's window is scored by selectBestMatch (shared with the
+    streaming matcher): candidates whose time score alone cannot reach
+    percentageThreshold or beat the current best are pruned before condition
+    scoring; the chosen matches are the same as a full forward scan.
+
+    With secondaryTimeMatching, a source row whose timeColumn is missing is
+    not left unmatched: its window is taken on the first field of
+    SECONDARY_TIME_FIELDS[timeColumn] it has, through a sorted index of that
+    field in the target frame (built once per frame and field), and scored
+    the same way.
+
+    When a PipelineStats is given it receives per-pass counters (sourceRows,
+    invalidTimeRows, secondaryTimeRows, noWindowRows, scored, pruned, matched,
+    perfectMatches, cacheHits, usedTargetsSkipped) and per-row windowSize and
+    candidatesScoredPerRow distributions.
     """
     graph = {}
     used_targets = set()  # (path, index) already used as a match target
@@ -53,6 +133,31 @@ def generateReferenceGraph(dflist, timeThreshold, percentageThreshold, timeColum
 
         return best_idx
 
+    secondaryIndexes = {}  # (path, field) -> (sorted valid times, their positions, all times)
+
+    def secondaryWindow(toDFName, toDF, fromTimeValues):
+        """(window, windowSize, window times, source time) of a row without a primary time, or None."""
+        fields = SECONDARY_TIME_FIELDS.get(timeColumn, [f for f in TIME_FIELDS if f != timeColumn])
+        for field in fields:
+            sourceTime = fromTimeValues[TIME_FIELDS.index(field)]
+            if np.isnan(sourceTime) or sourceTime < 0:
+                continue
+            index = secondaryIndexes.get((toDFName, field))
+            if index is None:
+                values = toDF[field].to_numpy(dtype='float64', na_value=np.nan)
+                positions = np.flatnonzero(values >= 0)
+                order = np.argsort(values[positions], kind='stable')
+                index = secondaryIndexes[(toDFName, field)] = (values[positions][order], positions[order], values)
+            sortedTimes, positions, values = index
+            if len(sortedTimes) == 0:
+                continue
+            lo = np.searchsorted(sortedTimes, sourceTime - timeThreshold, side='left')
+            hi = np.searchsorted(sortedTimes, sourceTime + timeThreshold, side='right')
+            candidates = positions[lo:hi].tolist()
+            window = [i for i in candidates if (toDFName, i) not in used_targets]
+            return window, len(candidates), values, sourceTime
+        return None
+
     def helper(fromDFTuple, toDFTuple, percentageThreshold, used_targets):
         fromDF = fromDFTuple["df"]
         toDF = toDFTuple["df"]
@@ -61,6 +166,11 @@ def generateReferenceGraph(dflist, timeThreshold, percentageThreshold, timeColum
 
         # Cache target time column from toDF for faster access
         to_times = toDF[timeColumn].values if not toDF.empty else []
+        from_labels = fromDF.index
+        to_labels = toDF.index
+        from_time_rows = fromDF[TIME_FIELDS].to_numpy(dtype='float64', na_value=np.nan).tolist()
+        to_time_rows = toDF[TIME_FIELDS].to_numpy(dtype='float64', na_value=np.nan).tolist()
+        scored = pruned = cacheHits = 0
 
         for pos in range(len(fromDF)):
             from_row = fromDF.iloc[pos]  # cache row once per from-row; use position for iloc
@@ -69,90 +179,220 @@ def generateReferenceGraph(dflist, timeThreshold, percentageThreshold, timeColum
             maxScore, maxIndex = 0.0, -1
 
             # If target time is invalid, skip time-based window and leave as no-match
+            # (unless a secondary time field can place the row).
+            secondary = None
             if pd.isna(targetTime) or targetTime < 0:
-                key = (fromDFName, pos)
-                if key not in graph:
-                    graph[key] = []
-                graph[key].append({"key": {"dfName": toDFName, "index": maxIndex}, "score": maxScore})
-                continue
+                if secondaryTimeMatching:
+                    secondary = secondaryWindow(toDFName, toDF, from_time_rows[pos])
+                if secondary is None:
+                    if stats is not None:
+                        stats.count('invalidTimeRows')
+                    key = (fromDFName, pos)
+                    if key not in graph:
+                        graph[key] = []
+                    graph[key].append({"key": {"dfName": toDFName, "index": maxIndex}, "score": maxScore})
+                    continue
+                if stats is not None:
+                    stats.count('secondaryTimeRows')
+                window, windowSize, window_times, targetTime = secondary
 
-            start_idx = binarySearch(toDF, targetTime)
-            if start_idx == -1:
-                # No candidate in the time window on the low side; record no-match
-                key = (fromDFName, pos)
-                if key not in graph:
-                    graph[key] = []
-                graph[key].append({"key": {"dfName": toDFName, "index": maxIndex}, "score": maxScore})
-                continue
+            if secondary is None:
+                window_times = to_times
+                start_idx = binarySearch(toDF, targetTime)
+                if start_idx == -1:
+                    # No candidate in the time window on the low side; record no-match
+                    if stats is not None:
+                        stats.count('noWindowRows')
+                    key = (fromDFName, pos)
+                    if key not in graph:
+                        graph[key] = []
+                    graph[key].append({"key": {"dfName": toDFName, "index": maxIndex}, "score": maxScore})
+                    continue
 
-            upper_bound = targetTime + timeThreshold
+                upper_bound = targetTime + timeThreshold
 
-            i = start_idx
-            while i < len(toDF):
-                t = to_times[i]
-                if pd.isna(t):
-                    i += 1
-                    continue
-                if t > upper_bound:
-                    break
+                window = []
+                windowSize = 0
+                i = start_idx
+                while i < len(toDF):
+                    t = to_times[i]
+                    if pd.isna(t):
+                        i += 1
+                        continue
+                    if t > upper_bound:
+                        break
 
-                if (toDFName, i) in used_targets:
+                    windowSize += 1
+                    if (toDFName, i) not in used_targets:
+                        window.append(i)
                     i += 1
-                    continue
-
-                score = computeFeatureScores(from_row, toDF.iloc[i], timeThreshold)
-                if score >= percentageThreshold and score > maxScore:
-                    maxScore, maxIndex = score, i
-                    if maxScore >= 1.0:
-                        break  # perfect match; no need to check rest of window
 
-                i += 1
+            cachedScore = storeScore = None
+            if scoreCache is not None:
+                fromNode = (fromDFName, from_labels[pos])
+                cachedScore = lambda i: scoreCache.lookup(fromNode, (toDFName, to_labels[i]), timeThreshold)
+                storeScore = lambda i, score: scoreCache.store(fromNode, (toDFName, to_labels[i]), timeThreshold, score)
+            maxScore, maxIndex, rowScored, rowPruned, rowCacheHits = selectBestMatch(
+                window, targetTime, from_row, from_time_rows[pos],
+                window_times.__getitem__, to_time_rows.__getitem__, toDF.iloc.__getitem__,
+                timeThreshold, percentageThreshold, cachedScore, storeScore,
+            )
+            scored += rowScored
+            pruned += rowPruned
+            cacheHits += rowCacheHits
 
             if maxScore >= percentageThreshold and maxIndex >= 0:
                 used_targets.add((toDFName, maxIndex))
 
+            if stats is not None:
+                stats.observe('windowSize', windowSize)
+                stats.observe('candidatesScoredPerRow', rowScored)
+                stats.count('usedTargetsSkipped', windowSize - len(window))
+                if maxIndex >= 0:
+                    stats.count('matched')
+                    if maxScore >= 1.0:
+                        stats.count('perfectMatches')
+
             key = (fromDFName, pos)
             if key not in graph:
                 graph[key] = []
             graph[key].append({"key": {"dfName": toDFName, "index": maxIndex}, "score": maxScore})
 
-    helper(dflist[0], dflist[1], percentageThreshold, used_targets)
-    helper(dflist[0], dflist[2], percentageThreshold, used_targets)
-    helper(dflist[1], dflist[2], percentageThreshold, used_targets)
+        if stats is not None:
+            stats.count('sourceRows', len(fromDF))
+            stats.count('scored', scored)
+            stats.count('pruned', pruned)
+            stats.count('cacheHits', cacheHits)
+
+    for fromIdx, toIdx in MATCH_PASSES:
+        helper(dflist[fromIdx], dflist[toIdx], percentageThreshold, used_targets)
     return graph
 
 
 def exportGraphToCsv(graph, csv_path):
-    """Export the reference graph to a CSV with one row per node: from_dfName, from_index, then to_dfName_1, to_index_1, score_1, to_dfName_2, ... for all matches in the same row. dfName is stored as filename only (e.g. Alex.csv)."""
+    """Export the reference graph to a CSV with one row per node: from_dfName, from_index, then to_dfName_1, to_index_1, score_1, to_dfName_2, ... for all matches in the same row. dfName is stored as filename only (e.g. Alex.csv).
+
+    Edges are flattened once and pivoted into per-slot columns with array
+    indexing; basenames are computed once per reviewer path.
+    """
     os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    basenames = {}
     def _basename(path):
-        return os.path.basename(path) if path else ""
-    max_matches = max(len(matches) for _, matches in graph.items()) if graph else 0
-    rows = []
-    for key, matches in graph.items():
+        if path not in basenames:
+            basenames[path] = os.path.basename(path) if path else ""
+        return basenames[path]
+    if not graph:
+        pd.DataFrame([]).to_csv(csv_path, index=False)
+        return
+    fromNames, fromIndexes = [], []
+    for key in graph:
         if isinstance(key, tuple):
-            from_dfName = _basename(key[0])
-            from_index = key[1]
+            fromNames.append(_basename(key[0]))
+            fromIndexes.append(key[1])
         else:
             from_node = dict(key)
-            from_dfName = _basename(from_node.get("dfName", ""))
-            from_index = from_node.get("index", -1)
-        row = {"from_dfName": from_dfName, "from_index": from_index}
-        for i, m in enumerate(matches):
-            to_node = m["key"]
-            row[f"to_dfName_{i+1}"] = _basename(to_node.get("dfName", ""))
-            row[f"to_index_{i+1}"] = to_node.get("index", -1)
-            row[f"score_{i+1}"] = m["score"]
-        for i in range(len(matches), max_matches):
-            row[f"to_dfName_{i+1}"] = ""
-            row[f"to_index_{i+1}"] = ""
-            row[f"score_{i+1}"] = ""
-        rows.append(row)
-    df = pd.DataFrame(rows)
+            fromNames.append(_basename(from_node.get("dfName", "")))
+            fromIndexes.append(from_node.get("index", -1))
+    counts = np.fromiter((len(matches) for matches in graph.values()), dtype=np.int64, count=len(graph))
+    edges = [m["key"] for matches in graph.values() for m in matches]
+    edgeColumns = {
+        "to_dfName": np.array([_basename(to_node.get("dfName", "")) for to_node in edges], dtype=object),
+        "to_index": np.array([to_node.get("index", -1) for to_node in edges], dtype=object),
+        "score": np.array([m["score"] for matches in graph.values() for m in matches], dtype=object),
+    }
+    # Slot of every edge within its node's match list, and the node (row) it belongs to.
+    nodeOfEdge = np.repeat(np.arange(len(graph)), counts)
+    slotOfEdge = np.arange(len(edges)) - np.repeat(np.cumsum(counts) - counts, counts)
+    columns = {"from_dfName": fromNames, "from_index": fromIndexes}
+    for i in range(int(counts.max())):
+        inSlot = slotOfEdge == i
+        rows = nodeOfEdge[inSlot]
+        for name, values in edgeColumns.items():
+            column = np.full(len(graph), "", dtype=object)
+            column[rows] = values[inSlot]
+            columns[f"{name}_{i+1}"] = column
+    df = pd.DataFrame(columns)
     # df = df.sort_values(by=["from_dfName", "from_index"])
     df.to_csv(csv_path, index=False)
 
 
+# Bumped when the array layout written by saveGraph changes.
+GRAPH_FORMAT_VERSION = 1
+
+
+def saveGraph(graph, npz_path, dflist=None, **params):
+    """Save the reference graph as compressed arrays (.npz) that loadGraph reads back.
+
+    Reviewer paths are stored once in a reviewer table and nodes and edges
+    refer to them by position. With dflist, the table follows its reviewer
+    order and records each reviewer's row count, so a reload can detect
+    changed input. Keyword params (e.g. timeThreshold, percentageThreshold,
+    timeColumn) are stamped into the file.
+    """
+    os.makedirs(os.path.dirname(npz_path) or '.', exist_ok=True)
+    reviewers = [df["path"] for df in dflist] if dflist is not None else []
+    reviewerRows = [len(df["df"]) for df in dflist] if dflist is not None else []
+    reviewerIds = {path: i for i, path in enumerate(reviewers)}
+
+    def reviewerId(path):
+        if path not in reviewerIds:
+            reviewerIds[path] = len(reviewers)
+            reviewers.append(path)
+            reviewerRows.append(-1)
+        return reviewerIds[path]
+
+    nodeReviewer, nodeIndex, nodeEdges = [], [], []
+    edgeReviewer, edgeIndex, edgeScore = [], [], []
+    for (fromName, fromIndex), matches in graph.items():
+        nodeReviewer.append(reviewerId(fromName))
+        nodeIndex.append(fromIndex)
+        nodeEdges.append(len(matches))
+        for m in matches:
+            edgeReviewer.append(reviewerId(m["key"]["dfName"]))
+            edgeIndex.append(m["key"]["index"])
+            edgeScore.append(m["score"])
+    np.savez_compressed(
+        npz_path,
+        reviewers=np.array(reviewers, dtype=str),
+        reviewerRows=np.array(reviewerRows, dtype=np.int64),
+        nodeReviewer=np.array(nodeReviewer, dtype=np.int16),
+        nodeIndex=np.array(nodeIndex, dtype=np.int64),
+        nodeEdges=np.array(nodeEdges, dtype=np.int16),
+        edgeReviewer=np.array(edgeReviewer, dtype=np.int16),
+        edgeIndex=np.array(edgeIndex, dtype=np.int64),
+        edgeScore=np.array(edgeScore, dtype=np.float64),
+        params=np.array(json.dumps({"formatVersion": GRAPH_FORMAT_VERSION, **params})),
+    )
+
+
+def loadGraph(npz_path):
+    """Load a graph written by saveGraph.
+
+    Returns (graph, meta): graph has the generateReferenceGraph layout and
+    meta holds the stamped params plus 'reviewers', a list of (path, row
+    count) pairs (row count -1 when it was not recorded).
+    """
+    with np.load(npz_path, allow_pickle=False) as data:
+        meta = json.loads(str(data["params"]))
+        if meta.get("formatVersion") != GRAPH_FORMAT_VERSION:
+            raise ValueError(f"{npz_path}: unsupported graph format version {meta.get('formatVersion')}")
+        reviewers = data["reviewers"].tolist()
+        meta["reviewers"] = list(zip(reviewers, data["reviewerRows"].tolist()))
+        nodeReviewer = data["nodeReviewer"].tolist()
+        nodeIndex = data["nodeIndex"].tolist()
+        edgeEnds = np.cumsum(data["nodeEdges"]).tolist()
+        edges = [
+            {"key": {"dfName": reviewers[r], "index": i}, "score": score}
+            for r, i, score in zip(data["edgeReviewer"].tolist(), data["edgeIndex"].tolist(), data["edgeScore"].tolist())
+        ]
+    graph = {}
+    start = 0
+    for r, i, end in zip(nodeReviewer, nodeIndex, edgeEnds):
+        graph[(reviewers[r], i)] = edges[start:end]
+        start = end
+    return graph, meta
+
+
 def compareParameters(row0, row1, row2, fieldName, accuracy):
     """Compare three parameter values and update accuracy tracking.
     
@@ -192,13 +432,13 @@ def compareParameters(row0, row1, row2, fieldName, accuracy):
     # All three agree
     if match_count == 3:
         if should_track_accuracy:
-            accuracy.update(3, 0)
+            accuracy.update(3, 0, fieldName)
         return value_a
     
     # At least one pair matches - determine consensus
     if match_count >= 1:
         if should_track_accuracy:
-            accuracy.update(3, 1)
+            accuracy.update(3, 1, fieldName)
         
         # A matches both B and C -> A is consensus
         if ab_matches and ac_matches:
@@ -222,20 +462,21 @@ def compareParameters(row0, row1, row2, fieldName, accuracy):
     
     # No matches found
     if should_track_accuracy:
-        accuracy.update(3, 3)
+        accuracy.update(3, 3, fieldName)
     return ""
 
 
-def compareTimeDistance(timeA, timeB, timeC, accuracy, timeThreshold):
+def compareTimeDistance(timeA, timeB, timeC, accuracy, timeThreshold, fieldName=''):
     """Compare three time values and return the one with minimum average distance.
     
     Returns the time value that has the smallest average distance to the other two,
-    but only if at least one pair is within the time threshold.
+    but only if at least one pair is within the time threshold. Agreement is
+    recorded on accuracy under fieldName.
     """
     # Handle invalid time values (-1 indicates invalid/missing)
     countNegative = [timeA, timeB, timeC].count(-1)
     if countNegative >= 2:
-        accuracy.update(3, 3)
+        accuracy.update(3, 3, fieldName)
         return -1
     # Calculate distances between pairs
     distAB = abs(timeA - timeB)
@@ -255,7 +496,7 @@ def compareTimeDistance(timeA, timeB, timeC, accuracy, timeThreshold):
     # If all three are within threshold of each other
     if timeA != -1 and timeB != -1 and timeC != -1:
         if matchAB and matchAC and matchBC:
-            accuracy.update(3, 0)
+            accuracy.update(3, 0, fieldName)
             if avgA <= avgB and avgA <= avgC:
                 return timeA
             elif avgB <= avgA and avgB <= avgC:
@@ -263,7 +504,7 @@ def compareTimeDistance(timeA, timeB, timeC, accuracy, timeThreshold):
             else:
                 return timeC
         else:
-            accuracy.update(3, 1)
+            accuracy.update(3, 1, fieldName)
             if avgA <= avgB and avgA <= avgC:
                 return timeA
             elif avgB <= avgA and avgB <= avgC:
@@ -273,8 +514,8 @@ def compareTimeDistance(timeA, timeB, timeC, accuracy, timeThreshold):
     
     # If at least one pair matches
     if matchAB or matchAC or matchBC:
-        accuracy.update(3, 1)
+        accuracy.update(3, 1, fieldName)
         return max(timeA, timeB, timeC)
     # If all are different (no pairs within threshold)
-    accuracy.update(3, 3)
+    accuracy.update(3, 3, fieldName)
     return -1
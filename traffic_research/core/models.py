@@ -1,17 +1,127 @@
 """Data models for traffic research analysis."""
 
+import json
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+class RowRecord:
+    """One reviewer row as a plain tuple plus a column -> position map shared by its frame.
+
+    Supports record[field] and record.get(field, default) like a pandas
+    Series row, at the cost of a dict lookup and a tuple index.
+    """
+
+    __slots__ = ('values', 'fieldIndex')
+
+    def __init__(self, values, fieldIndex):
+        self.values = values
+        self.fieldIndex = fieldIndex
+
+    def __getitem__(self, field):
+        return self.values[self.fieldIndex[field]]
+
+    def get(self, field, default=None):
+        index = self.fieldIndex.get(field)
+        return default if index is None else self.values[index]
+
+    @staticmethod
+    def iterFrame(df):
+        """Yield the rows of df as RowRecords, in order."""
+        fieldIndex = {field: i for i, field in enumerate(df.columns)}
+        for values in df.itertuples(index=False, name=None):
+            yield RowRecord(values, fieldIndex)
+
+    @staticmethod
+    def fromFrame(df):
+        """All rows of df as a list of RowRecords (positional, like df.iloc)."""
+        return list(RowRecord.iterFrame(df))
+
 
 class AccuracyScore:
-    """Tracks accuracy scores across multiple files."""
-    
+    """Tracks visited and disagreeing cells per subset and field, plus per-file accuracy.
+
+    Counts live in preallocated (subset x field) int64 arrays; subsets and
+    fields get a row/column on first use and the arrays grow by doubling.
+    update() adds to the current subset (see subset()) and the given field,
+    or to the unnamed field '' when none is given. updateMany() adds a batch
+    of per-field increments with one array operation (see AccuracyBuffer),
+    merge() adds another AccuracyScore (e.g. from a worker) and toFrame()
+    returns the tidy table.
+    """
+
     def __init__(self, nofVisitedCell=0, nofDifferent=0):
-        self.nofVisitedCell = nofVisitedCell
-        self.nofDifferent = nofDifferent
+        self.subsets = {'': 0}
+        self.fields = {'': 0}
+        self._visited = np.zeros((4, 64), dtype=np.int64)
+        self._different = np.zeros((4, 64), dtype=np.int64)
+        self._subsetIndex = 0
+        self._visited[0, 0] = nofVisitedCell
+        self._different[0, 0] = nofDifferent
         self.filesAccuracy = []
-    
-    def update(self, visitedCells, differentCells):
-        self.nofVisitedCell += visitedCells
-        self.nofDifferent += differentCells
+        self.filesFieldAccuracy = []
+
+    def _grow(self, rows, columns):
+        shape = self._visited.shape
+        if rows <= shape[0] and columns <= shape[1]:
+            return
+        newShape = (max(shape[0], rows) * 2 if rows > shape[0] else shape[0],
+                    max(shape[1], columns) * 2 if columns > shape[1] else shape[1])
+        for name in ('_visited', '_different'):
+            grown = np.zeros(newShape, dtype=np.int64)
+            grown[:shape[0], :shape[1]] = getattr(self, name)
+            setattr(self, name, grown)
+
+    def _fieldIndex(self, field):
+        index = self.fields.get(field)
+        if index is None:
+            index = self.fields[field] = len(self.fields)
+            self._grow(len(self.subsets), len(self.fields))
+        return index
+
+    def _subsetIndexOf(self, subset):
+        index = self.subsets.get(subset)
+        if index is None:
+            index = self.subsets[subset] = len(self.subsets)
+            self._grow(len(self.subsets), len(self.fields))
+        return index
+
+    @contextmanager
+    def subset(self, subsetName):
+        """Attribute updates inside the block to subsetName."""
+        previous = self._subsetIndex
+        self._subsetIndex = self._subsetIndexOf(subsetName)
+        try:
+            yield self
+        finally:
+            self._subsetIndex = previous
+
+    def update(self, visitedCells, differentCells, field=''):
+        index = self.fields.get(field)
+        if index is None:
+            index = self._fieldIndex(field)
+        self._visited[self._subsetIndex, index] += visitedCells
+        self._different[self._subsetIndex, index] += differentCells
+
+    def updateMany(self, fields, visitedCells, differentCells):
+        """Add per-field increments (sequences of equal length) to the current subset in one step."""
+        fieldIndex = self.fields
+        indexes = np.fromiter(
+            (fieldIndex[field] if field in fieldIndex else self._fieldIndex(field) for field in fields),
+            dtype=np.intp, count=len(fields),
+        )
+        np.add.at(self._visited[self._subsetIndex], indexes, np.asarray(visitedCells, dtype=np.int64))
+        np.add.at(self._different[self._subsetIndex], indexes, np.asarray(differentCells, dtype=np.int64))
+
+    @property
+    def nofVisitedCell(self):
+        return int(self._visited.sum())
+
+    @property
+    def nofDifferent(self):
+        return int(self._different.sum())
 
     def getAccuracy(self):
         if self.nofVisitedCell == 0:
@@ -26,7 +136,159 @@ class AccuracyScore:
             'Location': fileName,
             'Accuracy': accuracy
         })
-    
+        self.filesFieldAccuracy.append(self.toFrame().assign(Location=fileName))
+
+    def getFilesFieldAccuracy(self):
+        """toFrame() of every appended file, stacked, with a Location column first."""
+        import pandas as pd
+
+        if not self.filesFieldAccuracy:
+            return self.toFrame().assign(Location='')[['Location', 'Subset', 'Field', 'Visited', 'Different', 'Accuracy']]
+        frame = pd.concat(self.filesFieldAccuracy, ignore_index=True)
+        return frame[['Location', 'Subset', 'Field', 'Visited', 'Different', 'Accuracy']]
+
+    def merge(self, other):
+        """Add another AccuracyScore's counts (matched by subset and field name) into this one."""
+        subsetRows = [self._subsetIndexOf(name) for name in other.subsets]
+        fieldColumns = [self._fieldIndex(name) for name in other.fields]
+        rows, columns = np.ix_(subsetRows, fieldColumns)
+        self._visited[rows, columns] += other._visited[:len(subsetRows), :len(fieldColumns)]
+        self._different[rows, columns] += other._different[:len(subsetRows), :len(fieldColumns)]
+        self.filesAccuracy.extend(other.filesAccuracy)
+        self.filesFieldAccuracy.extend(other.filesFieldAccuracy)
+        return self
+
+    def toFrame(self):
+        """Tidy table with one row per (Subset, Field) that has visited cells:
+        Subset, Field, Visited, Different, Accuracy."""
+        import pandas as pd
+
+        visited = self._visited[:len(self.subsets), :len(self.fields)]
+        different = self._different[:len(self.subsets), :len(self.fields)]
+        rows, columns = np.nonzero(visited)
+        subsetNames = np.array(list(self.subsets), dtype=object)
+        fieldNames = np.array(list(self.fields), dtype=object)
+        return pd.DataFrame({
+            'Subset': subsetNames[rows],
+            'Field': fieldNames[columns],
+            'Visited': visited[rows, columns],
+            'Different': different[rows, columns],
+            'Accuracy': 1.0 - different[rows, columns] / visited[rows, columns],
+        })
+
     def reset(self):
-        self.nofVisitedCell = 0
-        self.nofDifferent = 0
+        self._visited[:] = 0
+        self._different[:] = 0
+
+
+class AccuracyBuffer:
+    """Collects update() calls in plain lists and adds them to an AccuracyScore with one updateMany.
+
+    Accepted wherever compareParameters / compareTimeDistance take an
+    accuracy, so consensus building records a cell with a list append
+    instead of array indexing.
+    """
+
+    __slots__ = ('fields', 'visited', 'different')
+
+    def __init__(self):
+        self.fields = []
+        self.visited = []
+        self.different = []
+
+    def update(self, visitedCells, differentCells, field=''):
+        self.fields.append(field)
+        self.visited.append(visitedCells)
+        self.different.append(differentCells)
+
+    def flushTo(self, accuracy):
+        """Add the collected increments to accuracy (in its current subset) and empty the buffer."""
+        if self.fields:
+            accuracy.updateMany(self.fields, self.visited, self.different)
+            self.fields, self.visited, self.different = [], [], []
+
+
+class PipelineStats:
+    """Counters, value summaries and timings collected for one pipeline stage.
+
+    Stages nest: scope(name) returns (creating it on first use) a child
+    PipelineStats, e.g. one per site and, inside a site, one per subset.
+    Instrumented functions take stats=None and skip all collection when it is
+    None, so disabled stats cost one check per row.
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.values = {}
+        self.timings = {}
+        self.children = {}
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        """Record one observation of a distribution (e.g. a window size)."""
+        summary = self.values.get(name)
+        if summary is None:
+            self.values[name] = {'count': 1, 'sum': value, 'min': value, 'max': value}
+            return
+        summary['count'] += 1
+        summary['sum'] += value
+        if value < summary['min']:
+            summary['min'] = value
+        if value > summary['max']:
+            summary['max'] = value
+
+    def addTime(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.perf_counter() - start)
+
+    def scope(self, name):
+        child = self.children.get(name)
+        if child is None:
+            child = self.children[name] = PipelineStats()
+        return child
+
+    def merge(self, other):
+        """Add another PipelineStats (e.g. from another site) into this one."""
+        for name, n in other.counters.items():
+            self.count(name, n)
+        for name, summary in other.values.items():
+            mine = self.values.get(name)
+            if mine is None:
+                self.values[name] = dict(summary)
+                continue
+            mine['count'] += summary['count']
+            mine['sum'] += summary['sum']
+            mine['min'] = min(mine['min'], summary['min'])
+            mine['max'] = max(mine['max'], summary['max'])
+        for name, seconds in other.timings.items():
+            self.addTime(name, seconds)
+        for name, child in other.children.items():
+            self.scope(name).merge(child)
+        return self
+
+    def toDict(self):
+        result = {
+            'counters': dict(self.counters),
+            'values': {
+                name: dict(summary, mean=summary['sum'] / summary['count'])
+                for name, summary in self.values.items()
+            },
+            'timings': dict(self.timings),
+        }
+        if self.children:
+            result['children'] = {name: child.toDict() for name, child in self.children.items()}
+        return result
+
+    def writeJson(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.toDict(), f, indent=2, default=float)
@@ -0,0 +1,120 @@
+"""Per-site, per-stage wall time, CPU time and peak memory profiling."""
+
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+
+class PipelineProfiler:
+    """Records wall time, CPU time and peak traced memory of pipeline stages.
+
+    Stages are grouped by the site set with site(); repeated stages of the same
+    site (e.g. load_csv once per reviewer file) are accumulated: times add up,
+    peak memory is the largest peak seen. Peak memory is measured with
+    tracemalloc as the high-water mark above the allocation level at stage
+    start, so stages must not be nested.
+    """
+
+    RUN_SITE = '(run)'
+
+    def __init__(self):
+        self.currentSite = self.RUN_SITE
+        self._records = {}
+        self._startedTracing = False
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._startedTracing = True
+
+    def stop(self):
+        if self._startedTracing:
+            tracemalloc.stop()
+            self._startedTracing = False
+
+    @contextmanager
+    def site(self, siteName):
+        previous = self.currentSite
+        self.currentSite = siteName
+        try:
+            yield
+        finally:
+            self.currentSite = previous
+
+    @contextmanager
+    def stage(self, stageName):
+        self.start()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        wallStart = time.perf_counter()
+        cpuStart = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wallStart
+            cpu = time.process_time() - cpuStart
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            key = (self.currentSite, stageName)
+            record = self._records.get(key)
+            if record is None:
+                self._records[key] = {
+                    'site': self.currentSite,
+                    'stage': stageName,
+                    'calls': 1,
+                    'wallSeconds': wall,
+                    'cpuSeconds': cpu,
+                    'peakMemoryBytes': peak,
+                }
+            else:
+                record['calls'] += 1
+                record['wallSeconds'] += wall
+                record['cpuSeconds'] += cpu
+                record['peakMemoryBytes'] = max(record['peakMemoryBytes'], peak)
+
+    def toFrame(self):
+        return pd.DataFrame(
+            list(self._records.values()),
+            columns=['site', 'stage', 'calls', 'wallSeconds', 'cpuSeconds', 'peakMemoryBytes'],
+        )
+
+    def summary(self):
+        """Text summary: stages and sites ranked by wall time."""
+        frame = self.toFrame()
+        if frame.empty:
+            return "No stages recorded.\n"
+        byStage = frame.groupby('stage').agg(
+            calls=('calls', 'sum'),
+            wallSeconds=('wallSeconds', 'sum'),
+            cpuSeconds=('cpuSeconds', 'sum'),
+            peakMemoryMB=('peakMemoryBytes', lambda b: b.max() / 2**20),
+        ).sort_values('wallSeconds', ascending=False)
+        bySite = frame.groupby('site').agg(
+            wallSeconds=('wallSeconds', 'sum'),
+            cpuSeconds=('cpuSeconds', 'sum'),
+            peakMemoryMB=('peakMemoryBytes', lambda b: b.max() / 2**20),
+        ).sort_values('wallSeconds', ascending=False)
+        total = frame['wallSeconds'].sum()
+        lines = [f"Total profiled wall time: {total:.2f}s", "", "Stages by wall time:"]
+        lines.append(byStage.to_string(float_format=lambda v: f"{v:.3f}"))
+        lines += ["", "Sites by wall time:"]
+        lines.append(bySite.to_string(float_format=lambda v: f"{v:.3f}"))
+        return "\n".join(lines) + "\n"
+
+    def writeReport(self, outputFolderPath):
+        """Write profile_report.json (one record per site and stage) and profile_summary.txt."""
+        os.makedirs(outputFolderPath, exist_ok=True)
+        with open(os.path.join(outputFolderPath, 'profile_report.json'), 'w') as f:
+            json.dump(list(self._records.values()), f, indent=2)
+        with open(os.path.join(outputFolderPath, 'profile_summary.txt'), 'w') as f:
+            f.write(self.summary())
+
+
+def profileStage(profiler, stageName):
+    """Context manager timing stageName on profiler; a no-op when profiler is None."""
+    if profiler is None:
+        return nullcontext()
+    return profiler.stage(stageName)
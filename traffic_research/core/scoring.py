@@ -1,11 +1,38 @@
 """Scoring functions for row comparison."""
 
 import math
+import numpy as np
 import pandas as pd
-import sys
-import os
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
-from config import TIME_SCORE_WEIGHT, CONDITION_SCORE_WEIGHT, COLOR_WEIGHT
+from collections import OrderedDict
+from config import TIME_SCORE_WEIGHT, CONDITION_SCORE_WEIGHT, COLOR_WEIGHT, SCORE_CACHE_SIZE
+
+# Time fields averaged by computeTimeScore.
+TIME_FIELDS = [
+    'Crossing Start Time',
+    'Bus Stop Arrival Time',
+    'Bus Stop Departure Time',
+    'Intend to Cross Timestamp',
+    'Refuge Island Start Time',
+    'Refuge Island End Time',
+    'Crossing End Time'
+]
+
+# Categorical fields compared by computeConditionScore.
+CONDITION_FIELDS = [
+    'User Type',
+    'Estimated Gender',
+    'Estimated Age Group',
+    'Bus Interaction',
+    'Roadway Crossing',
+    'Type of Bus Interaction',
+    'Crossing Interaction Notes',
+    'Crossing Location Relative to Bus Stop',
+    'Vehicle Traffic',
+    # 'Group Size',
+    'Crosswalk Crossing',
+    'Did User Finish Crossing During Pedestrian Phase',
+    'Bus Presence',
+]
 
 
 def calculateTimeScore(num1, num2, threshold):
@@ -53,22 +80,17 @@ def computeTimeScore(row1, row2, threshold):
     the mean across all time fields so the scale is stable regardless of the
     number of fields. Fields where both values are -1 are skipped.
     """
-    time_fields = [
-        'Crossing Start Time',
-        'Bus Stop Arrival Time',
-        'Bus Stop Departure Time',
-        'Intend to Cross Timestamp',
-        'Refuge Island Start Time',
-        'Refuge Island End Time',
-        'Crossing End Time'
-    ]
-    
+    return computeTimeScoreValues(
+        [row1[field] for field in TIME_FIELDS],
+        [row2[field] for field in TIME_FIELDS],
+        threshold
+    )
+
+def computeTimeScoreValues(values1, values2, threshold):
+    """computeTimeScore on two sequences of TIME_FIELDS values."""
     # Only compare fields where both values are not -1
     valid_scores = []
-    for field in time_fields:
-        val1 = row1[field]
-        val2 = row2[field]
-        
+    for val1, val2 in zip(values1, values2):
         # Skip if both values are -1
         if val1 == -1 or val2 == -1:
             continue
@@ -84,26 +106,11 @@ def computeTimeScore(row1, row2, threshold):
 
 def computeConditionScore(row1, row2):
     """Compute condition-based similarity score (weight: 50%)."""
-    condition_fields = [
-        'User Type',
-        'Estimated Gender',
-        'Estimated Age Group',
-        'Bus Interaction',
-        'Roadway Crossing',
-        'Type of Bus Interaction',
-        'Crossing Interaction Notes',
-        'Crossing Location Relative to Bus Stop',
-        'Vehicle Traffic',
-        # 'Group Size',
-        'Crosswalk Crossing',
-        'Did User Finish Crossing During Pedestrian Phase',
-        'Bus Presence',
-    ]
     # Average score across all non-color condition fields
     base_condition_avg = (
         sum(calculateConditionScore(row1[field], row2[field])
-            for field in condition_fields) / len(condition_fields)
-        if condition_fields else 0.0
+            for field in CONDITION_FIELDS) / len(CONDITION_FIELDS)
+        if CONDITION_FIELDS else 0.0
     )
     # Weighted combination: 70% other conditions, 30% clothing color
     other_weighted = base_condition_avg * (1 - COLOR_WEIGHT)
@@ -120,3 +127,120 @@ def computeFeatureScores(row1, row2, timeThreshold):
     # Apply weights at the final combination level
     return (timeScore * TIME_SCORE_WEIGHT + 
             conditionScore * CONDITION_SCORE_WEIGHT)
+
+
+def _exp(values):
+    # math.exp elementwise: np.exp can differ from it in the last bit, and the
+    # batch scores must equal computeFeatureScores exactly.
+    return np.fromiter(map(math.exp, values.tolist()), dtype='float64', count=values.size)
+
+
+def computeFeatureScoresBatch(df, left, right, timeThreshold):
+    """computeFeatureScores for many row pairs of one DataFrame at once.
+
+    left and right are equal-length arrays of row positions in df; returns a
+    float array of pair scores, computed column-wise with numpy and equal to
+    calling computeFeatureScores on each pair.
+    """
+    left = np.asarray(left, dtype=np.intp)
+    right = np.asarray(right, dtype=np.intp)
+    if len(left) == 0:
+        return np.zeros(0)
+
+    times = df[TIME_FIELDS].to_numpy(dtype='float64', na_value=np.nan)
+    a, b = times[left], times[right]
+    compared = (a != -1) & (b != -1)
+    if timeThreshold <= 0:
+        fieldScores = np.zeros(a.shape)
+    else:
+        diff = np.abs(a - b)
+        fieldScores = np.zeros(a.shape)
+        with np.errstate(invalid='ignore'):
+            fieldScores[diff < timeThreshold] = 1.0
+            decayed = diff >= timeThreshold
+        fieldScores[decayed] = _exp(-diff[decayed] / (timeThreshold + 10))
+    # Summed field by field, in TIME_FIELDS order, as computeTimeScoreValues does.
+    timeTotal = np.zeros(len(left))
+    for column in range(len(TIME_FIELDS)):
+        timeTotal += np.where(compared[:, column], fieldScores[:, column], 0.0)
+    comparedCount = compared.sum(axis=1)
+    timeScore = np.divide(timeTotal, comparedCount, out=np.zeros(len(left)), where=comparedCount > 0)
+
+    matches = np.zeros(len(left))
+    for field in CONDITION_FIELDS:
+        values = df[field].to_numpy(dtype=object)
+        matches += (values[left] == values[right]).astype(float)
+    baseConditionAvg = matches / len(CONDITION_FIELDS) if CONDITION_FIELDS else np.zeros(len(left))
+
+    colors = pd.to_numeric(df['Clothing Color'], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    colorA, colorB = colors[left], colors[right]
+    with np.errstate(invalid='ignore'):
+        validColor = (colorA >= 1) & (colorA <= 10) & (colorB >= 1) & (colorB <= 10)
+    colorScore = np.zeros(len(left))
+    colorScore[validColor] = _exp(-np.abs(colorA[validColor] - colorB[validColor]) / 2.0)
+    colorScore *= COLOR_WEIGHT
+
+    conditionScore = baseConditionAvg * (1 - COLOR_WEIGHT) + colorScore
+    return timeScore * TIME_SCORE_WEIGHT + conditionScore * CONDITION_SCORE_WEIGHT
+
+
+class PairScoreCache:
+    """Bounded, symmetric memo of computeFeatureScores results.
+
+    A row is identified by a (reviewer path, row label) node, where the label is
+    the row's index label in the reviewer DataFrame, so it is stable across
+    subsets and sorting. computeFeatureScores is symmetric, so (a, b) and (b, a)
+    share an entry. Scores depend on timeThreshold, which is part of the key.
+    The least recently used entry is evicted once maxSize is reached.
+    """
+
+    def __init__(self, maxSize=SCORE_CACHE_SIZE):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+
+    @staticmethod
+    def _key(nodeA, nodeB, timeThreshold):
+        if nodeB < nodeA:
+            nodeA, nodeB = nodeB, nodeA
+        return (timeThreshold, nodeA, nodeB)
+
+    def lookup(self, nodeA, nodeB, timeThreshold):
+        """Return the cached score for the pair, or None on a miss."""
+        key = self._key(nodeA, nodeB, timeThreshold)
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._scores.move_to_end(key)
+        return score
+
+    def store(self, nodeA, nodeB, timeThreshold, score):
+        key = self._key(nodeA, nodeB, timeThreshold)
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        if len(self._scores) > self.maxSize:
+            self._scores.popitem(last=False)
+
+    def score(self, nodeA, row1, nodeB, row2, timeThreshold):
+        """Return computeFeatureScores(row1, row2, timeThreshold) through the cache."""
+        score = self.lookup(nodeA, nodeB, timeThreshold)
+        if score is None:
+            score = computeFeatureScores(row1, row2, timeThreshold)
+            self.store(nodeA, nodeB, timeThreshold, score)
+        return score
+
+    def getStats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._scores),
+            'maxSize': self.maxSize,
+        }
+
+    def clear(self):
+        self._scores.clear()
+        self.hits = 0
+        self.misses = 0
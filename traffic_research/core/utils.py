@@ -1,5 +1,6 @@
 """Utility functions for data conversion and formatting."""
 
+import pandas as pd
 from .data_engineering import DataEngining
 
 
@@ -22,6 +23,12 @@ def secondsToTimeString(seconds):
     return f"{hours:02}:{minutes:02}:{secs:02}"
 
 
+def timeStringsToSeconds(values):
+    """Seconds since midnight of HH:MM:SS strings as a float array; NaN for "N/A", blanks or other text."""
+    parts = pd.Series(values, dtype='object').astype(str).str.extract(r'^(\d+):(\d{2}):(\d{2})$').astype('float64')
+    return (parts[0] * 3600 + parts[1] * 60 + parts[2]).to_numpy()
+
+
 def enumToString(enumVal, enumList):
     """Convert enum value to string representation."""
     if enumVal is None or enumVal == -1:
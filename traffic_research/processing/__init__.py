@@ -2,17 +2,76 @@
 
 from .data_processing import (
     computeDataFolderToCSV,
+    qualityControlFromStoredGraphs,
     performAccuracyTest
 )
 from .quality_control import (
     constructRowDict,
     accuracyTest
 )
+# Optional modes (accuracy evaluation, dedup, linking, store, aggregates,
+# service, watch, sweep, streaming, incremental) load on first use only, so a
+# plain batch run imports just the pipeline modules above.
+_LAZY_MODULES = {
+    'discoverHumanQualityFiles': 'accuracy',
+    'pairHumanQualityFiles': 'accuracy',
+    'evaluateAccuracy': 'accuracy',
+    'findDuplicates': 'dedup',
+    'dedupSubsets': 'dedup',
+    'linkBusCrossings': 'linking',
+    'annotateBusPresence': 'linking',
+    'ConsensusStore': 'store',
+    'behaviorFrame': 'aggregates',
+    'aggregateBehavior': 'aggregates',
+    'aggregateOutputFolder': 'aggregates',
+    'WarmPipeline': 'service',
+    'serve': 'service',
+    'DataFolderWatcher': 'watch',
+    'snapshotInputTree': 'watch',
+    'SiteScoreTable': 'sweep',
+    'sweepThresholds': 'sweep',
+    'StreamingMatcher': 'streaming',
+    'streamSubset': 'streaming',
+    'collectStreamEvents': 'streaming',
+    'streamSiteQualityControl': 'streaming',
+    'IncrementalSiteGraph': 'incremental',
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        from importlib import import_module
+        return getattr(import_module('.' + _LAZY_MODULES[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     'computeDataFolderToCSV',
     'computeDataFolderToCSVWithIndex',
+    'qualityControlFromStoredGraphs',
     'performAccuracyTest',
     'constructRowDict',
-    'accuracyTest'
+    'accuracyTest',
+    'discoverHumanQualityFiles',
+    'pairHumanQualityFiles',
+    'evaluateAccuracy',
+    'findDuplicates',
+    'dedupSubsets',
+    'linkBusCrossings',
+    'annotateBusPresence',
+    'ConsensusStore',
+    'behaviorFrame',
+    'aggregateBehavior',
+    'aggregateOutputFolder',
+    'WarmPipeline',
+    'serve',
+    'DataFolderWatcher',
+    'snapshotInputTree',
+    'SiteScoreTable',
+    'sweepThresholds',
+    'StreamingMatcher',
+    'streamSubset',
+    'collectStreamEvents',
+    'streamSiteQualityControl',
+    'IncrementalSiteGraph'
 ]
@@ -0,0 +1,163 @@
+"""Batch accuracy evaluation of computed site outputs against human QC files."""
+
+import difflib
+import os
+import re
+import pandas as pd
+from traffic_research.core.data_engineering import generateDateFrame
+from traffic_research.processing.data_processing import SUMMARY_OUTPUTS
+from traffic_research.processing.quality_control import accuracyByField
+from config import (
+    OUTPUT_PATH,
+    HUMAN_QC_PATH,
+    ACCURACY_SUMMARY_DIR,
+    ACCURACY_PAIRING_CUTOFF,
+    ACCURACY_JOBS,
+)
+
+# Parsed QC frames by absolute path, as ((mtime, size), frame); a changed
+# file replaces its entry, so at most one frame per path is kept.
+_PARSED_CACHE = {}
+
+
+def _normalizeSiteName(fileName):
+    """'Belmont_St+Edward_St.csv' and 'BELMONT ST + EDWARD ST.csv' both become 'belmont st edward st'."""
+    stem = os.path.splitext(os.path.basename(fileName))[0]
+    return ' '.join(re.findall(r'[a-z0-9]+', stem.lower()))
+
+
+def discoverHumanQualityFiles(humanQualityPath=HUMAN_QC_PATH):
+    """Every human QC CSV under humanQualityPath, sorted by path."""
+    return sorted(
+        os.path.join(folder, fileName)
+        for folder, _, fileNames in os.walk(humanQualityPath)
+        for fileName in fileNames
+        if fileName.endswith('.csv')
+    )
+
+
+def pairHumanQualityFiles(humanQualityFiles, outputFolderPath=OUTPUT_PATH, cutoff=ACCURACY_PAIRING_CUTOFF):
+    """Pair human QC files one-to-one with the site CSVs in outputFolderPath by fuzzy file-name match.
+
+    Names are lowercased and reduced to alphanumeric words before comparing
+    (difflib ratio, as get_close_matches scores them), so spelling and
+    separator differences ('Norhampton_Court_House' vs 'Northampton Court
+    House') still pair. Pairs are taken by descending score and every output
+    is used at most once. Returns (pairs, unpaired, contested): pairs maps a
+    human file to its computed file in humanQualityFiles order; unpaired lists
+    human files left without an output scoring at least cutoff; contested maps
+    a computed file to the human files whose best match it was, when there
+    are several.
+    """
+    computedFiles = {
+        _normalizeSiteName(fileName): os.path.join(outputFolderPath, fileName)
+        for fileName in sorted(os.listdir(outputFolderPath))
+        if fileName.endswith('.csv') and fileName not in SUMMARY_OUTPUTS
+    }
+    matcher = difflib.SequenceMatcher()
+    candidates = []
+    best = {}
+    for humanIndex, humanFile in enumerate(humanQualityFiles):
+        matcher.set_seq2(_normalizeSiteName(humanFile))
+        for computedIndex, name in enumerate(computedFiles):
+            matcher.set_seq1(name)
+            score = matcher.ratio()
+            if score >= cutoff:
+                candidates.append((-score, humanIndex, computedIndex, humanFile, computedFiles[name]))
+                if humanFile not in best or score > best[humanFile][0]:
+                    best[humanFile] = (score, computedFiles[name])
+    matched = {}
+    usedOutputs = set()
+    for _, _, _, humanFile, computedFile in sorted(candidates):
+        if humanFile not in matched and computedFile not in usedOutputs:
+            matched[humanFile] = computedFile
+            usedOutputs.add(computedFile)
+    pairs = {humanFile: matched[humanFile] for humanFile in humanQualityFiles if humanFile in matched}
+    unpaired = [humanFile for humanFile in humanQualityFiles if humanFile not in matched]
+    claims = {}
+    for humanFile, (_, computedFile) in best.items():
+        claims.setdefault(computedFile, []).append(humanFile)
+    contested = {computedFile: humanFiles for computedFile, humanFiles in claims.items() if len(humanFiles) > 1}
+    return pairs, unpaired, contested
+
+
+def matchHumanQualityFile(siteName, humanQualityFiles, cutoff=ACCURACY_PAIRING_CUTOFF):
+    """The human QC file whose name best matches siteName (compared as in pairHumanQualityFiles), or None."""
+    byName = {_normalizeSiteName(humanFile): humanFile for humanFile in humanQualityFiles}
+    match = difflib.get_close_matches(_normalizeSiteName(siteName), list(byName), n=1, cutoff=cutoff)
+    return byName[match[0]] if match else None
+
+
+def _parseQualityFile(path):
+    return generateDateFrame(path).dropna(how='all')
+
+
+def loadQualityFrames(paths, n_jobs=ACCURACY_JOBS):
+    """Parse QC CSVs as performAccuracyTest does, in parallel, reusing frames already parsed.
+
+    Returns {path: DataFrame}. A cached frame is reused while the file's
+    mtime and size are unchanged; a changed file's frame replaces the old one.
+    """
+    stamps = {}
+    for path in dict.fromkeys(paths):
+        stat = os.stat(path)
+        stamps[path] = (stat.st_mtime_ns, stat.st_size)
+    missing = [
+        path for path, stamp in stamps.items()
+        if _PARSED_CACHE.get(os.path.abspath(path), (None,))[0] != stamp
+    ]
+    if missing:
+        from joblib import Parallel, delayed
+
+        frames = Parallel(n_jobs=n_jobs)(delayed(_parseQualityFile)(path) for path in missing)
+        for path, df in zip(missing, frames):
+            _PARSED_CACHE[os.path.abspath(path)] = (stamps[path], df)
+    return {path: _PARSED_CACHE[os.path.abspath(path)][1] for path in stamps}
+
+
+def evaluateAccuracy(outputFolderPath=OUTPUT_PATH, humanQualityPath=HUMAN_QC_PATH, summaryDir=ACCURACY_SUMMARY_DIR,
+                     n_jobs=ACCURACY_JOBS):
+    """Compare every human QC file with its computed site output and write accuracy summaries.
+
+    Writes summaryDir/accuracy_by_site.csv (Site, HumanFile, ComputedFile,
+    Correct, Compared, Accuracy; Accuracy equals performAccuracyTest) and
+    summaryDir/accuracy_by_field.csv (the same per Site and Field). Human
+    files without a matching output are reported and skipped, and so are
+    outputs that several human files matched best (each output is paired
+    once, see pairHumanQualityFiles). Returns the
+    (bySite, byField) DataFrames.
+    """
+    from joblib import Parallel, delayed
+
+    pairs, unpaired, contested = pairHumanQualityFiles(discoverHumanQualityFiles(humanQualityPath), outputFolderPath)
+    pairedWith = {computedFile: humanFile for humanFile, computedFile in pairs.items()}
+    for computedFile, humanFiles in contested.items():
+        print(f"{computedFile} is the best match of {', '.join(humanFiles)}; paired with {pairedWith[computedFile]} only")
+    for humanFile in unpaired:
+        print(f"No computed output matches {humanFile}; skipped")
+    frames = loadQualityFrames(list(pairs) + list(pairs.values()), n_jobs=n_jobs)
+    fieldCounts = Parallel(n_jobs=n_jobs)(
+        delayed(accuracyByField)(frames[humanFile], frames[computedFile]) for humanFile, computedFile in pairs.items()
+    )
+
+    fieldRows = []
+    siteRows = []
+    for (humanFile, computedFile), counts in zip(pairs.items(), fieldCounts):
+        site = os.path.splitext(os.path.basename(computedFile))[0]
+        for field, (correct, compared) in counts.items():
+            fieldRows.append({
+                'Site': site, 'Field': field, 'Correct': correct, 'Compared': compared,
+                'Accuracy': correct / compared if compared > 0 else 0.0,
+            })
+        correct = sum(c for c, _ in counts.values())
+        compared = sum(n for _, n in counts.values())
+        siteRows.append({
+            'Site': site, 'HumanFile': os.path.basename(humanFile), 'ComputedFile': os.path.basename(computedFile),
+            'Correct': correct, 'Compared': compared, 'Accuracy': correct / compared if compared > 0 else 0.0,
+        })
+    bySite = pd.DataFrame(siteRows, columns=['Site', 'HumanFile', 'ComputedFile', 'Correct', 'Compared', 'Accuracy'])
+    byField = pd.DataFrame(fieldRows, columns=['Site', 'Field', 'Correct', 'Compared', 'Accuracy'])
+    os.makedirs(summaryDir, exist_ok=True)
+    bySite.to_csv(os.path.join(summaryDir, 'accuracy_by_site.csv'), index=False)
+    byField.to_csv(os.path.join(summaryDir, 'accuracy_by_field.csv'), index=False)
+    return bySite, byField
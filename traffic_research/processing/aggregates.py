@@ -0,0 +1,146 @@
+"""Per-site and per-subset behavior aggregates of consensus rows.
+
+constructRowDict writes the derived durations as numbers or "N/A", and
+subtracts -1 when one of the times is missing (a crossing without an end time
+gets a large negative CrossingDuration). behaviorFrame turns them into float
+columns with NaN wherever a source time is missing; aggregateBehavior then
+summarizes them with one group-by per statistic and keeps recent results keyed
+by a fingerprint of the input columns, so repeated requests over the same rows
+(or an unchanged allComputedRows.csv) are answered without recomputing.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from traffic_research.core.utils import timeStringsToSeconds
+from traffic_research.processing.data_processing import ALL_ROWS_FILE, SITE_ID_COLUMN, SUBSETS
+from traffic_research.processing.store import readConsensusCsv
+from config import AGGREGATE_PERCENTILES, AGGREGATE_CACHE_SIZE
+
+# Derived duration columns with the (later, earlier) time columns they subtract.
+DURATION_FIELDS = {
+    'CrossingDuration': ('Crossing End Time', 'Crossing Start Time'),
+    'IntendCrossingDuration': ('Crossing End Time', 'Intend to Cross Timestamp'),
+    'CrossingDuration_toMedian': ('Refuge Island Start Time', 'Crossing Start Time'),
+    'CrossingDuration_fromMedian': ('Crossing End Time', 'Refuge Island End Time'),
+    'Median_WaitTime': ('Refuge Island End Time', 'Refuge Island Start Time'),
+}
+# Yes/no consensus fields reported as the share of 'yes' among crossing rows
+# (Roadway Crossing 'yes') answering yes or no; a BusNotCrossing row answers
+# 'no' because nobody crossed, not because a crossing was non-compliant.
+COMPLIANCE_FIELDS = {
+    'CrosswalkComplianceRate': 'Crosswalk Crossing',
+    'PedestrianPhaseComplianceRate': 'Pedestrian Phase Crossing',
+    'FinishedDuringPedestrianPhaseRate': 'Did User Finish Crossing During Pedestrian Phase',
+}
+ALL_SUBSETS = 'All'
+
+# Aggregate frames keyed by input fingerprint, most recently used last.
+_AGGREGATE_CACHE = OrderedDict()
+
+
+def _remember(key, summary):
+    _AGGREGATE_CACHE[key] = summary
+    _AGGREGATE_CACHE.move_to_end(key)
+    while len(_AGGREGATE_CACHE) > AGGREGATE_CACHE_SIZE:
+        _AGGREGATE_CACHE.popitem(last=False)
+    return summary.copy()
+
+
+def _subsetLabels(rows):
+    """Subset of every consensus row from its Bus Interaction / Roadway Crossing answers, as partitionSubsets splits reviewer rows."""
+    busInteraction = rows['Bus Interaction'].astype(str).to_numpy()
+    roadwayCrossing = rows['Roadway Crossing'].astype(str).to_numpy()
+    return np.select(
+        [
+            busInteraction == 'no',
+            (busInteraction == 'yes') & (roadwayCrossing == 'yes'),
+            (busInteraction == 'yes') & (roadwayCrossing == 'no'),
+        ],
+        [subsetName for subsetName, _ in SUBSETS],
+        default='',
+    )
+
+
+def behaviorFrame(rows, siteColumn=SITE_ID_COLUMN):
+    """Numeric behavior columns of consensus rows (computed frame or rows read as text).
+
+    Returns siteColumn, Subset, every DURATION_FIELDS column as float (NaN when
+    either source time is missing) and every COMPLIANCE_FIELDS source as 1.0
+    (yes), 0.0 (no) or NaN; compliance is NaN on rows without a roadway crossing.
+    """
+    columns = {siteColumn: rows[siteColumn].to_numpy(), 'Subset': _subsetLabels(rows)}
+    times = {}
+    for field, (laterColumn, earlierColumn) in DURATION_FIELDS.items():
+        for timeColumn in (laterColumn, earlierColumn):
+            if timeColumn not in times:
+                times[timeColumn] = timeStringsToSeconds(rows[timeColumn])
+        valid = ~np.isnan(times[laterColumn]) & ~np.isnan(times[earlierColumn])
+        values = pd.to_numeric(rows[field], errors='coerce').to_numpy(dtype='float64')
+        columns[field] = np.where(valid, values, np.nan)
+    crossed = rows['Roadway Crossing'].astype(str).to_numpy() == 'yes'
+    for field in COMPLIANCE_FIELDS.values():
+        answers = rows[field].astype(str).to_numpy()
+        columns[field] = np.select([crossed & (answers == 'yes'), crossed & (answers == 'no')], [1.0, 0.0], default=np.nan)
+    return pd.DataFrame(columns)
+
+
+def _fingerprint(rows, siteColumn, percentiles):
+    """Digest of the columns aggregateBehavior reads, plus its parameters."""
+    columns = [siteColumn, 'Bus Interaction', 'Roadway Crossing', *DURATION_FIELDS, *COMPLIANCE_FIELDS.values()]
+    columns += sorted({timeColumn for pair in DURATION_FIELDS.values() for timeColumn in pair})
+    hashes = pd.util.hash_pandas_object(rows[columns].astype(str), index=False).to_numpy()
+    digest = hashlib.blake2b(hashes.tobytes(), digest_size=16)
+    digest.update(repr((siteColumn, tuple(percentiles))).encode())
+    return digest.hexdigest()
+
+
+def _summarize(behavior, keys, percentiles):
+    """Counts, median, mean and percentiles of the durations and compliance rates per keys group."""
+    groups = behavior.groupby(keys, sort=True)
+    durations = groups[list(DURATION_FIELDS)]
+    parts = [groups.size().rename('Rows')]
+    for name, frame in [('count', durations.count()), ('median', durations.median()), ('mean', durations.mean())]:
+        parts.append(frame.add_suffix('_' + name))
+    for q in percentiles:
+        parts.append(durations.quantile(q).add_suffix(f'_p{round(q * 100):g}'))
+    parts.append(groups[list(COMPLIANCE_FIELDS.values())].mean().set_axis(list(COMPLIANCE_FIELDS), axis=1))
+    return pd.concat(parts, axis=1)
+
+
+def aggregateBehavior(rows, siteColumn=SITE_ID_COLUMN, percentiles=AGGREGATE_PERCENTILES):
+    """Behavior summary per site and subset, plus an 'All' subset row per site.
+
+    Columns: Rows; for every DURATION_FIELDS column its _count, _median,
+    _mean and _p<percentile> (seconds); and the COMPLIANCE_FIELDS rates.
+    The result is cached by a fingerprint of the input columns; callers get
+    a copy.
+    """
+    key = _fingerprint(rows, siteColumn, percentiles)
+    if key in _AGGREGATE_CACHE:
+        _AGGREGATE_CACHE.move_to_end(key)
+        return _AGGREGATE_CACHE[key].copy()
+    behavior = behaviorFrame(rows, siteColumn)
+    bySubset = _summarize(behavior[behavior['Subset'] != ''], [siteColumn, 'Subset'], percentiles)
+    bySite = _summarize(behavior, [siteColumn], percentiles)
+    bySite.index = pd.MultiIndex.from_arrays([bySite.index, [ALL_SUBSETS] * len(bySite)], names=[siteColumn, 'Subset'])
+    summary = pd.concat([bySubset, bySite])
+    subsetOrder = {subsetName: rank for rank, (subsetName, _) in enumerate(SUBSETS + [(ALL_SUBSETS, None)])}
+    siteCodes, _ = pd.factorize(summary.index.get_level_values(0), sort=True)
+    summary = summary.iloc[np.lexsort((summary.index.get_level_values(1).map(subsetOrder).to_numpy(), siteCodes))]
+    return _remember(key, summary)
+
+
+def aggregateOutputFolder(outputFolderPath, percentiles=AGGREGATE_PERCENTILES):
+    """aggregateBehavior over outputFolderPath/allComputedRows.csv, keyed by Location Name.
+
+    The CSV is only read again when its mtime or size changed since the last call.
+    """
+    path = os.path.join(outputFolderPath, ALL_ROWS_FILE)
+    stat = os.stat(path)
+    fileKey = ('file', os.path.abspath(path), stat.st_mtime_ns, stat.st_size, tuple(percentiles))
+    if fileKey in _AGGREGATE_CACHE:
+        return _remember(fileKey, _AGGREGATE_CACHE[fileKey])
+    return _remember(fileKey, aggregateBehavior(readConsensusCsv(path), 'Location Name', percentiles))
@@ -1,27 +1,87 @@
 """Data processing functions for computing and generating CSV outputs."""
 
+import io
 import os
+import time
+from contextlib import nullcontext
+import numpy as np
 import pandas as pd
-import sys
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
 from traffic_research.core.data_engineering import generateDateFrameList, generateDateFrame
-from traffic_research.core.matching import exportGraphToCsv, generateReferenceGraph
+from traffic_research.core.matching import exportGraphToCsv, generateReferenceGraph, saveGraph, loadGraph
 from traffic_research.processing.quality_control import accuracyTest, generateQualityControlDataFramebyGraph
-from traffic_research.core.models import AccuracyScore
+from traffic_research.core.models import AccuracyScore, PipelineStats
+from traffic_research.core.profiling import PipelineProfiler, profileStage
+from config import GRAPH_EXPORT_FORMATS, SECONDARY_TIME_MATCHING, DEDUP_MODE, BUS_CROSSING_LINKING
 
-def mergeCharacteristicWithQualityDataFrame(qualityDataFrame, characteristics):
-    characteristic_columns = {
-        # 'Location Name': characteristics['GTFSSTOP_NAME'],
-        # 'Bus Stop IDs/Addresses': characteristics['STOP_ID'],
-        # 'Count of Bus Stop Routes': characteristics['Num Bus Routes'],
-        # 'Crossing Treatment': characteristics['SignalizedIntersection'],
+# Column carrying the site id (characteristics fid) on consensus rows until
+# the characteristics are joined at export time.
+SITE_ID_COLUMN = 'fid'
+
+# Subsets matched independently, in processing order, with the time column
+# each subset is sorted and windowed on.
+SUBSETS = [
+    ('NoneBusUserCrossing', 'Crossing Start Time'),
+    ('BusUserCrossing', 'Crossing Start Time'),
+    ('BusNotCrossing', 'Bus Stop Arrival Time'),
+]
+
+# Run-level files written next to the per-site CSVs in the output folder.
+ALL_ROWS_FILE = 'allComputedRows.csv'
+ACCURACY_SUMMARY_FILE = 'interated_summary.csv'
+FIELD_ACCURACY_SUMMARY_FILE = 'interated_field_summary.csv'
+BEHAVIOR_SUMMARY_FILE = 'behavior_summary.csv'
+SUMMARY_OUTPUTS = {ALL_ROWS_FILE, ACCURACY_SUMMARY_FILE, FIELD_ACCURACY_SUMMARY_FILE, BEHAVIOR_SUMMARY_FILE}
+
+
+def partitionSubsets(df):
+    """Split one reviewer DataFrame into the SUBSETS in a single pass.
+
+    A subset label is computed once per row (-1 for rows that belong to no
+    subset), the frame is stable-sorted by (subset, subset time column) and
+    each subset is handed out as a contiguous positional slice of that one
+    sorted frame, so the three subsets share a single buffer.
+    """
+    busInteraction = df['Bus Interaction'].to_numpy(dtype='float64', na_value=np.nan)
+    roadwayCrossing = df['Roadway Crossing'].to_numpy(dtype='float64', na_value=np.nan)
+    labels = np.select(
+        [
+            busInteraction == 0,
+            (busInteraction == 1) & (roadwayCrossing == 1),
+            (busInteraction == 1) & (roadwayCrossing == 0),
+        ],
+        [0, 1, 2],
+        default=-1,
+    )
+    subsetTimes = np.full(len(df), np.nan)
+    for label, (_, timeColumn) in enumerate(SUBSETS):
+        mask = labels == label
+        subsetTimes[mask] = df[timeColumn].to_numpy(dtype='float64', na_value=np.nan)[mask]
+
+    # np.lexsort is stable; the last key is the primary one.
+    order = np.lexsort((subsetTimes, labels))
+    ordered = df.take(order)
+    bounds = np.searchsorted(labels[order], np.arange(len(SUBSETS) + 1), side='left')
+    return {
+        subsetName: ordered.iloc[bounds[label]:bounds[label + 1]]
+        for label, (subsetName, _) in enumerate(SUBSETS)
     }
-    qualityDataFrame['Location Name'] = characteristics['GTFSSTOP_NAME']
-    qualityDataFrame['Bus Stop IDs/Addresses'] = characteristics['STOP_ID']
-    qualityDataFrame['Count of Bus Stop Routes'] = characteristics['Num Bus Routes']
-    qualityDataFrame['Crossing Treatment'] = characteristics['Crossing Treatment']
-    qualityDataFrame['Crosswalk Location Relative to Bus Stop'] = characteristics['Crosswalk location relative to bus stop']
-    qualityDataFrame['Refuge Island'] = characteristics['Refuge Island/Median']
+
+
+def mergeCharacteristicWithQualityDataFrame(qualityDataFrame, characteristics):
+    """Join the site dimension table onto consensus rows at export time.
+
+    Consensus rows only carry their site id in SITE_ID_COLUMN; ``characteristics``
+    is the table returned by loadCharacteristics (indexed by fid). The site id
+    column is consumed by the join, so the result has the exported layout.
+    """
+    siteRows = characteristics.loc[qualityDataFrame[SITE_ID_COLUMN].to_numpy()]
+    qualityDataFrame = qualityDataFrame.drop(columns=SITE_ID_COLUMN)
+    qualityDataFrame['Location Name'] = siteRows['GTFSSTOP_NAME'].to_numpy()
+    qualityDataFrame['Bus Stop IDs/Addresses'] = siteRows['STOP_ID'].to_numpy()
+    qualityDataFrame['Count of Bus Stop Routes'] = siteRows['Num Bus Routes'].to_numpy()
+    qualityDataFrame['Crossing Treatment'] = siteRows['Crossing Treatment'].to_numpy()
+    qualityDataFrame['Crosswalk Location Relative to Bus Stop'] = siteRows['Crosswalk location relative to bus stop'].to_numpy()
+    qualityDataFrame['Refuge Island'] = siteRows['Refuge Island/Median'].to_numpy()
     fieldToExclude = [
         'STOP_ID',
         'GTFSSTOP_NAME',
@@ -30,148 +90,292 @@ def mergeCharacteristicWithQualityDataFrame(qualityDataFrame, characteristics):
         'Crosswalk location relative to bus stop',
         'Refuge Island/Median'
     ]
-    # Preserve the original order of fields from the characteristics row
-    # and drop the last one so it is not added to characteristic_columns.
+    # Preserve the original order of fields from the characteristics table
+    # and drop the last one so it is not added to the joined columns.
     fieldToAdd = [
-        field for field in characteristics.keys().tolist()
+        field for field in characteristics.columns.tolist()
         if field not in fieldToExclude
     ]
     if fieldToAdd:
         fieldToAdd = fieldToAdd[:-1]
 
-    for field in fieldToAdd:
-        characteristic_columns[field] = characteristics[field]
-
     # Add all characteristic columns in one operation to avoid DataFrame fragmentation.
-    characteristic_block = pd.DataFrame(
-        {column: [value] * len(qualityDataFrame) for column, value in characteristic_columns.items()},
-        index=qualityDataFrame.index,
-    )
+    characteristic_block = siteRows[fieldToAdd].set_axis(qualityDataFrame.index, axis=0)
     return pd.concat([qualityDataFrame, characteristic_block], axis=1)
-    
 
-def _processFolder(filePath, outputFolderPath, characteristics, accuracy, percentageThreshold, timeThreshold):
-    """Helper function to process a single folder and generate CSV outputs."""
-    
-    def generateQCDataFrame(graph,dflist):
-        return generateQualityControlDataFramebyGraph(graph, dflist, accuracy, timeThreshold)
-    
+
+def roundTripExport(siteQualityDataFrame, characteristics):
+    """Parse the site frame the way performAccuracyTest parses the exported CSV."""
+    buffer = io.StringIO()
+    mergeCharacteristicWithQualityDataFrame(siteQualityDataFrame, characteristics).transpose().to_csv(
+        buffer,
+        index=True,
+        header=False
+    )
+    # Exports are written as UTF-8 and read back as cp1252 by load_csv.
+    return generateDateFrame(io.BytesIO(buffer.getvalue().encode('utf-8'))).dropna(how='all')
+
+
+def loadSiteSubsets(filePath, profiler=None):
+    """Load every reviewer CSV in a site folder and split it into the SUBSETS.
+
+    Returns {subsetName: [{'path', 'df'}, ...]} with each subset's reviewer
+    list ordered by row count (shortest first), as generateReferenceGraph expects.
+    """
     fileList = [
         os.path.join(filePath, filename)
         for filename in os.listdir(filePath)
         if filename.endswith(".csv")
     ]
+    dflist = generateDateFrameList(fileList, profiler=profiler)
+    with profileStage(profiler, 'subset_split'):
+        subsets = {subsetName: [] for subsetName, _ in SUBSETS}
+        for df in dflist:
+            for subsetName, subsetDF in partitionSubsets(df['df']).items():
+                subsets[subsetName].append({'path': df['path'], 'df': subsetDF})
+        for subsetName in subsets:
+            subsets[subsetName] = sorted(subsets[subsetName], key=lambda x: x["df"].shape[0])
+    return subsets
+
+
+def combineQualityControlDataFrames(qualityControlDataFrames):
+    """Concatenate per-subset QC frames into one site frame ordered by sort_key."""
+    dfQualityControl = pd.concat(list(qualityControlDataFrames.values()), ignore_index=False)
+    return dfQualityControl.sort_values(by=['sort_key'], inplace=False).drop('sort_key', axis=1)
+
+
+def _processFolder(filePath, outputFolderPath, characteristics, accuracy, percentageThreshold, timeThreshold, scoreCache=None, stats=None, profiler=None,
+                   secondaryTimeMatching=SECONDARY_TIME_MATCHING, dedup=DEDUP_MODE, busCrossingLinking=BUS_CROSSING_LINKING):
+    """Helper function to process a single folder and generate CSV outputs.
+
+    Returns the site's consensus rows tagged with SITE_ID_COLUMN; site
+    characteristics are only joined onto the exported copy. When a
+    PipelineStats is given it is filled with per-subset matcher and QC
+    counters and timings and written to graph/{folderName}_stats.json.
+    """
     
-    folderName = os.path.basename(filePath)
-    dflist = generateDateFrameList(fileList)
-    dfNoneBusUserCrossing = []
-    dfBusUserCrossing = []
-    dfBusNotCrossing = []
-    for df in dflist:
-        dfNoneBusUserCrossingRow = {
-            'path': df['path'],
-            'df': df['df'][df['df']['Bus Interaction'] == 0],
-        }
-        dfBusUserCrossingRow = {
-            'path': df['path'],
-            'df': df['df'][(df['df']['Bus Interaction'] == 1) & (df['df']['Roadway Crossing'] == 1)],
-        }
-        dfBusNotCrossingRow = {
-            'path': df['path'],
-            'df': df['df'][(df['df']['Bus Interaction'] == 1) & (df['df']['Roadway Crossing'] == 0)],
-        }
-        dfNoneBusUserCrossing.append(dfNoneBusUserCrossingRow)
-        dfBusUserCrossing.append(dfBusUserCrossingRow)
-        dfBusNotCrossing.append(dfBusNotCrossingRow)
-    for df in dfNoneBusUserCrossing:
-        df['df'] = df['df'].sort_values(by=['Crossing Start Time'], inplace=False)
-        
-    for df in dfBusUserCrossing:
-        df['df'] = df['df'].sort_values(by=['Crossing Start Time'], inplace=False)
-    for df in dfBusNotCrossing:
-        df['df'] = df['df'].sort_values(by=['Bus Stop Arrival Time'], inplace=False)
-    
-    
-    dfNoneBusUserCrossing = sorted(dfNoneBusUserCrossing, key=lambda x: x["df"].shape[0])
-    dfBusUserCrossing = sorted(dfBusUserCrossing, key=lambda x: x["df"].shape[0])
-    dfBusNotCrossing = sorted(dfBusNotCrossing, key=lambda x: x["df"].shape[0])
-    
-    dfNoneBusUserCrossingGraph = generateReferenceGraph(
-        dfNoneBusUserCrossing,
-        timeThreshold=timeThreshold,
-        percentageThreshold=percentageThreshold,
-        timeColumn="Crossing Start Time",
-    )
-    dfNoneBusUserCrossingGraphQC = generateQCDataFrame(dfNoneBusUserCrossingGraph, dfNoneBusUserCrossing)
-    
-    dfBusUserCrossingGraph = generateReferenceGraph(
-        dfBusUserCrossing,
-        timeThreshold=timeThreshold,
-        percentageThreshold=percentageThreshold,
-        timeColumn="Crossing Start Time",
-    )
-    dfBusUserCrossingGraphQC = generateQCDataFrame(dfBusUserCrossingGraph, dfBusUserCrossing)
-    
-    dfBusNotCrossingGraph = generateReferenceGraph(
-        dfBusNotCrossing,
-        timeThreshold=timeThreshold,
-        percentageThreshold=percentageThreshold,
-        timeColumn="Bus Stop Arrival Time",
-    )
-    dfBusNotCrossingGraphQC = generateQCDataFrame(dfBusNotCrossingGraph, dfBusNotCrossing)
+    def generateQCDataFrame(subsetName, graph, dflist, subsetStats):
+        with accuracy.subset(subsetName):
+            return generateQualityControlDataFramebyGraph(graph, dflist, accuracy, timeThreshold, stats=subsetStats)
     
-    dfQualityControl = pd.concat(
-        [dfNoneBusUserCrossingGraphQC, dfBusUserCrossingGraphQC, dfBusNotCrossingGraphQC],
-        ignore_index=False)
-    dfQualityControl = dfQualityControl.sort_values(by=['sort_key'], inplace=False).drop('sort_key', axis=1)
+    folderName = os.path.basename(filePath)
+    siteId = int(folderName)
+    loadStart = time.perf_counter()
+    subsets = loadSiteSubsets(filePath, profiler=profiler)
+    if stats is not None:
+        stats.addTime('load', time.perf_counter() - loadStart)
+    if dedup is not None:
+        from traffic_research.processing.dedup import dedupSubsets
+
+        with profileStage(profiler, 'dedup'):
+            subsets, duplicates = dedupSubsets(subsets, timeThreshold, collapse=(dedup == 'collapse'))
+        os.makedirs(os.path.join(outputFolderPath, 'dedup'), exist_ok=True)
+        duplicates.to_csv(os.path.join(outputFolderPath, 'dedup', folderName + '_duplicates.csv'), index=False)
+        if stats is not None:
+            stats.count('duplicates', len(duplicates))
+
+    graphs = {}
+    qualityControlDataFrames = {}
+    for subsetName, timeColumn in SUBSETS:
+        subsetStats = stats.scope(subsetName) if stats is not None else None
+        graphStart = time.perf_counter()
+        with profileStage(profiler, 'graph_' + subsetName):
+            graphs[subsetName] = generateReferenceGraph(
+                subsets[subsetName],
+                timeThreshold=timeThreshold,
+                percentageThreshold=percentageThreshold,
+                timeColumn=timeColumn,
+                scoreCache=scoreCache,
+                stats=subsetStats.scope('graph') if subsetStats is not None else None,
+                secondaryTimeMatching=secondaryTimeMatching,
+            )
+        qcStart = time.perf_counter()
+        with profileStage(profiler, 'qc_' + subsetName):
+            qualityControlDataFrames[subsetName] = generateQCDataFrame(
+                subsetName,
+                graphs[subsetName],
+                subsets[subsetName],
+                subsetStats.scope('qc') if subsetStats is not None else None,
+            )
+        if subsetStats is not None:
+            subsetStats.addTime('graph', qcStart - graphStart)
+            subsetStats.addTime('qc', time.perf_counter() - qcStart)
+            subsetStats.count('reviewerRows', sum(len(df['df']) for df in subsets[subsetName]))
+            subsetStats.count('consensusRows', len(qualityControlDataFrames[subsetName]))
+
+    dfQualityControl = combineQualityControlDataFrames(qualityControlDataFrames)
+    if busCrossingLinking:
+        from traffic_research.processing.linking import linkBusCrossings, annotateBusPresence
+
+        with profileStage(profiler, 'bus_crossing_links'):
+            links = linkBusCrossings(dfQualityControl)
+            dfQualityControl = annotateBusPresence(dfQualityControl, links)
+        os.makedirs(os.path.join(outputFolderPath, 'links'), exist_ok=True)
+        links.to_csv(os.path.join(outputFolderPath, 'links', folderName + '_bus_crossings.csv'), index=False)
+        if stats is not None:
+            stats.count('busCrossingLinks', len(links))
     
     # dfQualityControl = dfQualityControl.transpose()
+    exportStart = time.perf_counter()
     outputGraphFolderPath = os.path.join(outputFolderPath, 'graph')
-    exportGraphToCsv(dfNoneBusUserCrossingGraph, os.path.join(outputGraphFolderPath, folderName) + 'NoneBusUserCrossing_graph.csv')
-    exportGraphToCsv(dfBusUserCrossingGraph, os.path.join(outputGraphFolderPath, folderName) + 'BusUserCrossing_graph.csv')
-    exportGraphToCsv(dfBusNotCrossingGraph, os.path.join(outputGraphFolderPath, folderName) + 'BusNotCrossing_graph.csv')
+    for subsetName, timeColumn in SUBSETS:
+        graphPath = os.path.join(outputGraphFolderPath, folderName) + subsetName + '_graph'
+        with profileStage(profiler, 'write_graph_' + subsetName):
+            if 'npz' in GRAPH_EXPORT_FORMATS:
+                saveGraph(graphs[subsetName], graphPath + '.npz', dflist=subsets[subsetName],
+                          timeThreshold=timeThreshold, percentageThreshold=percentageThreshold, timeColumn=timeColumn)
+            if 'csv' in GRAPH_EXPORT_FORMATS:
+                exportGraphToCsv(graphs[subsetName], graphPath + '.csv')
     accuracy.appendFileAccuracy(os.path.basename(filePath), accuracy.getAccuracy())
     accuracy.reset()
-    dfQualityControl = mergeCharacteristicWithQualityDataFrame(dfQualityControl, characteristics)
-    dfQualityControl.transpose().to_csv(
-        os.path.join(outputFolderPath, characteristics['GTFSSTOP_NAME'] + '.csv'), 
-        index=True, 
-        header=False
-    )
-    names = ['dfNoneBusUserCrossingGraphQC', 'dfBusUserCrossingGraphQC', 'dfBusNotCrossingGraphQC']
-    for index, df in enumerate([dfNoneBusUserCrossingGraphQC, dfBusUserCrossingGraphQC, dfBusNotCrossingGraphQC]):
-        os.makedirs(os.path.join(outputFolderPath, folderName), exist_ok=True)
-        df.transpose().to_csv(
-            os.path.join(os.path.join(outputFolderPath, folderName), names[index] + '.csv'), 
+    dfQualityControl[SITE_ID_COLUMN] = siteId
+    with profileStage(profiler, 'characteristics_merge'):
+        dfExport = mergeCharacteristicWithQualityDataFrame(dfQualityControl, characteristics)
+    with profileStage(profiler, 'write_site_csv'):
+        dfExport.transpose().to_csv(
+            os.path.join(outputFolderPath, characteristics.loc[siteId, 'GTFSSTOP_NAME'] + '.csv'), 
             index=True, 
             header=False
         )
+    del dfExport
+    for subsetName, df in qualityControlDataFrames.items():
+        os.makedirs(os.path.join(outputFolderPath, folderName), exist_ok=True)
+        with profileStage(profiler, 'write_qc_' + subsetName):
+            df.transpose().to_csv(
+                os.path.join(os.path.join(outputFolderPath, folderName), 'df' + subsetName + 'GraphQC.csv'), 
+                index=True, 
+                header=False
+            )
+    if stats is not None:
+        stats.addTime('export', time.perf_counter() - exportStart)
+        stats.writeJson(os.path.join(outputGraphFolderPath, folderName + '_stats.json'))
     
     return dfQualityControl
 
 
+def qualityControlFromStoredGraphs(filePath, graphFolderPath, accuracy=None):
+    """Rebuild a site's consensus rows from the .npz graphs saved by _processFolder, without rematching.
+
+    Reviewer files are matched to the stored reviewer table by file name; a
+    ValueError is raised when a reviewer is missing or its row count changed
+    since the graph was saved. Returns the rows tagged with SITE_ID_COLUMN,
+    as _processFolder does; pass an AccuracyScore to collect the
+    inter-reviewer accuracy.
+    """
+    folderName = os.path.basename(os.path.normpath(filePath))
+    subsets = loadSiteSubsets(filePath)
+    accuracy = accuracy if accuracy is not None else AccuracyScore()
+    qualityControlDataFrames = {}
+    for subsetName, _ in SUBSETS:
+        graphPath = os.path.join(graphFolderPath, folderName) + subsetName + '_graph.npz'
+        storedGraph, meta = loadGraph(graphPath)
+        byName = {os.path.basename(df['path']): df for df in subsets[subsetName]}
+        dflist = []
+        for storedPath, rows in meta['reviewers']:
+            df = byName.get(os.path.basename(storedPath))
+            if df is None or (rows >= 0 and len(df['df']) != rows):
+                raise ValueError(f"{graphPath}: reviewer {os.path.basename(storedPath)} changed since the graph was saved")
+            dflist.append(df)
+        renamed = {storedPath: df['path'] for (storedPath, _), df in zip(meta['reviewers'], dflist)}
+        graph = {
+            (renamed[fromName], fromIndex): [
+                {"key": {"dfName": renamed[m["key"]["dfName"]], "index": m["key"]["index"]}, "score": m["score"]}
+                for m in matches
+            ]
+            for (fromName, fromIndex), matches in storedGraph.items()
+        }
+        with accuracy.subset(subsetName):
+            qualityControlDataFrames[subsetName] = generateQualityControlDataFramebyGraph(
+                graph, dflist, accuracy, meta['timeThreshold']
+            )
+    dfQualityControl = combineQualityControlDataFrames(qualityControlDataFrames)
+    dfQualityControl[SITE_ID_COLUMN] = int(folderName)
+    return dfQualityControl
+
+
+def replaceFile(path, write):
+    """Call write(temporaryPath) next to path, then move the result over path in one os.replace."""
+    temporaryPath = os.path.join(os.path.dirname(path) or '.', '.' + os.path.basename(path) + '.tmp')
+    write(temporaryPath)
+    os.replace(temporaryPath, path)
+
+
+def writeRunSummaries(outputFolderPath, siteFrames, accuracy, characteristics, profiler=None):
+    """Write ACCURACY_SUMMARY_FILE, FIELD_ACCURACY_SUMMARY_FILE and ALL_ROWS_FILE for the given sites.
+
+    siteFrames are the _processFolder results and accuracy holds their
+    appended file accuracies, in the same order. Each file is replaced
+    atomically. Returns the combined consensus rows.
+    """
+    allComputedRows = pd.concat(siteFrames, ignore_index=False) if siteFrames else pd.DataFrame(columns=[SITE_ID_COLUMN])
+
+    with profileStage(profiler, 'write_summary'):
+        accuracyDF = pd.DataFrame(accuracy.getFilesAccuracy(), columns=['Location', 'Accuracy'])
+        replaceFile(os.path.join(outputFolderPath, ACCURACY_SUMMARY_FILE), lambda path: accuracyDF.to_csv(path, header=True))
+        replaceFile(os.path.join(outputFolderPath, FIELD_ACCURACY_SUMMARY_FILE),
+                    lambda path: accuracy.getFilesFieldAccuracy().to_csv(path, index=False))
+    with profileStage(profiler, 'characteristics_merge'):
+        dfExport = mergeCharacteristicWithQualityDataFrame(allComputedRows, characteristics)
+    with profileStage(profiler, 'write_all_rows'):
+        replaceFile(os.path.join(outputFolderPath, ALL_ROWS_FILE), lambda path: dfExport.transpose().to_csv(
+            path, 
+            index=True, 
+            header=False
+        ))
+    return allComputedRows
+
+
 def loadCharacteristics(characteristicsPath):
     characteristics = pd.read_csv(characteristicsPath)
     characteristics = characteristics.set_index('fid')
     return characteristics
 
-def computeDataFolderToCSV(resourceFolderPath, outputFolderPath, characteristicsPath, percentageThreshold, timeThreshold):
-    """Process all folders in resource path and generate CSV outputs."""
-    allComputedRows = pd.DataFrame(columns=[])
+def computeDataFolderToCSV(resourceFolderPath, outputFolderPath, characteristicsPath, percentageThreshold, timeThreshold, scoreCache=None, collectStats=False, profile=False,
+                           secondaryTimeMatching=SECONDARY_TIME_MATCHING, dedup=DEDUP_MODE, busCrossingLinking=BUS_CROSSING_LINKING):
+    """Process all folders in resource path and generate CSV outputs.
+
+    Returns the combined consensus rows keyed by SITE_ID_COLUMN; join them
+    with mergeCharacteristicWithQualityDataFrame when site attributes are needed.
+    Pass the same PairScoreCache to repeated runs to reuse pair scores.
+
+    With collectStats, matcher and QC statistics are written per site next to
+    the graph CSVs and aggregated over all sites into run_stats.json. With
+    profile, wall time, CPU time and peak memory of every stage are recorded
+    per site and written to profile/profile_report.json and profile_summary.txt.
+    With secondaryTimeMatching, rows missing the subset time column are matched
+    through their other time fields (see generateReferenceGraph). dedup
+    ('flag' or 'collapse') runs dedupSubsets on every site before matching and
+    writes the duplicate pairs to dedup/{folderName}_duplicates.csv; 'collapse'
+    also drops all but the earliest row of each duplicate group. With
+    busCrossingLinking, every site's crossings are linked to the bus-stop
+    intervals they overlap (linkBusCrossings): the rows gain a Bus Present
+    During Crossing column and the links are written to
+    links/{folderName}_bus_crossings.csv.
+    """
+    siteFrames = []
     accuracy = AccuracyScore()
     characteristics = loadCharacteristics(characteristicsPath)
+    runStats = PipelineStats() if collectStats else None
+    profiler = PipelineProfiler() if profile else None
     for fileFolder in os.listdir(resourceFolderPath):
         filePath = os.path.join(resourceFolderPath, fileFolder)
         if os.path.isdir(filePath):
-           allComputedRows=pd.concat([allComputedRows, _processFolder(filePath, outputFolderPath, characteristics.loc[int(os.path.basename(filePath))], accuracy, percentageThreshold, timeThreshold)], ignore_index=False)
-        
-    accuracyDF = pd.DataFrame(accuracy.getFilesAccuracy(), columns=['Location', 'Accuracy'])
-    accuracyDF.to_csv(os.path.join(outputFolderPath, 'interated_summary.csv'), header=True)
-    allComputedRows.transpose().to_csv(
-        os.path.join(outputFolderPath, 'allComputedRows.csv'), 
-        index=True, 
-        header=False
-    )
+            siteStats = runStats.scope('sites').scope(fileFolder) if runStats is not None else None
+            with profiler.site(fileFolder) if profiler is not None else nullcontext():
+                siteFrames.append(_processFolder(filePath, outputFolderPath, characteristics, accuracy, percentageThreshold, timeThreshold, scoreCache, siteStats, profiler,
+                                                 secondaryTimeMatching, dedup, busCrossingLinking))
+            if runStats is not None:
+                runStats.scope('total').merge(siteStats)
+    allComputedRows = writeRunSummaries(outputFolderPath, siteFrames, accuracy, characteristics, profiler)
+    if runStats is not None:
+        if scoreCache is not None:
+            runStats.scope('scoreCache').counters.update(scoreCache.getStats())
+        runStats.writeJson(os.path.join(outputFolderPath, 'run_stats.json'))
+    if profiler is not None:
+        profiler.stop()
+        profiler.writeReport(os.path.join(outputFolderPath, 'profile'))
+        print(profiler.summary())
+    return allComputedRows
 
 
 def performAccuracyTest(outputFile, humanQualityFile):
@@ -0,0 +1,100 @@
+"""Within-reviewer duplicate detection before matching.
+
+A coder sometimes logs the same road user twice. Both copies then become
+nodes of generateReferenceGraph and one of them claims a target the other
+reviewers' row should have had. findDuplicates self-joins one reviewer subset
+(sorted by its time column) over the +-timeThreshold window: for every offset
+k it pairs each row with the row k places later, scores all pairs still inside
+the window with computeFeatureScoresBatch, and stops once no pair at that
+offset is within the window, so the cost is O(n * window).
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from traffic_research.core.scoring import computeFeatureScoresBatch
+from traffic_research.processing.data_processing import SUBSETS
+from config import DEDUP_SCORE_THRESHOLD
+
+DUPLICATE_COLUMNS = ['File', 'Subset', 'KeptIndex', 'DuplicateIndex', 'Score', 'TimeDifference']
+
+
+def findDuplicates(df, timeColumn, timeThreshold, scoreThreshold=DEDUP_SCORE_THRESHOLD):
+    """Near-duplicate row pairs of one time-sorted reviewer subset.
+
+    Returns (left, right, scores, timeDifferences): positions of pairs whose
+    timeColumn values are within timeThreshold and whose computeFeatureScores
+    similarity is at least scoreThreshold, with left < right.
+    """
+    times = df[timeColumn].to_numpy(dtype='float64', na_value=np.nan)
+    valid = np.flatnonzero(times >= 0)
+    validTimes = times[valid]
+    lefts, rights = [], []
+    for offset in range(1, len(valid)):
+        inWindow = validTimes[offset:] - validTimes[:-offset] <= timeThreshold
+        if not inWindow.any():
+            break
+        pairs = np.flatnonzero(inWindow)
+        lefts.append(valid[pairs])
+        rights.append(valid[pairs + offset])
+    if not lefts:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0), np.zeros(0)
+    left = np.concatenate(lefts)
+    right = np.concatenate(rights)
+    scores = computeFeatureScoresBatch(df, left, right, timeThreshold)
+    keep = scores >= scoreThreshold
+    left, right, scores = left[keep], right[keep], scores[keep]
+    order = np.lexsort((right, left))
+    left, right, scores = left[order], right[order], scores[order]
+    return left, right, scores, np.abs(times[right] - times[left])
+
+
+def _duplicateGroups(n, left, right):
+    """Union-find over the duplicate pairs; returns the group root (lowest position) of every row."""
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in zip(left.tolist(), right.tolist()):
+        rootA, rootB = find(a), find(b)
+        if rootA != rootB:
+            parent[max(rootA, rootB)] = min(rootA, rootB)
+    return [find(i) for i in range(n)]
+
+
+def dedupSubsets(subsets, timeThreshold, scoreThreshold=DEDUP_SCORE_THRESHOLD, collapse=False):
+    """Find near-duplicates in every reviewer subset of a site (loadSiteSubsets output).
+
+    Returns (subsets, report). report has one row per duplicate row (File,
+    Subset, KeptIndex: the group's first row by time, DuplicateIndex, and the Score
+    and TimeDifference of its most similar earlier row), indexes being row
+    labels of the reviewer file. With collapse, every group of duplicates
+    is reduced to its first row by time and each subset's reviewer list is
+    re-sorted by row count; otherwise subsets is returned unchanged.
+    """
+    records = []
+    result = {}
+    for subsetName, timeColumn in SUBSETS:
+        dflist = []
+        for df in subsets[subsetName]:
+            left, right, scores, timeDifferences = findDuplicates(df['df'], timeColumn, timeThreshold, scoreThreshold)
+            labels = df['df'].index
+            groups = _duplicateGroups(len(df['df']), left, right) if len(left) else None
+            best = {}
+            for a, b, score, timeDifference in zip(left.tolist(), right.tolist(), scores.tolist(), timeDifferences.tolist()):
+                if b not in best or score > best[b][0]:
+                    best[b] = (score, timeDifference)
+            for b, (score, timeDifference) in sorted(best.items()):
+                records.append((os.path.basename(df['path']), subsetName, labels[groups[b]], labels[b], score, timeDifference))
+            if collapse and groups is not None:
+                keep = np.array([group == pos for pos, group in enumerate(groups)])
+                df = {'path': df['path'], 'df': df['df'][keep]}
+            dflist.append(df)
+        result[subsetName] = sorted(dflist, key=lambda x: x['df'].shape[0]) if collapse else dflist
+    report = pd.DataFrame(records, columns=DUPLICATE_COLUMNS)
+    return (result if collapse else subsets), report
@@ -0,0 +1,386 @@
+"""Incremental reference-graph and consensus updates for edited reviewer files.
+
+IncrementalSiteGraph keeps one site's per-subset match decisions keyed by row
+label. When one reviewer's rows are added, removed or modified, each
+MATCH_PASSES pass is rescanned in time order. A source row is rescored only
+if it changed itself or if its time window contains a "dirty" target:
+
+- a changed target row (old and new times),
+- the old target of a changed source row,
+- a target whose claim state differs between the old and the new decisions
+  made so far (how a changed claim cascades through the greedy pass), or
+- for pass 1->2, a reviewer-2 row whose pass-0->2 claim changed.
+
+Every other source keeps its old decision, which is exact: its candidates,
+their scores and their claims are all unchanged. Consensus rows are memoized
+by the rows they combine, together with the AccuracyScore each one recorded,
+so only rows whose inputs changed are rebuilt and the site's per-subset and
+per-field agreement is merged from the memo.
+Results (graphs, consensus rows, accuracy) equal a full rebuild; a subset
+whose reviewer order (by row count) changes is rebuilt from scratch.
+"""
+
+import bisect
+import os
+
+import numpy as np
+import pandas as pd
+from traffic_research.core.data_engineering import generateDateFrame, generateDateFrameList
+from traffic_research.core.matching import MATCH_PASSES, generateReferenceGraph, selectBestMatch
+from traffic_research.core.models import AccuracyScore, RowRecord
+from traffic_research.core.scoring import TIME_FIELDS
+from traffic_research.processing.data_processing import SUBSETS, partitionSubsets, combineQualityControlDataFrames
+from traffic_research.processing.quality_control import constructRowDict
+
+
+class _SubsetFrame:
+    """A reviewer's subset rows with the arrays the pass scan needs."""
+
+    def __init__(self, path, df, timeColumn):
+        self.path = path
+        self.df = df
+        self.labels = df.index.tolist()
+        self.positions = {label: pos for pos, label in enumerate(self.labels)}
+        self.times = df[timeColumn].to_numpy(dtype='float64', na_value=np.nan)
+        self.timeRows = df[TIME_FIELDS].to_numpy(dtype='float64', na_value=np.nan).tolist()
+        self._records = None
+
+    @property
+    def records(self):
+        # Built on first use: most subset frames of an edit never feed a rebuilt consensus row.
+        if self._records is None:
+            self._records = RowRecord.fromFrame(self.df)
+        return self._records
+
+
+def _scanPass(source, target, timeColumn, timeThreshold, percentageThreshold, oldDecisions,
+              changedSources, dirtyTimes, blockedTargets):
+    """Greedy pass source -> target reusing oldDecisions where nothing in reach changed.
+
+    Rescored rows are matched by selectBestMatch, as in generateReferenceGraph.
+    Decisions map a source label to (target label or None, score). Returns
+    (decisions, claimed target labels, number of rescored source rows).
+    """
+    dirtyTimes = sorted(t for t in dirtyTimes if not np.isnan(t))
+    lower = np.searchsorted(target.times, source.times - timeThreshold, side='left')
+    upper = np.searchsorted(target.times, source.times + timeThreshold, side='right')
+    decisions = {}
+    oldClaimed = set()
+    newClaimed = set()
+    claimDiff = set()
+    rescored = 0
+
+    def windowIsDirty(t):
+        i = bisect.bisect_left(dirtyTimes, t - timeThreshold)
+        if i < len(dirtyTimes) and dirtyTimes[i] <= t + timeThreshold:
+            return True
+        for label in claimDiff:
+            pos = target.positions.get(label)
+            if pos is not None and abs(target.times[pos] - t) <= timeThreshold:
+                return True
+        return False
+
+    for pos, label in enumerate(source.labels):
+        t = source.times[pos]
+        old = oldDecisions.get(label)
+        if np.isnan(t) or t < 0:
+            decision = (None, 0.0)
+        elif old is not None and label not in changedSources and not windowIsDirty(t):
+            decision = old
+        else:
+            rescored += 1
+            window = [
+                i for i in range(lower[pos], upper[pos])
+                if not np.isnan(target.times[i])
+                and target.labels[i] not in newClaimed and target.labels[i] not in blockedTargets
+            ]
+            maxScore, maxIndex, _, _, _ = selectBestMatch(
+                window, t, source.df.iloc[pos], source.timeRows[pos],
+                target.times.__getitem__, target.timeRows.__getitem__, target.df.iloc.__getitem__,
+                timeThreshold, percentageThreshold,
+            )
+            decision = (target.labels[maxIndex] if maxIndex >= 0 else None, maxScore)
+        decisions[label] = decision
+
+        touched = []
+        if old is not None and old[0] is not None:
+            oldClaimed.add(old[0])
+            touched.append(old[0])
+        if decision[0] is not None:
+            newClaimed.add(decision[0])
+            touched.append(decision[0])
+        for targetLabel in touched:
+            if (targetLabel in oldClaimed) != (targetLabel in newClaimed):
+                claimDiff.add(targetLabel)
+            else:
+                claimDiff.discard(targetLabel)
+    return decisions, newClaimed, rescored
+
+
+class IncrementalSiteGraph:
+    """Reference graphs and consensus rows of one site, updatable per reviewer edit.
+
+    reviewerFrames is a list of (path, parsed DataFrame) in the order
+    loadSiteSubsets reads the folder. Use fromFolder to load a site folder,
+    then applyReviewerChanges or reloadReviewerFile after an edit; graphs,
+    qualityControlDataFrame() and getAccuracy() always equal the batch
+    pipeline's result for the current rows.
+    """
+
+    def __init__(self, reviewerFrames, timeThreshold, percentageThreshold):
+        self.timeThreshold = timeThreshold
+        self.percentageThreshold = percentageThreshold
+        self.paths = [path for path, _ in reviewerFrames]
+        self.frames = {path: df for path, df in reviewerFrames}
+        self.versions = {path: {} for path in self.paths}
+        self.subsets = {}
+        self.order = {}
+        self.decisions = {}
+        self.graphs = {}
+        self._rows = {}
+        self._rowMemo = {}
+        self.lastUpdate = {}
+        for path in self.paths:
+            self._partition(path)
+        for subsetName, timeColumn in SUBSETS:
+            self._rebuildSubset(subsetName, timeColumn)
+
+    @classmethod
+    def fromFolder(cls, filePath, timeThreshold, percentageThreshold):
+        fileList = [
+            os.path.join(filePath, filename)
+            for filename in os.listdir(filePath)
+            if filename.endswith(".csv")
+        ]
+        dflist = generateDateFrameList(fileList)
+        return cls([(df['path'], df['df']) for df in dflist], timeThreshold, percentageThreshold)
+
+    # ---------------- structure ----------------
+    def _partition(self, path):
+        for (subsetName, timeColumn), subsetDF in zip(SUBSETS, partitionSubsets(self.frames[path]).values()):
+            self.subsets.setdefault(subsetName, {})[path] = _SubsetFrame(path, subsetDF, timeColumn)
+
+    def _reviewerOrder(self, subsetName):
+        # loadSiteSubsets: stable sort of the folder order by subset row count.
+        return sorted(self.paths, key=lambda path: len(self.subsets[subsetName][path].labels))
+
+    def _rebuildSubset(self, subsetName, timeColumn):
+        order = self._reviewerOrder(subsetName)
+        frames = [self.subsets[subsetName][path] for path in order]
+        graph = generateReferenceGraph(
+            [{'path': frame.path, 'df': frame.df} for frame in frames],
+            timeThreshold=self.timeThreshold,
+            percentageThreshold=self.percentageThreshold,
+            timeColumn=timeColumn,
+        )
+        decisions = []
+        for passIndex, (fromIdx, toIdx) in enumerate(MATCH_PASSES):
+            source, target = frames[fromIdx], frames[toIdx]
+            passDecisions = {}
+            for pos, label in enumerate(source.labels):
+                edge = graph[(source.path, pos)][0 if passIndex != 1 else 1]
+                index = edge["key"]["index"]
+                passDecisions[label] = (target.labels[index] if index >= 0 else None, edge["score"])
+            decisions.append(passDecisions)
+        self.order[subsetName] = order
+        self.decisions[subsetName] = decisions
+        self.graphs[subsetName] = graph
+        self._resolveRows(subsetName)
+
+    # ---------------- updates ----------------
+    def applyReviewerChanges(self, path, added=None, removed=(), modified=None):
+        """Apply row edits to one reviewer and update the affected edges and consensus rows.
+
+        added and modified are parsed DataFrames with the reviewer's columns;
+        modified is indexed by the labels it replaces, added rows keep their
+        labels unless those are taken (then they are numbered after the
+        reviewer's last label), removed is a list of row labels. Returns
+        {subsetName: rescored source rows, or 'rebuilt'}.
+        """
+        df = self.frames[path]
+        changed = set(removed)
+        if removed:
+            df = df.drop(index=list(removed))
+        if modified is not None and len(modified):
+            df = pd.concat([df.drop(index=modified.index), modified.set_axis(df.columns, axis=1)])
+            changed.update(modified.index)
+        if added is not None and len(added):
+            if df.index.intersection(added.index).size or added.index.has_duplicates:
+                start = max(self.frames[path].index.max(), df.index.max()) + 1 if len(df) else 0
+                added = added.set_axis(range(start, start + len(added)), axis=0)
+            df = pd.concat([df, added.set_axis(df.columns, axis=1)])
+            changed.update(added.index)
+        return self._replaceFrame(path, df.sort_index(), changed)
+
+    def reloadReviewerFile(self, path):
+        """Re-parse a reviewer CSV and apply the difference, matching rows by file position."""
+        newDF = generateDateFrame(path)
+        oldDF = self.frames[path]
+        if not (newDF.columns.equals(oldDF.columns) and newDF.dtypes.equals(oldDF.dtypes)):
+            return self._replaceFrame(path, newDF, set(oldDF.index) | set(newDF.index))
+        common = oldDF.index.intersection(newDF.index)
+        oldValues = oldDF.loc[common].to_numpy(dtype=object)
+        newValues = newDF.loc[common].to_numpy(dtype=object)
+        same = (oldValues == newValues) | (pd.isna(oldValues) & pd.isna(newValues))
+        changed = set(common[~same.all(axis=1)]) | set(oldDF.index.symmetric_difference(newDF.index))
+        return self._replaceFrame(path, newDF, changed)
+
+    def _replaceFrame(self, path, df, changed):
+        versions = self.versions[path]
+        for label in changed:
+            versions[label] = versions.get(label, 0) + 1
+        oldSubsets = {subsetName: self.subsets[subsetName][path] for subsetName, _ in SUBSETS}
+        self.frames[path] = df
+        self._partition(path)
+
+        summary = {}
+        for subsetName, timeColumn in SUBSETS:
+            oldFrame = oldSubsets[subsetName]
+            newFrame = self.subsets[subsetName][path]
+            oldLabels = set(oldFrame.labels)
+            newLabels = set(newFrame.labels)
+            subsetChanged = (oldLabels ^ newLabels) | (changed & oldLabels & newLabels)
+            if not subsetChanged:
+                summary[subsetName] = 0
+                continue
+            if self._reviewerOrder(subsetName) != self.order[subsetName]:
+                self._rebuildSubset(subsetName, timeColumn)
+                summary[subsetName] = 'rebuilt'
+                continue
+            summary[subsetName] = self._updateSubset(subsetName, timeColumn, path, oldFrame, subsetChanged)
+        self.lastUpdate = summary
+        return summary
+
+    def _updateSubset(self, subsetName, timeColumn, editedPath, oldFrame, changedLabels):
+        order = self.order[subsetName]
+        frames = [self.subsets[subsetName][p] for p in order]
+        edited = order.index(editedPath)
+        oldDecisions = self.decisions[subsetName]
+        newDecisions = []
+        rescored = 0
+        claimedByPass = []
+        oldClaimedByPass = [
+            {decision[0] for decision in passDecisions.values() if decision[0] is not None}
+            for passDecisions in oldDecisions
+        ]
+
+        def timesOf(frame, labels):
+            return [frame.times[frame.positions[label]] for label in labels if label in frame.positions]
+
+        for passIndex, (fromIdx, toIdx) in enumerate(MATCH_PASSES):
+            source, target = frames[fromIdx], frames[toIdx]
+            dirtyTimes = []
+            changedSources = set()
+            if toIdx == edited:
+                dirtyTimes += timesOf(oldFrame, changedLabels) + timesOf(target, changedLabels)
+            if fromIdx == edited:
+                changedSources = changedLabels
+                oldTargets = [
+                    oldDecisions[passIndex][label][0] for label in changedLabels
+                    if label in oldDecisions[passIndex] and oldDecisions[passIndex][label][0] is not None
+                ]
+                dirtyTimes += timesOf(target, oldTargets)
+            blocked = set()
+            if passIndex == 2:
+                # Pass 1->2 cannot use reviewer-2 rows claimed by pass 0->2.
+                blocked = claimedByPass[1]
+                dirtyTimes += timesOf(target, claimedByPass[1] ^ oldClaimedByPass[1])
+                if toIdx == edited:
+                    dirtyTimes += timesOf(oldFrame, oldClaimedByPass[1] - claimedByPass[1])
+            decisions, claimed, passRescored = _scanPass(
+                source, target, timeColumn, self.timeThreshold, self.percentageThreshold,
+                oldDecisions[passIndex], changedSources, dirtyTimes, blocked,
+            )
+            newDecisions.append(decisions)
+            claimedByPass.append(claimed)
+            rescored += passRescored
+
+        self.decisions[subsetName] = newDecisions
+        self.graphs[subsetName] = self._graphFromDecisions(frames, newDecisions)
+        self._resolveRows(subsetName)
+        return rescored
+
+    # ---------------- outputs ----------------
+    def _graphFromDecisions(self, frames, decisions):
+        graph = {}
+        for passIndex, (fromIdx, toIdx) in enumerate(MATCH_PASSES):
+            source, target = frames[fromIdx], frames[toIdx]
+            for pos, label in enumerate(source.labels):
+                targetLabel, score = decisions[passIndex][label]
+                index = target.positions[targetLabel] if targetLabel is not None else -1
+                graph.setdefault((source.path, pos), []).append(
+                    {"key": {"dfName": target.path, "index": index}, "score": score}
+                )
+        return graph
+
+    def _consensusRow(self, subsetName, pos, roles):
+        """constructRowDict for roles = three (frame, label) pairs ((None, None) when absent), memoized by labels and versions."""
+        memoKey = (subsetName,) + tuple((frame.path, label) if frame is not None else None for frame, label in roles)
+        versions = tuple(
+            self.versions[frame.path].get(label, 0) if frame is not None else None for frame, label in roles
+        )
+        memo = self._rowMemo.get(memoKey)
+        if memo is None or memo[0] != versions:
+            rowAccuracy = AccuracyScore()
+            rows = [frame.records[frame.positions[label]] if frame is not None else None for frame, label in roles]
+            with rowAccuracy.subset(subsetName):
+                rowDict = constructRowDict(rows[0], rows[1], rows[2], pos, rowAccuracy, self.timeThreshold)
+            memo = (versions, rowDict, rowAccuracy)
+            self._rowMemo[memoKey] = memo
+        _, rowDict, rowAccuracy = memo
+        if rowDict["User Count"] != pos + 1:
+            rowDict = dict(rowDict, **{"User Count": pos + 1})
+        return memoKey, rowDict, rowAccuracy
+
+    def _resolveRows(self, subsetName):
+        """Consensus rows of a subset from its decisions, as generateQualityControlDataFramebyGraph builds them."""
+        frames = [self.subsets[subsetName][path] for path in self.order[subsetName]]
+        pass01, pass02, pass12 = self.decisions[subsetName]
+        claimed01 = {decision[0] for decision in pass01.values() if decision[0] is not None}
+        rows = []
+        used = set()
+        for pos, label in enumerate(frames[0].labels):
+            match1, match2 = pass01[label][0], pass02[label][0]
+            if match2 is None and match1 is not None:
+                match2 = pass12[match1][0]
+            if match1 is None and match2 is None:
+                continue
+            roles = [
+                (frames[0], label),
+                (frames[1], match1) if match1 is not None else (None, None),
+                (frames[2], match2) if match2 is not None else (None, None),
+            ]
+            memoKey, rowDict, rowAccuracy = self._consensusRow(subsetName, pos, roles)
+            used.add(memoKey)
+            rows.append((rowDict, rowAccuracy))
+        for pos, label in enumerate(frames[1].labels):
+            match2 = pass12[label][0]
+            if label in claimed01 or match2 is None:
+                continue
+            memoKey, rowDict, rowAccuracy = self._consensusRow(
+                subsetName, pos, [(frames[1], label), (frames[2], match2), (None, None)]
+            )
+            used.add(memoKey)
+            rows.append((rowDict, rowAccuracy))
+        for memoKey in [key for key in self._rowMemo if key[0] == subsetName and key not in used]:
+            del self._rowMemo[memoKey]
+        self._rows[subsetName] = rows
+
+    def qualityControlDataFrames(self):
+        return {subsetName: pd.DataFrame([rowDict for rowDict, _ in self._rows[subsetName]]) for subsetName, _ in SUBSETS}
+
+    def qualityControlDataFrame(self):
+        """The site's combined consensus rows, as _processFolder builds them."""
+        return combineQualityControlDataFrames(self.qualityControlDataFrames())
+
+    def accuracyScore(self):
+        """The site's AccuracyScore (per subset and field), merged from the consensus rows' scores."""
+        accuracy = AccuracyScore()
+        for subsetName, _ in SUBSETS:
+            for _, rowAccuracy in self._rows[subsetName]:
+                accuracy.merge(rowAccuracy)
+        return accuracy
+
+    def getAccuracy(self):
+        """Inter-reviewer accuracy of the site, as AccuracyScore.getAccuracy reports it."""
+        return self.accuracyScore().getAccuracy()
@@ -0,0 +1,90 @@
+"""Post-consensus linking of bus-stop intervals and crossing events.
+
+The subsets are matched independently, so a consensus crossing row carries no
+reference to the bus that was at the stop while it happened. linkBusCrossings
+joins the two by time: every consensus row with a Bus Stop Arrival Time is a
+bus interval [arrival, departure] and every row with a Crossing Start Time is a
+crossing interval [start, end]. Two closed intervals overlap exactly when the
+later start lies inside the other one, so the overlapping pairs are found with
+two binary-search passes over the sorted starts (bus starts inside a crossing,
+then crossing starts strictly inside a bus interval), in
+O((n + m) log(n + m) + links) without comparing every bus with every crossing.
+
+A BusUserCrossing row carries both a crossing and its own bus-stop visit, so
+it is a crossing and a bus interval at once. Its self-pair is dropped: a
+crossing is only linked to bus intervals recorded on other rows, and its own
+bus-stop visit does not make a bus "present during" it.
+"""
+
+import numpy as np
+import pandas as pd
+from traffic_research.core.utils import timeStringsToSeconds
+
+BUS_PRESENT_COLUMN = 'Bus Present During Crossing'
+LINK_COLUMNS = ['CrossingRow', 'BusRow', 'CrossingStartTime', 'CrossingEndTime', 'BusArrivalTime', 'BusDepartureTime']
+
+
+def _intervals(df, startColumn, endColumn):
+    """Row positions, starts and ends of the rows with a valid start; a missing or earlier end closes the interval at its start."""
+    starts = timeStringsToSeconds(df[startColumn])
+    ends = timeStringsToSeconds(df[endColumn])
+    rows = np.flatnonzero(~np.isnan(starts))
+    starts, ends = starts[rows], ends[rows]
+    ends = np.where(np.isnan(ends) | (ends < starts), starts, ends)
+    return rows, starts, ends
+
+
+def _startsWithin(starts, windowStarts, windowEnds, side):
+    """Pairs (i, j) with starts[i] inside window j: from windowStart (inclusive, or exclusive with side='right') to windowEnd."""
+    order = np.argsort(starts, kind='stable')
+    sortedStarts = starts[order]
+    lo = np.searchsorted(sortedStarts, windowStarts, side=side)
+    hi = np.searchsorted(sortedStarts, windowEnds, side='right')
+    counts = np.maximum(hi - lo, 0)
+    windows = np.repeat(np.arange(len(windowStarts)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return order[np.repeat(lo, counts) + offsets], windows
+
+
+def overlappingIntervals(busStarts, busEnds, eventStarts, eventEnds):
+    """(bus, event) positions of every overlapping pair of closed intervals, ordered by event then bus."""
+    busFirst, events = _startsWithin(busStarts, eventStarts, eventEnds, side='left')
+    eventFirst, buses = _startsWithin(eventStarts, busStarts, busEnds, side='right')
+    bus = np.concatenate([busFirst, buses])
+    event = np.concatenate([events, eventFirst])
+    order = np.lexsort((busStarts[bus], event))
+    return bus[order], event[order]
+
+
+def linkBusCrossings(dfQualityControl):
+    """Every (crossing, bus interval) pair of one site's consensus rows that overlaps in time.
+
+    Returns a DataFrame with LINK_COLUMNS: CrossingRow and BusRow are row
+    positions in dfQualityControl (its index repeats across subsets), followed
+    by both rows' times as written in the consensus output. A row is never
+    linked to itself.
+    """
+    busRows, busStarts, busEnds = _intervals(dfQualityControl, 'Bus Stop Arrival Time', 'Bus Stop Departure Time')
+    crossingRows, crossingStarts, crossingEnds = _intervals(dfQualityControl, 'Crossing Start Time', 'Crossing End Time')
+    bus, crossing = overlappingIntervals(busStarts, busEnds, crossingStarts, crossingEnds)
+    crossingRow, busRow = crossingRows[crossing], busRows[bus]
+    other = crossingRow != busRow
+    crossingRow, busRow = crossingRow[other], busRow[other]
+    return pd.DataFrame({
+        'CrossingRow': crossingRow,
+        'BusRow': busRow,
+        'CrossingStartTime': dfQualityControl['Crossing Start Time'].to_numpy()[crossingRow],
+        'CrossingEndTime': dfQualityControl['Crossing End Time'].to_numpy()[crossingRow],
+        'BusArrivalTime': dfQualityControl['Bus Stop Arrival Time'].to_numpy()[busRow],
+        'BusDepartureTime': dfQualityControl['Bus Stop Departure Time'].to_numpy()[busRow],
+    }, columns=LINK_COLUMNS)
+
+
+def annotateBusPresence(dfQualityControl, links):
+    """Add BUS_PRESENT_COLUMN: 'yes'/'no' on crossing rows (whether links holds a bus for the row), '' elsewhere."""
+    hasCrossing = ~np.isnan(timeStringsToSeconds(dfQualityControl['Crossing Start Time']))
+    busPresent = np.zeros(len(dfQualityControl), dtype=bool)
+    busPresent[links['CrossingRow'].to_numpy(dtype=np.intp)] = True
+    dfQualityControl = dfQualityControl.copy()
+    dfQualityControl[BUS_PRESENT_COLUMN] = np.where(hasCrossing, np.where(busPresent, 'yes', 'no'), '')
+    return dfQualityControl
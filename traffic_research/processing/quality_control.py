@@ -1,13 +1,10 @@
 """Quality control functions for generating and testing data quality."""
 
-from typing import Any
+import numpy as np
 import pandas as pd
-import sys
-import os
-from enum import Enum
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../..'))
 from traffic_research.core.data_engineering import DataEngining, float_cols
 from traffic_research.core.matching import compareParameters, compareTimeDistance
+from traffic_research.core.models import AccuracyBuffer, RowRecord
 from traffic_research.core.utils import enumToString, secondsToTimeString
 from config import EXCLUDED_FROM_ACCURACY, DEFAULT_TIME_THRESHOLD
 
@@ -111,17 +108,22 @@ def parseEnumObjectRow(rowObject):
     return result
     
 def constructRowDict(row0, row1, row2, index, accuracy, timeThreshold):
-    """Construct a row dictionary by comparing three reviewer rows."""
+    """Construct a row dictionary by comparing three reviewer rows (RowRecords or pandas Series).
+
+    accuracy is an AccuracyScore, which receives the row's per-field counts
+    in one updateMany, or an AccuracyBuffer the caller flushes itself.
+    """
+    rowAccuracy = accuracy if isinstance(accuracy, AccuracyBuffer) else AccuracyBuffer()
     
     def compare(field):
-        return compareParameters(row0, row1, row2, field, accuracy)
+        return compareParameters(row0, row1, row2, field, rowAccuracy)
     
     def compareTime(field):
         time0 = row0[field] if row0 is not None else -1
         time1 = row1[field] if row1 is not None else -1
         time2 = row2[field] if row2 is not None else -1
         
-        return compareTimeDistance(time0, time1, time2, accuracy, timeThreshold)
+        return compareTimeDistance(time0, time1, time2, rowAccuracy, timeThreshold, field)
     
         
     def combineNotes(field):
@@ -234,12 +236,22 @@ def constructRowDict(row0, row1, row2, index, accuracy, timeThreshold):
     result["CrossingDuration_fromMedian"] = crossingEndTime - refugeIslandEndTime if refugeIslandEndTime > 0 else "N/A"
     result["Median_WaitTime"] = refugeIslandEndTime - refugeIslandStartTime if refugeIslandEndTime > 0  and refugeIslandStartTime > 0 else "N/A"
     result["ObservationTime"] = secondsToTimeString(busArrivalTime if busArrivalTime > 0 else crossingStartTime)
+    if rowAccuracy is not accuracy:
+        rowAccuracy.flushTo(accuracy)
     return result
 
-def generateQualityControlDataFramebyGraph(refGraph, dflist, accuracy, timeThreshold):
-    """Build QC rows from refGraph by resolving each node to (row0, row1?, row2?) and calling constructRowDict."""
+def generateQualityControlDataFramebyGraph(refGraph, dflist, accuracy, timeThreshold, stats=None):
+    """Build QC rows from refGraph by resolving each node to (row0, row1?, row2?) and calling constructRowDict.
+
+    When a PipelineStats is given it counts nodes, skippedNodes (already visited
+    or without matches), transitiveLookups, unmatchedNodes and the consensus rows
+    built from two or three reviewers. Agreement counts of all rows are
+    collected in an AccuracyBuffer and added to accuracy in one updateMany.
+    """
+    rowAccuracy = AccuracyBuffer()
     paths = [dflist[i]["path"] for i in range(3)]
-    dfs = [dflist[i]["df"] for i in range(3)]
+    # Rows are converted to RowRecords once; constructRowDict reads ~40 fields per row.
+    dfs = [RowRecord.fromFrame(dflist[i]["df"]) for i in range(3)]
     path_to_idx = {p: i for i, p in enumerate(paths)}
     visited = [set(), set(), set()]
     rows = []
@@ -252,7 +264,11 @@ def generateQualityControlDataFramebyGraph(refGraph, dflist, accuracy, timeThres
             from_dfName = from_dict["dfName"]
             from_index = from_dict["index"]
         from_idx = path_to_idx[from_dfName]
+        if stats is not None:
+            stats.count('nodes')
         if from_index in visited[from_idx] or len(matches) == 0:
+            if stats is not None:
+                stats.count('skippedNodes')
             continue
         visited[from_idx].add(from_index)
 
@@ -267,25 +283,32 @@ def generateQualityControlDataFramebyGraph(refGraph, dflist, accuracy, timeThres
         if not valid_1 and valid_0 and len(matches) > 1:
             # print(f"valid_1 is None and valid_0 is not None: {valid_1} {valid_0}")
             # print(f"m0_key: {m0_key}")
+            if stats is not None:
+                stats.count('transitiveLookups')
             m1_key = refGraph[(m0_key["dfName"], m0_key["index"])][0]["key"] if refGraph[(m0_key["dfName"], m0_key["index"])] else None
             m1_score = refGraph[(m0_key["dfName"], m0_key["index"])][0]["score"] if refGraph[(m0_key["dfName"], m0_key["index"])] else -1
             valid_1 = m1_key is not None and m1_score > -1 and m1_key["index"] >= 0 and m1_key["index"] not in visited[path_to_idx[m1_key["dfName"]]]
 
         if not (valid_0 or valid_1):
+            if stats is not None:
+                stats.count('unmatchedNodes')
             continue
 
-        row0 = dfs[from_idx].iloc[from_index]
+        row0 = dfs[from_idx][from_index]
         row1 = None
         row2 = None
         if valid_0:
             idx0 = path_to_idx[m0_key["dfName"]]
-            row1 = dfs[idx0].iloc[m0_key["index"]]
+            row1 = dfs[idx0][m0_key["index"]]
             visited[idx0].add(m0_key["index"])
         if valid_1:
             idx1 = path_to_idx[m1_key["dfName"]]
-            row2 = dfs[idx1].iloc[m1_key["index"]]
+            row2 = dfs[idx1][m1_key["index"]]
             visited[idx1].add(m1_key["index"])
-        rows.append(constructRowDict(row0, row1, row2, from_index, accuracy, timeThreshold))
+        if stats is not None:
+            stats.count('threeReviewerRows' if valid_0 and valid_1 else 'twoReviewerRows')
+        rows.append(constructRowDict(row0, row1, row2, from_index, rowAccuracy, timeThreshold))
+    rowAccuracy.flushTo(accuracy)
     return pd.DataFrame(rows)
 
 
@@ -347,3 +370,38 @@ def accuracyTest(humanQualityDF, computedQualityDF):
         indexCount += (len(computedQualityDF) - rowCount) * len(columns_to_compare)
     
     return correctCount / indexCount if indexCount > 0 else 0.0
+
+
+def accuracyByField(humanQualityDF, computedQualityDF):
+    """Per-field breakdown of accuracyTest: {field: (correctCount, comparedCount)}.
+
+    Rows, columns and matching rules are those of accuracyTest, so summing
+    correct over compared across fields gives the same accuracy. Each field
+    is compared as one column at a time instead of cell by cell.
+    """
+    common_columns = humanQualityDF.columns.intersection(computedQualityDF.columns)
+    columns_to_compare = [col for col in common_columns if col not in EXCLUDED_FROM_ACCURACY]
+    missing_in_computed = [
+        col for col in humanQualityDF.columns.difference(computedQualityDF.columns) if col not in EXCLUDED_FROM_ACCURACY
+    ]
+    rowCount = min(len(humanQualityDF), len(computedQualityDF))
+    # accuracyTest reads both frames with iloc at the human row's label.
+    positions = humanQualityDF.index[:rowCount].to_numpy()
+    humanRemaining = len(humanQualityDF) - rowCount
+    computedRemaining = len(computedQualityDF) - rowCount if humanRemaining == 0 else 0
+
+    result = {}
+    for col in columns_to_compare:
+        humanVals = humanQualityDF[col].iloc[positions].to_numpy(dtype=object)
+        computedVals = computedQualityDF[col].iloc[positions].to_numpy(dtype=object)
+        humanBlank = pd.isna(humanVals) | (humanVals == '0')
+        computedBlank = pd.isna(computedVals) | (computedVals == '0')
+        correct = (humanVals == computedVals) | (humanBlank & computedBlank)
+        if col in float_cols:
+            humanFloat = pd.to_numeric(pd.Series(humanVals), errors='coerce').to_numpy(dtype='float64')
+            computedFloat = pd.to_numeric(pd.Series(computedVals), errors='coerce').to_numpy(dtype='float64')
+            correct |= np.abs(humanFloat - computedFloat) < DEFAULT_TIME_THRESHOLD
+        result[col] = (int(correct.sum()), rowCount + humanRemaining + computedRemaining)
+    for col in missing_in_computed:
+        result[col] = (0, rowCount + humanRemaining)
+    return result
@@ -0,0 +1,271 @@
+"""Long-running local HTTP service answering per-site QC and accuracy requests from warm state.
+
+A fresh ``python main.py`` run re-imports pandas and re-parses every reviewer
+CSV for each question. WarmPipeline keeps, per site and behind an LRU, the
+parsed reviewer subsets, a SiteScoreTable (every candidate pair's time
+differences and condition score, from which generateReferenceGraph is
+reproduced for any thresholds inside its window) and the consensus results of
+the thresholds already asked for. A site is re-parsed only when one of its
+CSVs changes on disk. Rows matched through secondary time fields are not in
+the table, so those requests run generateReferenceGraph with a PairScoreCache
+of the site's own. Its entries are keyed by (reviewer path, row label), so
+it is dropped with the rest of the site state whenever a CSV changes or the
+site is recomputed.
+
+Endpoints (GET, JSON responses; thresholds default to DEFAULT_PERCENTAGE_THRESHOLD
+and DEFAULT_TIME_THRESHOLD):
+
+- /sites — site ids and names.
+- /qc?site=&percentageThreshold=&timeThreshold=&secondaryTimes=0|1 — consensus
+  rows and inter-reviewer agreement.
+- /accuracy?site=&... — accuracy of the consensus against the site's human QC
+  file, overall and per field.
+- /recompute?site=&... — drop the site's warm state and rebuild it.
+- /stats — cached sites with their result counts and PairScoreCache counters.
+"""
+
+import json
+import os
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+from traffic_research.core.matching import generateReferenceGraph
+from traffic_research.core.models import AccuracyScore
+from traffic_research.core.scoring import PairScoreCache
+from traffic_research.processing.accuracy import discoverHumanQualityFiles, loadQualityFrames, matchHumanQualityFile
+from traffic_research.processing.data_processing import (
+    SUBSETS,
+    SITE_ID_COLUMN,
+    loadSiteSubsets,
+    loadCharacteristics,
+    combineQualityControlDataFrames,
+    roundTripExport,
+)
+from traffic_research.processing.quality_control import accuracyByField, generateQualityControlDataFramebyGraph
+from traffic_research.processing.sweep import SiteScoreTable
+from config import (
+    INPUT_DATA_PATH,
+    CHARACTERISTICS_PATH,
+    HUMAN_QC_PATH,
+    DEFAULT_PERCENTAGE_THRESHOLD,
+    DEFAULT_TIME_THRESHOLD,
+    SERVICE_HOST,
+    SERVICE_PORT,
+    SERVICE_CACHE_SIZE,
+    SERVICE_RESULTS_PER_SITE,
+)
+
+
+class _SiteState:
+    """Warm state of one site: parsed subsets, score table, pair scores and consensus results by thresholds."""
+
+    def __init__(self, fingerprint, subsets):
+        self.fingerprint = fingerprint
+        self.subsets = subsets
+        self.scoreTable = None
+        self.scoreCache = PairScoreCache()
+        self.results = OrderedDict()
+
+
+class WarmPipeline:
+    """Per-site parsed frames, score tables and consensus results kept in memory between requests."""
+
+    def __init__(self, resourceFolderPath=INPUT_DATA_PATH, characteristicsPath=CHARACTERISTICS_PATH,
+                 humanQualityPath=HUMAN_QC_PATH, maxSites=SERVICE_CACHE_SIZE, resultsPerSite=SERVICE_RESULTS_PER_SITE):
+        self.resourceFolderPath = resourceFolderPath
+        self.characteristics = loadCharacteristics(characteristicsPath)
+        self.humanQualityPath = humanQualityPath
+        self.maxSites = maxSites
+        self.resultsPerSite = resultsPerSite
+        self._sites = OrderedDict()
+
+    def sites(self):
+        """{site id: site name} of every site folder under resourceFolderPath."""
+        return {
+            int(folderName): str(self.characteristics.loc[int(folderName), 'GTFSSTOP_NAME'])
+            for folderName in sorted(os.listdir(self.resourceFolderPath))
+            if os.path.isdir(os.path.join(self.resourceFolderPath, folderName))
+        }
+
+    def _fingerprint(self, filePath):
+        return tuple(
+            (fileName, stat.st_mtime_ns, stat.st_size)
+            for fileName, stat in sorted(
+                (fileName, os.stat(os.path.join(filePath, fileName)))
+                for fileName in os.listdir(filePath)
+                if fileName.endswith('.csv')
+            )
+        )
+
+    def _site(self, site):
+        """Warm state of site, (re)loaded when it is not cached or its CSVs changed."""
+        filePath = os.path.join(self.resourceFolderPath, str(site))
+        if not os.path.isdir(filePath):
+            raise KeyError(f"Unknown site {site}")
+        fingerprint = self._fingerprint(filePath)
+        state = self._sites.get(site)
+        if state is None or state.fingerprint != fingerprint:
+            state = _SiteState(fingerprint, loadSiteSubsets(filePath))
+            self._sites[site] = state
+        self._sites.move_to_end(site)
+        while len(self._sites) > self.maxSites:
+            self._sites.popitem(last=False)
+        return state
+
+    def _graphs(self, state, percentageThreshold, timeThreshold, secondaryTimeMatching):
+        if secondaryTimeMatching:
+            return {
+                subsetName: generateReferenceGraph(
+                    state.subsets[subsetName], timeThreshold=timeThreshold, percentageThreshold=percentageThreshold,
+                    timeColumn=timeColumn, scoreCache=state.scoreCache, secondaryTimeMatching=True,
+                )
+                for subsetName, timeColumn in SUBSETS
+            }
+        if state.scoreTable is None or state.scoreTable.maxTimeThreshold < timeThreshold:
+            state.scoreTable = SiteScoreTable(state.subsets, timeThreshold)
+        return state.scoreTable.graphs(percentageThreshold, timeThreshold)[0]
+
+    def qualityControl(self, site, percentageThreshold=DEFAULT_PERCENTAGE_THRESHOLD, timeThreshold=DEFAULT_TIME_THRESHOLD,
+                       secondaryTimeMatching=False):
+        """(consensus rows tagged with SITE_ID_COLUMN, AccuracyScore) of one site, as _processFolder builds them."""
+        state = self._site(site)
+        key = (float(percentageThreshold), float(timeThreshold), bool(secondaryTimeMatching))
+        if key not in state.results:
+            graphs = self._graphs(state, percentageThreshold, timeThreshold, secondaryTimeMatching)
+            accuracy = AccuracyScore()
+            qualityControlDataFrames = {}
+            for subsetName, _ in SUBSETS:
+                with accuracy.subset(subsetName):
+                    qualityControlDataFrames[subsetName] = generateQualityControlDataFramebyGraph(
+                        graphs[subsetName], state.subsets[subsetName], accuracy, timeThreshold
+                    )
+            dfQualityControl = combineQualityControlDataFrames(qualityControlDataFrames)
+            dfQualityControl[SITE_ID_COLUMN] = int(site)
+            state.results[key] = (dfQualityControl, accuracy)
+            while len(state.results) > self.resultsPerSite:
+                state.results.popitem(last=False)
+        state.results.move_to_end(key)
+        return state.results[key]
+
+    def accuracy(self, site, percentageThreshold=DEFAULT_PERCENTAGE_THRESHOLD, timeThreshold=DEFAULT_TIME_THRESHOLD,
+                 secondaryTimeMatching=False):
+        """Accuracy of the site's consensus against its human QC file, as evaluateAccuracy reports it.
+
+        Returns (humanFile, {field: (correct, compared)}); raises KeyError when
+        no human QC file matches the site name.
+        """
+        siteName = str(self.characteristics.loc[int(site), 'GTFSSTOP_NAME'])
+        humanFile = matchHumanQualityFile(siteName, discoverHumanQualityFiles(self.humanQualityPath))
+        if humanFile is None:
+            raise KeyError(f"No human QC file matches {siteName}")
+        dfQualityControl, _ = self.qualityControl(site, percentageThreshold, timeThreshold, secondaryTimeMatching)
+        dfHuman = loadQualityFrames([humanFile], n_jobs=1)[humanFile]
+        return humanFile, accuracyByField(dfHuman, roundTripExport(dfQualityControl, self.characteristics))
+
+    def drop(self, site):
+        """Forget the site's warm state, including its pair scores."""
+        self._sites.pop(site, None)
+
+    def getStats(self):
+        return {
+            'sites': {
+                str(site): {'results': len(state.results), 'scoreCache': state.scoreCache.getStats()}
+                for site, state in self._sites.items()
+            },
+            'maxSites': self.maxSites,
+        }
+
+
+def _requestParameters(query):
+    """(site, percentageThreshold, timeThreshold, secondaryTimeMatching) from a parsed query string."""
+    def value(name, default):
+        return query[name][-1] if name in query else default
+
+    if 'site' not in query:
+        raise ValueError("Missing site parameter")
+    return (
+        int(value('site', None)),
+        float(value('percentageThreshold', DEFAULT_PERCENTAGE_THRESHOLD)),
+        float(value('timeThreshold', DEFAULT_TIME_THRESHOLD)),
+        value('secondaryTimes', '0') in ('1', 'true', 'yes'),
+    )
+
+
+def makeHandler(pipeline):
+    """BaseHTTPRequestHandler class serving pipeline's endpoints."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _send(self, status, payload):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            start = time.perf_counter()
+            try:
+                if url.path == '/sites':
+                    self._send(200, {str(site): name for site, name in pipeline.sites().items()})
+                elif url.path == '/stats':
+                    self._send(200, pipeline.getStats())
+                elif url.path in ('/qc', '/recompute'):
+                    site, percentageThreshold, timeThreshold, secondary = _requestParameters(query)
+                    if url.path == '/recompute':
+                        pipeline.drop(site)
+                    dfQualityControl, accuracy = pipeline.qualityControl(site, percentageThreshold, timeThreshold, secondary)
+                    header = json.dumps({
+                        'site': site,
+                        'rows': len(dfQualityControl),
+                        'agreement': accuracy.getAccuracy(),
+                        'seconds': time.perf_counter() - start,
+                    })
+                    if url.path == '/qc':
+                        # Rows are serialized by pandas and spliced in rather than re-parsed.
+                        body = header[:-1] + ', "records": ' + dfQualityControl.to_json(orient='records') + '}'
+                        self._send(200, body.encode('utf-8'))
+                    else:
+                        self._send(200, header.encode('utf-8'))
+                elif url.path == '/accuracy':
+                    site, percentageThreshold, timeThreshold, secondary = _requestParameters(query)
+                    humanFile, counts = pipeline.accuracy(site, percentageThreshold, timeThreshold, secondary)
+                    correct = sum(c for c, _ in counts.values())
+                    compared = sum(n for _, n in counts.values())
+                    self._send(200, {
+                        'site': site,
+                        'humanFile': os.path.basename(humanFile),
+                        'correct': correct,
+                        'compared': compared,
+                        'accuracy': correct / compared if compared > 0 else 0.0,
+                        'fields': {
+                            field: {'correct': c, 'compared': n, 'accuracy': c / n if n > 0 else 0.0}
+                            for field, (c, n) in counts.items()
+                        },
+                        'seconds': time.perf_counter() - start,
+                    })
+                else:
+                    self._send(404, {'error': f"Unknown endpoint {url.path}"})
+            except KeyError as error:
+                self._send(404, {'error': str(error.args[0]) if error.args else 'Not found'})
+            except ValueError as error:
+                self._send(400, {'error': str(error)})
+
+    return Handler
+
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, pipeline=None):
+    """Serve WarmPipeline requests on host:port until interrupted (one request at a time)."""
+    pipeline = pipeline if pipeline is not None else WarmPipeline()
+    server = HTTPServer((host, port), makeHandler(pipeline))
+    print(f"Serving on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
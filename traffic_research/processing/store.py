@@ -0,0 +1,131 @@
+"""Time-range and categorical queries over consensus rows.
+
+ConsensusStore keeps the consensus rows of all sites ordered by site and
+ObservationTime, so one site's rows are a contiguous block and a time range
+inside it is found by binary search. Categorical fields get a bitmap per value
+(a boolean array over the ordered rows); a query ANDs the bitmaps of its
+conditions over the rows of the time range only, without scanning the store.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from traffic_research.core.utils import timeStringsToSeconds
+from traffic_research.processing.data_processing import ALL_ROWS_FILE, SITE_ID_COLUMN
+from config import CONSENSUS_INDEX_FIELDS
+
+TIME_COLUMN = 'ObservationTime'
+
+
+def readConsensusCsv(path):
+    """Rows of an exported (transposed) consensus CSV as text, without re-parsing them."""
+    rows = pd.read_csv(path, header=None, index_col=0, dtype=str, keep_default_na=False).transpose()
+    rows.columns.name = None
+    return rows.reset_index(drop=True)
+
+
+def _seconds(value):
+    """Query bound as seconds since midnight; accepts HH:MM:SS strings or numbers."""
+    if isinstance(value, str):
+        seconds = timeStringsToSeconds([value])[0]
+        if np.isnan(seconds):
+            raise ValueError(f"Invalid time {value!r}; expected HH:MM:SS")
+        return seconds
+    return float(value)
+
+
+class ConsensusStore:
+    """Indexed consensus rows answering queries by site, ObservationTime range and field values.
+
+    rows is the frame returned by computeDataFolderToCSV (or any consensus rows
+    with siteColumn and ObservationTime). Bitmaps are built up front for
+    indexFields and on first use for any other field named in a query.
+    """
+
+    def __init__(self, rows, indexFields=CONSENSUS_INDEX_FIELDS, siteColumn=SITE_ID_COLUMN):
+        self.siteColumn = siteColumn
+        siteCodes, sites = pd.factorize(rows[siteColumn], sort=True)
+        times = timeStringsToSeconds(rows[TIME_COLUMN])
+        # Rows without an ObservationTime sort last in their site and never fall inside a time range.
+        order = np.lexsort((np.where(np.isnan(times), np.inf, times), siteCodes))
+        self.rows = rows.iloc[order]
+        self.times = np.where(np.isnan(times[order]), np.inf, times[order])
+        bounds = np.searchsorted(siteCodes[order], np.arange(len(sites) + 1))
+        self.siteBlocks = {site: (bounds[code], bounds[code + 1]) for code, site in enumerate(sites)}
+        self.bitmaps = {}
+        for field in indexFields:
+            self._bitmaps(field)
+
+    @classmethod
+    def fromCsv(cls, path, indexFields=CONSENSUS_INDEX_FIELDS, siteColumn='Location Name'):
+        """Store over an exported consensus CSV (e.g. allComputedRows.csv), read as text without re-parsing rows.
+
+        Exported files have the site characteristics joined in place of the
+        site id, so sites are keyed by Location Name by default.
+        """
+        return cls(readConsensusCsv(path), indexFields=indexFields, siteColumn=siteColumn)
+
+    @classmethod
+    def fromOutputFolder(cls, outputFolderPath, indexFields=CONSENSUS_INDEX_FIELDS):
+        """Store over outputFolderPath/allComputedRows.csv as written by computeDataFolderToCSV."""
+        return cls.fromCsv(os.path.join(outputFolderPath, ALL_ROWS_FILE), indexFields=indexFields)
+
+    def _bitmaps(self, field):
+        """{value: boolean array over the ordered rows} for field, built once."""
+        if field not in self.bitmaps:
+            codes, values = pd.factorize(self.rows[field].astype(str))
+            self.bitmaps[field] = {value: codes == code for code, value in enumerate(values)}
+        return self.bitmaps[field]
+
+    def sites(self):
+        return list(self.siteBlocks)
+
+    def _positions(self, site, start, end):
+        """Ordered-row ranges (lo, hi) of the requested sites clipped to [start, end] by binary search."""
+        sites = self.sites() if site is None else (site if isinstance(site, (list, tuple, set)) else [site])
+        ranges = []
+        for name in sites:
+            if name not in self.siteBlocks:
+                continue
+            lo, hi = self.siteBlocks[name]
+            if start is not None or end is not None:
+                # Rows without an ObservationTime are stored as inf at the end of the block.
+                hi = lo + np.searchsorted(self.times[lo:hi], np.inf, side='left')
+            if start is not None:
+                lo += np.searchsorted(self.times[lo:hi], _seconds(start), side='left')
+            if end is not None:
+                hi = lo + np.searchsorted(self.times[lo:hi], _seconds(end), side='right')
+            ranges.append((lo, hi))
+        return ranges
+
+    def queryPositions(self, site=None, start=None, end=None, where=None):
+        """Positions in self.rows matching the query; see query."""
+        conditions = []
+        for field, value in (where or {}).items():
+            bitmaps = self._bitmaps(field)
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            conditions.append([bitmaps[str(v)] for v in values if str(v) in bitmaps])
+        positions = []
+        for lo, hi in self._positions(site, start, end):
+            mask = np.ones(hi - lo, dtype=bool)
+            for bitmaps in conditions:
+                matched = np.zeros(hi - lo, dtype=bool)
+                for bitmap in bitmaps:
+                    matched |= bitmap[lo:hi]
+                mask &= matched
+            positions.append(lo + np.flatnonzero(mask))
+        return np.concatenate(positions) if positions else np.zeros(0, dtype=np.intp)
+
+    def query(self, site=None, start=None, end=None, where=None):
+        """Consensus rows of site (one id or a list; None for all) observed between start and end, inclusive.
+
+        start and end are HH:MM:SS strings or seconds since midnight; rows
+        without an ObservationTime only match queries without a time range.
+        where maps field names to a value or a list of accepted values, compared
+        as strings, e.g. {'Roadway Crossing': 'yes', 'User Type': ['pedestrian', 'wheelchair']}.
+        Rows come back ordered by site and ObservationTime.
+        """
+        return self.rows.iloc[self.queryPositions(site, start, end, where)]
+
+    def count(self, site=None, start=None, end=None, where=None):
+        return len(self.queryPositions(site, start, end, where))
@@ -0,0 +1,351 @@
+"""Streaming (time-sharded) matching and consensus for long recordings.
+
+generateReferenceGraph needs every reviewer subset fully loaded, but a row is
+only ever compared with rows at most timeThreshold seconds away. The streaming
+matcher consumes each reviewer's rows from a generator (time-sorted as
+loadSiteSubsets sorts them: ascending, missing times last) and keeps only the
+rows that can still take part in a match or a pending consensus row.
+
+The three MATCH_PASSES run side by side. Pass 1->2 may only use reviewer-2
+rows not claimed by pass 0->2, so a reviewer-1 row at time t waits until pass
+0->2 has decided every reviewer-0 row up to t + 2*timeThreshold. Because every
+target is claimed at most once, a consensus row only depends on the edges of
+its own node (plus, for the transitive case, the 1->2 edge of its reviewer-1
+match), so consensus rows are emitted as soon as those edges are known.
+Memory is bounded by the number of rows within a few timeThresholds of the
+streams' current times, not by the recording length.
+
+Each window is scored by the same selectBestMatch as generateReferenceGraph,
+so, given the same reviewer order, edges and consensus rows equal those of
+generateReferenceGraph and generateQualityControlDataFramebyGraph with
+secondaryTimeMatching off. Secondary time matching searches a row's window on
+another time field across the whole target frame, which a time-ordered stream
+cannot bound, so streamSiteQualityControl rejects it. Deduplication runs on
+the loaded subsets before they are streamed, as in _processFolder.
+"""
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from traffic_research.core.matching import MATCH_PASSES, selectBestMatch
+from traffic_research.core.models import RowRecord
+from traffic_research.core.scoring import TIME_FIELDS
+from traffic_research.processing.data_processing import SUBSETS, combineQualityControlDataFrames
+from traffic_research.processing.quality_control import constructRowDict
+from config import SECONDARY_TIME_MATCHING, DEDUP_MODE
+
+
+def iterSubsetRows(df):
+    """Yield the rows of a (time-sorted) subset DataFrame one at a time, as RowRecords."""
+    return RowRecord.iterFrame(df)
+
+
+def _timeOf(value):
+    """Sort time of a row: missing times sort last."""
+    return math.inf if pd.isna(value) else float(value)
+
+
+class _ReviewerStream:
+    """Rows of one reviewer read so far and not yet evicted, keyed by position."""
+
+    def __init__(self, path, rows, timeColumn):
+        self.path = path
+        self._rows = iter(rows)
+        self.timeColumn = timeColumn
+        self.records = OrderedDict()
+        self.count = 0
+        self.exhausted = False
+        self.lastTime = -math.inf
+
+    def readNext(self):
+        try:
+            row = next(self._rows)
+        except StopIteration:
+            self.exhausted = True
+            return False
+        time = _timeOf(row.get(self.timeColumn, np.nan))
+        timeValues = [np.nan if pd.isna(row[field]) else float(row[field]) for field in TIME_FIELDS]
+        self.records[self.count] = {'row': row, 'time': time, 'timeValues': timeValues, 'holds': 0, 'done': False}
+        self.count += 1
+        self.lastTime = time
+        return True
+
+    def readPast(self, time):
+        """True once every row with a time <= time has been read."""
+        return self.exhausted or self.lastTime > time
+
+
+class _Pass:
+    """One MATCH_PASSES pass: the next source position and the targets it claimed."""
+
+    def __init__(self, index, source, target):
+        self.index = index
+        self.source = source
+        self.target = target
+        self.next = 0
+        self.decisions = {}
+        self.claimed = set()
+
+    def done(self):
+        return self.source.exhausted and self.next >= self.source.count
+
+    def nextTime(self):
+        """Time of the next undecided source row (inf when done, None when not read yet)."""
+        if self.done():
+            return math.inf
+        if self.next >= self.source.count:
+            return None
+        return self.source.records[self.next]['time']
+
+    def decidedThrough(self, time):
+        """True once every source row with a time <= time has been decided."""
+        nextTime = self.nextTime()
+        return nextTime is not None and nextTime > time
+
+
+class StreamingMatcher:
+    """Match three reviewer row streams of one subset and emit edges and consensus rows.
+
+    streams is a list of three (path, rowIterable) pairs in reviewer order;
+    run() yields events as soon as they are final:
+
+    - ('edge', passIndex, (fromPath, fromPos), edge) with edge laid out as in
+      generateReferenceGraph ({"key": {"dfName", "index"}, "score"}),
+    - ('row', (reviewer, pos), rowDict), a consensus row from constructRowDict
+      for the node at position pos of reviewer 0 or 1.
+    """
+
+    def __init__(self, streams, timeThreshold, percentageThreshold, timeColumn, accuracy):
+        self.streams = [_ReviewerStream(path, rows, timeColumn) for path, rows in streams]
+        self.timeThreshold = timeThreshold
+        self.percentageThreshold = percentageThreshold
+        self.timeColumn = timeColumn
+        self.accuracy = accuracy
+        self.passes = [_Pass(k, self.streams[a], self.streams[b]) for k, (a, b) in enumerate(MATCH_PASSES)]
+        self._pass01, self._pass02, self._pass12 = self.passes
+        # Reviewer-0 and reviewer-1 positions whose consensus row is not resolved yet.
+        self._pendingNodes = [0, 0]
+        self.peakBufferedRows = 0
+
+    # ---------------- matching ----------------
+    def _window(self, matchPass, targetTime, claimedSets):
+        """Unclaimed target positions whose time lies within timeThreshold of targetTime."""
+        lower = targetTime - self.timeThreshold
+        upper = targetTime + self.timeThreshold
+        return [
+            pos for pos, record in matchPass.target.records.items()
+            if lower <= record['time'] <= upper and not any(pos in claimed for claimed in claimedSets)
+        ]
+
+    def _decide(self, matchPass, claimedSets):
+        """Best match of the pass's next source row, as generateReferenceGraph picks it."""
+        source = matchPass.source.records[matchPass.next]
+        fromRow = source['row']
+        targetTime = fromRow.get(self.timeColumn, -1)
+        maxScore, maxIndex = 0.0, -1
+        if not (pd.isna(targetTime) or targetTime < 0):
+            targets = matchPass.target.records
+            maxScore, maxIndex, _, _, _ = selectBestMatch(
+                self._window(matchPass, targetTime, claimedSets), targetTime, fromRow, source['timeValues'],
+                lambda i: targets[i]['time'], lambda i: targets[i]['timeValues'], lambda i: targets[i]['row'],
+                self.timeThreshold, self.percentageThreshold,
+            )
+        if maxScore >= self.percentageThreshold and maxIndex >= 0:
+            matchPass.claimed.add(maxIndex)
+            matchPass.target.records[maxIndex]['holds'] += 1
+        matchPass.decisions[matchPass.next] = (maxIndex, maxScore)
+        edge = {"key": {"dfName": matchPass.target.path, "index": maxIndex}, "score": maxScore}
+        event = ('edge', matchPass.index, (matchPass.source.path, matchPass.next), edge)
+        matchPass.next += 1
+        return event
+
+    def _ready(self, matchPass):
+        """True when the pass's next source row can be decided without further input."""
+        if matchPass.next >= matchPass.source.count:
+            return False
+        time = matchPass.source.records[matchPass.next]['time']
+        sourceTime = matchPass.source.records[matchPass.next]['row'].get(self.timeColumn, -1)
+        if pd.isna(sourceTime) or sourceTime < 0:
+            return True
+        if not matchPass.target.readPast(time + self.timeThreshold):
+            return False
+        if matchPass is self._pass12:
+            # Pass 0->2 claims reviewer-2 rows first; wait for every claim that
+            # can reach this row's window.
+            return self._pass02.decidedThrough(time + 2 * self.timeThreshold)
+        return True
+
+    def _advancePasses(self):
+        events = []
+        progressed = True
+        while progressed:
+            progressed = False
+            for matchPass, claimedSets in (
+                (self._pass01, (self._pass01.claimed,)),
+                (self._pass02, (self._pass02.claimed,)),
+                (self._pass12, (self._pass02.claimed, self._pass12.claimed)),
+            ):
+                while self._ready(matchPass):
+                    events.append(self._decide(matchPass, claimedSets))
+                    progressed = True
+        return events
+
+    # ---------------- consensus ----------------
+    def _resolveReviewer0(self, pos):
+        """Consensus row of reviewer-0 node pos, or None; False when not decidable yet."""
+        if pos not in self._pass01.decisions or pos not in self._pass02.decisions:
+            return False
+        match1, _ = self._pass01.decisions[pos]
+        match2, _ = self._pass02.decisions[pos]
+        if match2 < 0 and match1 >= 0:
+            if match1 not in self._pass12.decisions:
+                return False
+            match2, _ = self._pass12.decisions[match1]
+        if match1 < 0 and match2 < 0:
+            return None
+        row0 = self.streams[0].records[pos]['row']
+        row1 = self.streams[1].records[match1]['row'] if match1 >= 0 else None
+        row2 = self.streams[2].records[match2]['row'] if match2 >= 0 else None
+        return constructRowDict(row0, row1, row2, pos, self.accuracy, self.timeThreshold)
+
+    def _resolveReviewer1(self, pos):
+        """Consensus row of reviewer-1 node pos (when pass 0->1 left it unclaimed)."""
+        if pos not in self._pass12.decisions:
+            return False
+        time = self.streams[1].records[pos]['time']
+        if time != math.inf and not self._pass01.decidedThrough(time + self.timeThreshold):
+            return False
+        match2, _ = self._pass12.decisions[pos]
+        if pos in self._pass01.claimed or match2 < 0:
+            return None
+        row0 = self.streams[1].records[pos]['row']
+        row1 = self.streams[2].records[match2]['row']
+        return constructRowDict(row0, row1, None, pos, self.accuracy, self.timeThreshold)
+
+    def _emitRows(self):
+        events = []
+        for reviewer, resolve in ((0, self._resolveReviewer0), (1, self._resolveReviewer1)):
+            stream = self.streams[reviewer]
+            while self._pendingNodes[reviewer] < stream.count:
+                pos = self._pendingNodes[reviewer]
+                result = resolve(pos)
+                if result is False:
+                    break
+                if result is not None:
+                    events.append(('row', (reviewer, pos), result))
+                self._finishNode(reviewer, pos)
+                self._pendingNodes[reviewer] += 1
+        return events
+
+    def _finishNode(self, reviewer, pos):
+        self.streams[reviewer].records[pos]['done'] = True
+        if reviewer == 0:
+            for matchPass in (self._pass01, self._pass02):
+                match, _ = matchPass.decisions[pos]
+                if match >= 0:
+                    matchPass.target.records[match]['holds'] -= 1
+
+    # ---------------- eviction ----------------
+    def _outOfWindow(self, record, passes):
+        return all(matchPass.decidedThrough(record['time'] + self.timeThreshold) for matchPass in passes)
+
+    def _evict(self):
+        stream0, stream1, stream2 = self.streams
+        while stream0.records:
+            pos, record = next(iter(stream0.records.items()))
+            if not record['done']:
+                break
+            del stream0.records[pos]
+            self._pass01.decisions.pop(pos, None)
+            self._pass02.decisions.pop(pos, None)
+        while stream1.records:
+            pos, record = next(iter(stream1.records.items()))
+            if not (record['done'] and record['holds'] == 0 and self._outOfWindow(record, [self._pass01])):
+                break
+            del stream1.records[pos]
+            self._pass01.claimed.discard(pos)
+            match, _ = self._pass12.decisions.pop(pos)
+            if match >= 0:
+                stream2.records[match]['holds'] -= 1
+        while stream2.records:
+            pos, record = next(iter(stream2.records.items()))
+            if not (record['holds'] == 0 and self._outOfWindow(record, [self._pass02, self._pass12])):
+                break
+            del stream2.records[pos]
+            self._pass02.claimed.discard(pos)
+            self._pass12.claimed.discard(pos)
+
+    def _readMore(self):
+        """Read one row from the stream that is furthest behind; False when all are exhausted."""
+        open_ = [stream for stream in self.streams if not stream.exhausted]
+        if not open_:
+            return False
+        min(open_, key=lambda stream: stream.lastTime).readNext()
+        return True
+
+    def run(self):
+        while True:
+            events = self._advancePasses()
+            events += self._emitRows()
+            self._evict()
+            self.peakBufferedRows = max(self.peakBufferedRows, sum(len(s.records) for s in self.streams))
+            yield from events
+            if not self._readMore() and not events:
+                if all(matchPass.done() for matchPass in self.passes):
+                    return
+
+
+def streamSubset(dflist, timeThreshold, percentageThreshold, timeColumn, accuracy):
+    """Stream one subset given as loadSiteSubsets lists it ([{'path', 'df'}, ...]); yields StreamingMatcher events."""
+    streams = [(dfTuple['path'], iterSubsetRows(dfTuple['df'])) for dfTuple in dflist[:3]]
+    return StreamingMatcher(streams, timeThreshold, percentageThreshold, timeColumn, accuracy).run()
+
+
+def collectStreamEvents(events):
+    """Assemble streamed events into (graph, consensus DataFrame) in batch order.
+
+    The graph has generateReferenceGraph's key order and edge order and the
+    DataFrame has generateQualityControlDataFramebyGraph's row order.
+    """
+    edgesByPass = {}
+    rows = []
+    for event in events:
+        if event[0] == 'edge':
+            _, passIndex, key, edge = event
+            edgesByPass.setdefault(passIndex, []).append((key, edge))
+        else:
+            _, node, rowDict = event
+            rows.append((node, rowDict))
+    graph = {}
+    for passIndex in sorted(edgesByPass):
+        for key, edge in sorted(edgesByPass[passIndex], key=lambda item: item[0][1]):
+            graph.setdefault(key, []).append(edge)
+    rows.sort(key=lambda item: item[0])
+    return graph, pd.DataFrame([rowDict for _, rowDict in rows])
+
+
+def streamSiteQualityControl(subsets, accuracy, percentageThreshold, timeThreshold,
+                             secondaryTimeMatching=SECONDARY_TIME_MATCHING, dedup=DEDUP_MODE):
+    """Streaming counterpart of the per-site matching and QC in _processFolder.
+
+    subsets is loadSiteSubsets output; returns ({subsetName: graph}, site QC
+    DataFrame) equal to the batch result. dedup='collapse' collapses
+    near-duplicates first ('flag' only reports them and leaves the result
+    unchanged); secondaryTimeMatching is not supported and raises ValueError.
+    """
+    if secondaryTimeMatching:
+        raise ValueError("Streaming matching does not support secondaryTimeMatching; use generateReferenceGraph")
+    if dedup == 'collapse':
+        from traffic_research.processing.dedup import dedupSubsets
+
+        subsets, _ = dedupSubsets(subsets, timeThreshold, collapse=True)
+    graphs = {}
+    qualityControlDataFrames = {}
+    for subsetName, timeColumn in SUBSETS:
+        with accuracy.subset(subsetName):
+            graphs[subsetName], qualityControlDataFrames[subsetName] = collectStreamEvents(
+                streamSubset(subsets[subsetName], timeThreshold, percentageThreshold, timeColumn, accuracy)
+            )
+    return graphs, combineQualityControlDataFrames(qualityControlDataFrames)
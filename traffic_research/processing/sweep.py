@@ -0,0 +1,211 @@
+"""Threshold sweeps that reuse pairwise scores across grid points."""
+
+import math
+import os
+import numpy as np
+import pandas as pd
+from traffic_research.core.data_engineering import generateDateFrame
+from traffic_research.core.matching import MATCH_PASSES
+from traffic_research.core.models import AccuracyScore
+from traffic_research.core.scoring import TIME_FIELDS, computeConditionScore
+from traffic_research.processing.data_processing import (
+    SUBSETS,
+    SITE_ID_COLUMN,
+    loadSiteSubsets,
+    loadCharacteristics,
+    combineQualityControlDataFrames,
+    roundTripExport,
+)
+from traffic_research.processing.quality_control import accuracyTest, generateQualityControlDataFramebyGraph
+from config import TIME_SCORE_WEIGHT, CONDITION_SCORE_WEIGHT
+
+
+class SiteScoreTable:
+    """Candidate pairs of one site, scored once at the widest time window.
+
+    For every subset and every pass of generateReferenceGraph the table keeps,
+    per candidate pair, the window-column times, the per-field time differences
+    and the condition score. The time score is the only part of
+    computeFeatureScores that depends on timeThreshold, so any grid point with
+    timeThreshold <= maxTimeThreshold is rematched from the table without
+    touching the rows again. Rematching reproduces generateReferenceGraph exactly.
+    """
+
+    def __init__(self, subsets, maxTimeThreshold):
+        self.subsets = subsets
+        self.maxTimeThreshold = maxTimeThreshold
+        self.passes = {
+            subsetName: [
+                self._scorePass(subsets[subsetName][fromIdx], subsets[subsetName][toIdx], timeColumn)
+                for fromIdx, toIdx in MATCH_PASSES
+            ]
+            for subsetName, timeColumn in SUBSETS
+        }
+        self._featureScores = {}
+
+    def _scorePass(self, fromDFTuple, toDFTuple, timeColumn):
+        fromDF = fromDFTuple["df"]
+        toDF = toDFTuple["df"]
+        fromTimes = fromDF[timeColumn].to_numpy(dtype='float64', na_value=np.nan)
+        toTimes = toDF[timeColumn].to_numpy(dtype='float64', na_value=np.nan)
+
+        # Same window as generateReferenceGraph: toDF is sorted with NaNs last.
+        validFrom = ~np.isnan(fromTimes) & (fromTimes >= 0)
+        lower = np.searchsorted(toTimes, fromTimes - self.maxTimeThreshold, side='left')
+        upper = np.searchsorted(toTimes, fromTimes + self.maxTimeThreshold, side='right')
+        counts = np.where(validFrom, np.maximum(upper - lower, 0), 0)
+        fromPos = np.repeat(np.arange(len(fromDF)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        toPos = np.repeat(lower, counts) + offsets
+
+        fromValues = fromDF[TIME_FIELDS].to_numpy(dtype='float64', na_value=np.nan)[fromPos]
+        toValues = toDF[TIME_FIELDS].to_numpy(dtype='float64', na_value=np.nan)[toPos]
+
+        fromRows = {}
+        toRows = {}
+        conditionScores = np.empty(len(fromPos))
+        for k, (i, j) in enumerate(zip(fromPos.tolist(), toPos.tolist())):
+            if i not in fromRows:
+                fromRows[i] = fromDF.iloc[i]
+            if j not in toRows:
+                toRows[j] = toDF.iloc[j]
+            conditionScores[k] = computeConditionScore(fromRows[i], toRows[j])
+
+        return {
+            "fromName": fromDFTuple["path"],
+            "toName": toDFTuple["path"],
+            "fromCount": len(fromDF),
+            "fromPos": fromPos,
+            "toPos": toPos,
+            "fromTime": fromTimes[fromPos],
+            "toTime": toTimes[toPos],
+            "timeDiffs": np.abs(fromValues - toValues),
+            # computeTimeScore skips a field when either value is -1.
+            "timeValid": (fromValues != -1) & (toValues != -1),
+            "conditionScores": conditionScores,
+        }
+
+    def _scores(self, subsetName, passIndex, timeThreshold):
+        """computeFeatureScores for every pair of a pass at timeThreshold."""
+        cacheKey = (subsetName, passIndex, timeThreshold)
+        if cacheKey in self._featureScores:
+            return self._featureScores[cacheKey]
+        table = self.passes[subsetName][passIndex]
+        diffs = table["timeDiffs"]
+        total = np.zeros(len(diffs))
+        count = np.zeros(len(diffs))
+        for field in range(diffs.shape[1]):
+            fieldDiffs = diffs[:, field]
+            fieldScores = np.zeros(len(diffs))
+            if timeThreshold > 0:
+                near = fieldDiffs < timeThreshold
+                far = ~near & ~np.isnan(fieldDiffs)
+                fieldScores[near] = 1.0
+                # math.exp keeps the scores bit-identical to calculateTimeScore.
+                fieldScores[far] = [math.exp(-d / (timeThreshold + 10)) for d in fieldDiffs[far].tolist()]
+            valid = table["timeValid"][:, field]
+            total += np.where(valid, fieldScores, 0.0)
+            count += valid
+        timeScores = np.divide(total, count, out=np.zeros(len(diffs)), where=count > 0)
+        scores = timeScores * TIME_SCORE_WEIGHT + table["conditionScores"] * CONDITION_SCORE_WEIGHT
+        self._featureScores[cacheKey] = scores
+        return scores
+
+    def graphs(self, percentageThreshold, timeThreshold):
+        """Rematch every subset at the given thresholds.
+
+        Returns ({subsetName: graph}, signature); graphs have the same layout as
+        generateReferenceGraph and signature identifies the chosen matches.
+        """
+        if timeThreshold > self.maxTimeThreshold:
+            raise ValueError(
+                f"timeThreshold {timeThreshold} exceeds the table window {self.maxTimeThreshold}"
+            )
+        graphs = {}
+        signature = []
+        for subsetName, _ in SUBSETS:
+            graph = {}
+            used_targets = set()
+            for passIndex, table in enumerate(self.passes[subsetName]):
+                scores = self._scores(subsetName, passIndex, timeThreshold)
+                inWindow = (
+                    (table["toTime"] >= table["fromTime"] - timeThreshold)
+                    & (table["toTime"] <= table["fromTime"] + timeThreshold)
+                )
+                candidates = np.flatnonzero(inWindow & (scores >= percentageThreshold))
+                candidateFrom = table["fromPos"][candidates]
+                bounds = np.searchsorted(candidateFrom, np.arange(table["fromCount"] + 1), side='left')
+                toName = table["toName"]
+                chosen = []
+                for pos in range(table["fromCount"]):
+                    maxScore, maxIndex = 0.0, -1
+                    for k in candidates[bounds[pos]:bounds[pos + 1]].tolist():
+                        i = int(table["toPos"][k])
+                        if (toName, i) in used_targets:
+                            continue
+                        score = float(scores[k])
+                        if score > maxScore:
+                            maxScore, maxIndex = score, i
+                            if maxScore >= 1.0:
+                                break
+                    if maxScore >= percentageThreshold and maxIndex >= 0:
+                        used_targets.add((toName, maxIndex))
+                    key = (table["fromName"], pos)
+                    if key not in graph:
+                        graph[key] = []
+                    graph[key].append({"key": {"dfName": toName, "index": maxIndex}, "score": maxScore})
+                    chosen.append(maxIndex)
+                signature.append(tuple(chosen))
+            graphs[subsetName] = graph
+        return graphs, tuple(signature)
+
+
+def sweepThresholds(resourceFolderPath, characteristicsPath, humanQualityFiles, percentageThresholds, timeThresholds):
+    """Evaluate a (percentageThreshold, timeThreshold) grid against human QC files.
+
+    humanQualityFiles maps a site folder name (its fid) to the human QC CSV for
+    that site. Each site is parsed and scored once at max(timeThresholds); every
+    grid point is then rematched from its SiteScoreTable, and consensus and
+    accuracy are only rebuilt for match sets not seen before.
+
+    Returns a DataFrame with one row per (Location, percentageThreshold,
+    timeThreshold): 'Accuracy' against the human QC file, as
+    performAccuracyTest reports it, and 'Agreement', the inter-reviewer
+    accuracy written to interated_summary.csv.
+    """
+    characteristics = loadCharacteristics(characteristicsPath)
+    maxTimeThreshold = max(timeThresholds)
+    rows = []
+    for folderName, humanQualityFile in humanQualityFiles.items():
+        folderName = str(folderName)
+        siteId = int(folderName)
+        scoreTable = SiteScoreTable(loadSiteSubsets(os.path.join(resourceFolderPath, folderName)), maxTimeThreshold)
+        dfHuman = generateDateFrame(humanQualityFile).dropna(how='all')
+        evaluated = {}
+        for timeThreshold in timeThresholds:
+            for percentageThreshold in percentageThresholds:
+                graphs, signature = scoreTable.graphs(percentageThreshold, timeThreshold)
+                if (signature, timeThreshold) not in evaluated:
+                    accuracy = AccuracyScore()
+                    qualityControlDataFrames = {
+                        subsetName: generateQualityControlDataFramebyGraph(
+                            graphs[subsetName], scoreTable.subsets[subsetName], accuracy, timeThreshold
+                        )
+                        for subsetName, _ in SUBSETS
+                    }
+                    dfQualityControl = combineQualityControlDataFrames(qualityControlDataFrames)
+                    dfQualityControl[SITE_ID_COLUMN] = siteId
+                    dfCompute = roundTripExport(dfQualityControl, characteristics)
+                    evaluated[(signature, timeThreshold)] = (
+                        accuracyTest(dfHuman, dfCompute),
+                        accuracy.getAccuracy(),
+                    )
+                humanAccuracy, agreement = evaluated[(signature, timeThreshold)]
+                rows.append({
+                    'Location': folderName,
+                    'percentageThreshold': percentageThreshold,
+                    'timeThreshold': timeThreshold,
+                    'Accuracy': humanAccuracy,
+                    'Agreement': agreement,
+                })
+    return pd.DataFrame(rows, columns=['Location', 'percentageThreshold', 'timeThreshold', 'Accuracy', 'Agreement'])
@@ -0,0 +1,154 @@
+"""Watch mode: reprocess sites as reviewer CSVs land in the input tree.
+
+DataFolderWatcher polls resourceFolderPath and fingerprints every site folder
+by the names, mtimes and sizes of its CSVs. A site is reprocessed when its
+fingerprint differs from the one last processed, it has at least minReviewers
+CSVs, and nothing in it has changed for debounceSeconds (so files still being
+copied are not read half-written). Each site is built by _processFolder into
+a staging folder and its files are then moved over the previous outputs with
+os.replace. The combined summaries are rewritten the same way from the
+per-site results kept in memory, so only changed sites are recomputed.
+"""
+
+import os
+import shutil
+import time
+from traffic_research.core.models import AccuracyScore
+from traffic_research.processing.data_processing import _processFolder, loadCharacteristics, writeRunSummaries
+from config import (
+    SECONDARY_TIME_MATCHING,
+    DEDUP_MODE,
+    BUS_CROSSING_LINKING,
+    WATCH_POLL_SECONDS,
+    WATCH_DEBOUNCE_SECONDS,
+    WATCH_MIN_REVIEWERS,
+)
+
+STAGING_FOLDER = '.watch-staging'
+
+
+def snapshotInputTree(resourceFolderPath):
+    """{site folder: ((file name, mtime_ns, size), ...)} of the reviewer CSVs of every site folder."""
+    snapshot = {}
+    for folderName in os.listdir(resourceFolderPath):
+        filePath = os.path.join(resourceFolderPath, folderName)
+        if os.path.isdir(filePath):
+            snapshot[folderName] = tuple(sorted(
+                (fileName, stat.st_mtime_ns, stat.st_size)
+                for fileName, stat in (
+                    (fileName, os.stat(os.path.join(filePath, fileName)))
+                    for fileName in os.listdir(filePath)
+                    if fileName.endswith('.csv')
+                )
+            ))
+    return snapshot
+
+
+class DataFolderWatcher:
+    """Keeps computeDataFolderToCSV outputs current while reviewer files are added or edited.
+
+    poll() scans once and reprocesses the sites that are ready; run() polls
+    until interrupted. Pipeline options are those of computeDataFolderToCSV.
+    """
+
+    def __init__(self, resourceFolderPath, outputFolderPath, characteristicsPath, percentageThreshold, timeThreshold,
+                 debounceSeconds=WATCH_DEBOUNCE_SECONDS, minReviewers=WATCH_MIN_REVIEWERS,
+                 secondaryTimeMatching=SECONDARY_TIME_MATCHING, dedup=DEDUP_MODE, busCrossingLinking=BUS_CROSSING_LINKING):
+        self.resourceFolderPath = resourceFolderPath
+        self.outputFolderPath = outputFolderPath
+        self.characteristics = loadCharacteristics(characteristicsPath)
+        self.percentageThreshold = percentageThreshold
+        self.timeThreshold = timeThreshold
+        self.debounceSeconds = debounceSeconds
+        self.minReviewers = minReviewers
+        self.secondaryTimeMatching = secondaryTimeMatching
+        self.dedup = dedup
+        self.busCrossingLinking = busCrossingLinking
+        self.processed = {}
+        self.pending = {}
+        self.siteFrames = {}
+        self.siteAccuracy = {}
+
+    def _isReady(self, folderName, fingerprint, now):
+        """Track the site's fingerprint and report whether it has settled and has enough reviewers."""
+        if self.pending.get(folderName, (None,))[0] != fingerprint:
+            # First sight of a site counts from its newest file; a later change from when it was seen.
+            seenAt = now if folderName in self.pending or folderName in self.processed else \
+                max((mtime / 1e9 for _, mtime, _ in fingerprint), default=now)
+            self.pending[folderName] = (fingerprint, seenAt)
+        _, seenAt = self.pending[folderName]
+        return now - seenAt >= self.debounceSeconds and len(fingerprint) >= self.minReviewers
+
+    def _processSite(self, folderName):
+        """Build one site in the staging folder and move its files over the current outputs."""
+        stagingPath = os.path.join(self.outputFolderPath, STAGING_FOLDER)
+        shutil.rmtree(stagingPath, ignore_errors=True)
+        os.makedirs(os.path.join(stagingPath, 'graph'))
+        try:
+            accuracy = AccuracyScore()
+            siteFrame = _processFolder(
+                os.path.join(self.resourceFolderPath, folderName), stagingPath, self.characteristics, accuracy,
+                self.percentageThreshold, self.timeThreshold,
+                secondaryTimeMatching=self.secondaryTimeMatching, dedup=self.dedup,
+                busCrossingLinking=self.busCrossingLinking,
+            )
+            for folder, _, fileNames in os.walk(stagingPath):
+                target = os.path.join(self.outputFolderPath, os.path.relpath(folder, stagingPath))
+                os.makedirs(target, exist_ok=True)
+                for fileName in fileNames:
+                    os.replace(os.path.join(folder, fileName), os.path.join(target, fileName))
+        finally:
+            shutil.rmtree(stagingPath, ignore_errors=True)
+        self.siteFrames[folderName] = siteFrame
+        self.siteAccuracy[folderName] = accuracy
+
+    def writeSummaries(self):
+        """Rewrite the combined summaries from the current per-site results, in input-folder order."""
+        order = [folderName for folderName in os.listdir(self.resourceFolderPath) if folderName in self.siteFrames]
+        accuracy = AccuracyScore()
+        for folderName in order:
+            accuracy.merge(self.siteAccuracy[folderName])
+        return writeRunSummaries(self.outputFolderPath, [self.siteFrames[folderName] for folderName in order],
+                                 accuracy, self.characteristics)
+
+    def poll(self, now=None):
+        """Scan the input tree once; returns the site folders reprocessed (or dropped from the summaries)."""
+        now = time.time() if now is None else now
+        snapshot = snapshotInputTree(self.resourceFolderPath)
+        changed = []
+        for folderName in [name for name in set(self.processed) | set(self.pending) if name not in snapshot]:
+            self.processed.pop(folderName, None)
+            self.pending.pop(folderName, None)
+            if folderName in self.siteFrames:
+                del self.siteFrames[folderName], self.siteAccuracy[folderName]
+                changed.append(folderName)
+        for folderName, fingerprint in snapshot.items():
+            if self.processed.get(folderName) == fingerprint:
+                self.pending.pop(folderName, None)
+                continue
+            if not self._isReady(folderName, fingerprint, now):
+                continue
+            # Recorded before processing so a failing site is only retried after its files change again.
+            self.processed[folderName] = fingerprint
+            try:
+                self._processSite(folderName)
+            except Exception as error:
+                print(f"Site {folderName} failed ({error!r}); keeping its previous outputs")
+                continue
+            changed.append(folderName)
+        if changed:
+            self.writeSummaries()
+        return changed
+
+    def run(self, pollSeconds=WATCH_POLL_SECONDS):
+        """Poll every pollSeconds until interrupted, printing the sites each poll reprocessed."""
+        print(f"Watching {self.resourceFolderPath} (debounce {self.debounceSeconds}s, poll {pollSeconds}s)")
+        try:
+            while True:
+                start = time.perf_counter()
+                changed = self.poll()
+                if changed:
+                    print(f"Updated {', '.join(changed)} in {time.perf_counter() - start:.2f}s")
+                time.sleep(pollSeconds)
+        except KeyboardInterrupt:
+            pass